@@ -1,22 +1,49 @@
 import datetime
-import os
+import importlib
+import json
 import streamlit as st
 import constants.strings as strings
 import pandas as pd
-from templates.vnindex_infor import vnindex_screen
-from templates.stock_detail import stock_detail_screen
-from templates.stock_comparison import stock_comparison_screen
-from templates.stock_predict import stock_predict_screen
-from vnstock import Vnstock
-from database.database import init_db
+from database.database import database_exists, init_db, migrate_indexes
+from services.universe import get_symbols
+from services.scheduler import SCHEDULER_ENABLED, start_scheduler
+from services import instrumentation
 
+# Screen functions by module, a screen (with Plotly and its services) is only imported once it is selected
+SCREENS = {
+    "vnindex": ("templates.vnindex_infor", "vnindex_screen"),
+    "comparison": ("templates.stock_comparison", "stock_comparison_screen"),
+    "detail": ("templates.stock_detail", "stock_detail_screen"),
+    "predict": ("templates.stock_predict", "stock_predict_screen"),
+    "screener": ("templates.stock_screener", "stock_screener_screen"),
+}
 
-# Check the database file is exist, if not init the database
-if not os.path.exists(strings.DATABASE_ABS_PATH):
-    init_db()
+def load_screen(name):
+    """Import the module of a screen on first use and return its screen function"""
+    module_name, func_name = SCREENS[name]
+    with instrumentation.span("app.load_screen", screen=name):
+        return getattr(importlib.import_module(module_name), func_name)
 
 st.set_page_config(page_title="Stock Analytics", layout="wide", page_icon="📈")
 
+@st.cache_resource
+def prepare_database():
+    """Create the database if it does not exist, else bring its indexes up to date, once per server process."""
+    if not database_exists():
+        init_db()
+    else:
+        migrate_indexes()
+
+prepare_database()
+
+@st.cache_resource
+def get_scheduler():
+    """Start the background jobs once per server process, shared by every session."""
+    return start_scheduler(blocking=False)
+
+if SCHEDULER_ENABLED:
+    get_scheduler()
+
 st.title(strings.APP_TITLE)
 st.markdown("---")
 
@@ -25,7 +52,7 @@ with st.sidebar:
     st.header(strings.SIDEBAR_HEADER)
 
     # Get list stock code VN30
-    popular_stocks = Vnstock().stock().listing.symbols_by_group('VN30')
+    popular_stocks = get_symbols('VN30')
 
     # Select stock code
     symbol = st.selectbox(strings.STOCK_SELECTION, popular_stocks, index=None) 
@@ -42,27 +69,46 @@ with st.sidebar:
     # Select the model to predict
     model_predict = st.selectbox(strings.STOCK_PREDICT, strings.STOCK_PREDICT_MODEL, index=None)
 
+    # Scan every stored stock code
+    show_screener = st.checkbox(strings.SCREENER_SELECTION, value=False)
+
 screen_placeholder = st.empty()
 # Define the mapping of conditions to screen functions
 screen_mapping = {
-    "comparison": (len(tickers_to_compare) >= 2, stock_comparison_screen, (start_date, end_date, tickers_to_compare)),
-    "detail": (symbol is not None, stock_detail_screen, (symbol, start_date, end_date)),
-    "predict": (model_predict is not None, stock_predict_screen, ())
+    "screener": (show_screener, ()),
+    "comparison": (len(tickers_to_compare) >= 2, (start_date, end_date, tickers_to_compare)),
+    "detail": (symbol is not None, (symbol, start_date, end_date)),
+    "predict": (model_predict is not None, (model_predict,))
 }
 
 # Default screen is vnindex_screen
-screen_func = vnindex_screen
+screen_name = "vnindex"
 screen_args = (start_date, end_date)
 
 # Iterate over screen_mapping to find the first matching condition
-for key, (condition, func, args) in screen_mapping.items():
+for key, (condition, args) in screen_mapping.items():
     if condition:
-        screen_func, screen_args = func, args
+        screen_name, screen_args = key, args
         break  # Stop at the first matched condition
+screen_func = load_screen(screen_name)
 
 # Render the selected screen
 with screen_placeholder.container():
     # Ensure args is always a tuple
     if not isinstance(screen_args, tuple):
         screen_args = (screen_args,)
-    screen_func(*screen_args)
\ No newline at end of file
+    with instrumentation.span(f"screen.{screen_func.__name__}"):
+        screen_func(*screen_args)
+
+# Latency and row counts of the instrumented calls, only with STOCK_INSTRUMENTATION=1
+if instrumentation.is_enabled():
+    with st.sidebar.expander(strings.DEBUG_PANEL_TITLE):
+        st.dataframe(instrumentation.snapshot(), hide_index=True, use_container_width=True)
+        st.markdown(strings.DEBUG_PANEL_RECENT)
+        recent = pd.DataFrame(instrumentation.recent_spans(strings.DEBUG_PANEL_RECENT_LIMIT))
+        st.dataframe(recent.iloc[::-1], hide_index=True, use_container_width=True)
+        st.download_button(strings.DEBUG_PANEL_EXPORT, json.dumps(instrumentation.export(), indent=2),
+                           file_name="spans.json", mime="application/json")
+        if st.button(strings.DEBUG_PANEL_RESET):
+            instrumentation.reset()
+            st.rerun()
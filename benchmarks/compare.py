@@ -0,0 +1,66 @@
+"""
+Compare two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.2
+
+Exits with status 1 if a benchmark got slower than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> list:
+    """Rows of (name, baseline median, current median, ratio, status) for the benchmarks of both runs"""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append((name, None, result["median"], None, "new"))
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else None
+        if ratio is None:
+            status = "ok"
+        elif ratio > 1 + threshold:
+            status = "slower"
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base["median"], result["median"], ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    if baseline.get("params") != current.get("params"):
+        print("⚠️ The runs used different parameters, timings are not comparable.")
+
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    rows = compare(baseline, current, args.threshold)
+    for name, base, value, ratio, status in rows:
+        base_text = f"{base * 1000:12.1f}" if base is not None else f"{'-':>12}"
+        ratio_text = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{name:<32} {base_text} {value * 1000:12.1f} {ratio_text}  {status}")
+
+    slower = [row[0] for row in rows if row[4] == "slower"]
+    if slower:
+        print(f"❌ {len(slower)} benchmark(s) slower than {args.baseline}: {', '.join(slower)}")
+        return 1
+    print("✅ No regression.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Benchmark the storage, ingestion, model and screen data-prep paths on synthetic data.
+
+    python -m benchmarks.run --symbols 10 --years 1 --interval 1m --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+Everything runs against a throwaway database, model directory and archive, the vnstock API is replaced
+by benchmarks.synthetic.FakeSource. Results are written as JSON for comparison across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Fixed default end date so that runs on different days generate the same data
+DEFAULT_END_DATE = "2024-12-31"
+DEFAULT_MA_PERIOD = 20
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stock analytics data paths on synthetic data.")
+    parser.add_argument("--symbols", type=int, default=5, help="number of synthetic stock codes")
+    parser.add_argument("--years", type=float, default=1, help="years of history per stock code")
+    parser.add_argument("--interval", default="1m", choices=["1m", "5m", "15m", "1h"], help="bar interval")
+    parser.add_argument("--matches", type=int, default=5000, help="order book matches per stock code")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="last day of the generated history")
+    parser.add_argument("--layout", default="per_symbol", choices=["per_symbol", "bars"], help="storage layout")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every read benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="directory for the database and models, a temporary one by default")
+    parser.add_argument("--output", help="JSON file to write, printed to stdout if omitted")
+    parser.add_argument("--verbose", action="store_true", help="keep the output of the benchmarked code")
+    return parser.parse_args(argv)
+
+
+def _isolate(workdir: str, layout: str):
+    """Point the app at a throwaway database, model directory and archive, before it is imported."""
+    os.environ["STOCK_DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "stock_data.db")
+    os.environ["STOCK_MODEL_DIR"] = os.path.join(workdir, "ml_model")
+    os.environ["STOCK_ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+    os.environ["STOCK_STORAGE_LAYOUT"] = layout
+    os.environ["STOCK_SCHEDULER_ENABLED"] = "0"
+
+
+def _git_commit():
+    """Commit hash of the benchmarked tree and whether it has local changes, (None, None) outside git"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+class Runner:
+    """Time benchmark functions and collect their results, a function returns the number of rows it handled."""
+
+    def __init__(self, repeat: int, verbose: bool = False):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = {}
+
+    def run(self, name: str, func, repeat: int = None, setup=None):
+        runs, rows = [], None
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                started = time.perf_counter()
+                rows = func()
+                runs.append(time.perf_counter() - started)
+        self.results[name] = {"runs": runs, "median": statistics.median(runs), "min": min(runs), "rows": rows}
+        print(f"⏱ {name:<32} median {self.results[name]['median'] * 1000:10.1f} ms  rows {rows}", file=sys.stderr)
+        return rows
+
+
+def run_benchmarks(args) -> dict:
+    # Imported here, the environment must point at the throwaway workdir first
+    from benchmarks.synthetic import FakeSource, make_ohlcv
+    from constants import strings
+    from database.database import (Base, engine, get_stock_prices, migrate_indexes, save_stock_prices,
+                                   save_vnindex_prices)
+    from services import comparison, market_data, order_flow, screener
+    from services.aggregate import choose_interval, update_rollups
+    from services.features import daily_moving_average, update_features
+    from services.ingest import ingest
+    from services.predict import predict_batch, predict_stock_price
+    from services.train import train_model
+    from templates.charts import line_trace
+
+    end = pd.Timestamp(args.end_date)
+    start = (end - pd.DateOffset(days=round(args.years * 365))).normalize() + pd.Timedelta(days=1)
+    symbols = [f"BM{i:03d}" for i in range(args.symbols)]
+    frames = {symbol: make_ohlcv(symbol, start, end, args.interval, args.seed) for symbol in symbols}
+    source = FakeSource(start, end, args.interval, args.seed, args.matches)
+    runner = Runner(args.repeat, args.verbose)
+
+    # Tables only, init_db would fetch the VN30 list and history from the API
+    Base.metadata.create_all(bind=engine)
+    migrate_indexes()
+    vnindex = make_ohlcv(strings.VNINDEX, start, end, "1D", args.seed, base_price=1200.0)
+
+    # Writes are measured once on the empty database, then on fully duplicated input
+    runner.run("save_vnindex_prices", lambda: save_vnindex_prices(vnindex)[0], repeat=1)
+    runner.run("save_stock_prices", lambda: sum(save_stock_prices(s, df)[0] for s, df in frames.items()), repeat=1)
+    runner.run("save_stock_prices_duplicates", lambda: sum(save_stock_prices(s, df)[1] for s, df in frames.items()))
+    runner.run("update_rollups", lambda: sum(update_rollups(s) for s in symbols), repeat=1)
+    runner.run("update_features", lambda: sum(update_features(s) for s in [strings.VNINDEX] + symbols), repeat=1)
+
+    # Incremental ingestion of the last week, with order books and order flow
+    week_start = (end - pd.Timedelta(days=7)).strftime("%Y-%m-%d")
+    start_dates = {s: week_start for s in [strings.VNINDEX] + symbols}
+    runner.run("ingest", lambda: int(ingest(start_dates, args.end_date, source=source, rate=0)["rows_inserted"].sum()),
+               repeat=1)
+
+    month_start = end - pd.DateOffset(months=1)
+    runner.run("get_stock_prices", lambda: sum(len(get_stock_prices(s)) for s in symbols))
+    runner.run("get_stock_prices_month", lambda: sum(len(get_stock_prices(s, month_start, end)) for s in symbols))
+
+    runner.run("train_model", lambda: sum((train_model(s) or {}).get("rows", 0) for s in symbols))
+
+    last = frames[symbols[0]].iloc[-1]
+    target_date = (end + pd.offsets.BDay(1)).strftime("%Y-%m-%d")
+    runner.run("predict_stock_price", lambda: len([
+        predict_stock_price(s, target_date, last["open"], last["high"], last["low"], last["volume"]) for s in symbols
+    ]))
+
+    days = pd.bdate_range(end - pd.Timedelta(days=30), end)
+    inputs = pd.DataFrame([{"symbol": s, "date": d, "open": last["open"], "high": last["high"], "low": last["low"],
+                            "volume": last["volume"]} for s in symbols for d in days])
+    runner.run("predict_batch", lambda: len(predict_batch(inputs)))
+
+    # Screen data-prep without Streamlit: cold cache read, moving average and the downsampled traces
+    def detail_screen():
+        interval = choose_interval(start, end)
+        df = market_data.get_history(symbols[0], start, end, interval=interval, source=source)
+        traces = [line_trace(df["time"], df["close"]),
+                  line_trace(df["time"], daily_moving_average(symbols[0], df["time"], DEFAULT_MA_PERIOD, interval))]
+        return sum(len(trace.y) for trace in traces)
+
+    def comparison_screen():
+        analytics = comparison.compare_stocks(symbols[:30], start, end, source=source)
+        normalized = analytics["normalized"]
+        return sum(len(line_trace(normalized.index, normalized[s]).y) for s in normalized.columns)
+
+    def clear_caches():
+        market_data.clear_cache()
+        comparison.clear_cache()
+
+    def vnindex_screen():
+        df = market_data.get_history(strings.VNINDEX, start, end, interval="1D", source=source)
+        daily_moving_average(strings.VNINDEX, df["time"], DEFAULT_MA_PERIOD)
+        return len(line_trace(df["time"], df["close"]).y)
+
+    runner.run("screen_stock_detail", detail_screen, setup=market_data.clear_cache)
+    runner.run("screen_stock_comparison", comparison_screen, setup=clear_caches)
+    runner.run("screen_stock_comparison_cached", comparison_screen)
+    runner.run("screen_vnindex", vnindex_screen, setup=market_data.clear_cache)
+
+    def order_flow_screen():
+        summaries = [order_flow.get_order_flow(s) for s in symbols]
+        return sum(summary["trades"] for summary in summaries if summary)
+
+    runner.run("get_order_flow", order_flow_screen)
+
+    runner.run("rebuild_snapshots", lambda: screener.rebuild_snapshots(symbols), repeat=1)
+    expression = screener.build_expression("Price above MA20", (None, 0.8), 1.0, 20, (0.0, None))
+    runner.run("screen_stocks", lambda: len(screener.screen_stocks(expression)) + len(screener.screen_stocks()))
+    return runner.results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="stock-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    _isolate(workdir, args.layout)
+
+    commit, dirty = _git_commit()
+    try:
+        results = run_benchmarks(args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "workdir", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure the import time of the app startup and of every screen, and enforce a budget.
+
+    python -m benchmarks.startup --budget-ms 1500 --screen-budget-ms 800 --output startup.json
+
+Every measurement runs in a fresh interpreter. Exits with status 1 if a budget is exceeded or if the
+startup imports one of the heavy modules that must only be loaded on demand.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run import _git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules imported by app.py before a screen is selected (Streamlit itself excluded)
+STARTUP_MODULES = ["constants.strings", "database.database", "services.universe", "services.scheduler",
+                   "services.instrumentation"]
+# Screen modules of app.SCREENS, imported on top of the startup modules when selected
+SCREEN_MODULES = ["templates.vnindex_infor", "templates.stock_comparison", "templates.stock_detail",
+                  "templates.stock_predict", "templates.stock_screener"]
+# Heavy dependencies the startup must not import: API client, scheduler, ML and charting libraries
+DEFERRED_MODULES = ["vnstock", "sklearn", "apscheduler", "plotly"]
+STARTUP_BUDGET_MS = float(os.environ.get("STOCK_STARTUP_BUDGET_MS", 1500))
+SCREEN_BUDGET_MS = float(os.environ.get("STOCK_SCREEN_BUDGET_MS", 1000))
+
+_PROBE = """
+import importlib, json, sys, time
+preload, modules, deferred = json.loads(sys.argv[1])
+for name in preload:
+    importlib.import_module(name)
+started = time.perf_counter()
+for name in modules:
+    importlib.import_module(name)
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "deferred": [name for name in deferred if name in sys.modules]}))
+"""
+
+
+def measure(modules: list, preload: list = (), repeat: int = 5) -> dict:
+    """Import `modules` in `repeat` fresh interpreters after `preload`, return timings and deferred modules loaded"""
+    runs, deferred = [], set()
+    arguments = json.dumps([list(preload), modules, DEFERRED_MODULES])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", _PROBE, arguments], cwd=ROOT, env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"
+            return {"runs": runs, "median": None, "min": None, "deferred": sorted(deferred), "error": error}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        runs.append(probe["seconds"])
+        deferred.update(probe["deferred"])
+    return {"runs": runs, "median": statistics.median(runs), "min": min(runs), "deferred": sorted(deferred),
+            "error": None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure and enforce the app import-time budget.")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="budget of the startup imports")
+    parser.add_argument("--screen-budget-ms", type=float, default=SCREEN_BUDGET_MS,
+                        help="budget of each screen import on top of the startup")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args(argv)
+
+    failures = []
+    results = {"startup": measure(STARTUP_MODULES, repeat=args.repeat)}
+    for module in SCREEN_MODULES:
+        results[module] = measure([module], preload=STARTUP_MODULES, repeat=args.repeat)
+
+    for name, result in results.items():
+        budget = args.budget_ms if name == "startup" else args.screen_budget_ms
+        if result["error"]:
+            print(f"❌ {name:<28} failed: {result['error']}")
+            failures.append(f"{name} cannot be imported")
+            continue
+        print(f"⏱ {name:<28} median {result['median'] * 1000:8.1f} ms  budget {budget:.0f} ms")
+        if result["median"] * 1000 > budget:
+            failures.append(f"{name} takes {result['median'] * 1000:.0f} ms")
+    if results["startup"]["deferred"]:
+        failures.append(f"startup imports {', '.join(results['startup']['deferred'])}")
+
+    if args.output:
+        commit, dirty = _git_commit()
+        report = {"commit": commit, "dirty": dirty, "python": sys.version.split()[0],
+                  "budget_ms": args.budget_ms, "screen_budget_ms": args.screen_budget_ms, "results": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if failures:
+        print(f"❌ Startup check failed: {'; '.join(failures)}")
+        return 1
+    print("✅ Import times within budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Minute bars of a trading day, same sessions as the vnstock 1m history (09:00-11:29 and 13:00-14:44)
+SESSION_MINUTES = [(9 * 60, 11 * 60 + 30), (13 * 60, 14 * 60 + 45)]
+# Bar step of each generated interval, in minutes
+INTERVAL_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "1D": None}
+
+
+def trading_times(start_date, end_date, interval: str = "1m") -> pd.DatetimeIndex:
+    """Timestamps of the bars of `interval` on the business days of [start_date, end_date]."""
+    days = pd.bdate_range(start_date, end_date)
+    step = INTERVAL_MINUTES[interval]
+    if step is None:
+        return days
+
+    offsets = np.concatenate([np.arange(start, end, step) for start, end in SESSION_MINUTES])
+    times = days.values[:, None] + (offsets * 60 * 10**9).astype("timedelta64[ns]")[None, :]
+    return pd.DatetimeIndex(times.ravel())
+
+
+def _seed(symbol: str, seed: int) -> int:
+    return seed + sum(ord(c) * 31 ** i for i, c in enumerate(symbol)) % 2**31
+
+
+def make_ohlcv(symbol: str, start_date, end_date, interval: str = "1m", seed: int = 0,
+               base_price: float = 50.0) -> pd.DataFrame:
+    """
+    Random walk OHLCV bars shaped like the vnstock history (time, open, high, low, close, volume).
+    The same symbol and seed always give the same bars, so runs on different commits are comparable.
+    """
+    times = trading_times(start_date, end_date, interval)
+    rng = np.random.default_rng(_seed(symbol, seed))
+    n = len(times)
+
+    close = base_price * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_ = np.concatenate([[base_price], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    return pd.DataFrame({
+        "time": times,
+        "open": open_.round(2),
+        "high": (np.maximum(open_, close) + spread).round(2),
+        "low": (np.minimum(open_, close) - spread).round(2),
+        "close": close.round(2),
+        "volume": rng.integers(100, 50_000, n),
+    })
+
+
+def make_order_book(symbol: str, session_date, matches: int = 5000, seed: int = 0,
+                    base_price: float = 50.0, first_id: int = 1) -> pd.DataFrame:
+    """Matches of one trading session shaped like the vnstock intraday data (time, price, volume, match_type, id)."""
+    rng = np.random.default_rng(_seed(symbol, seed) + pd.Timestamp(session_date).toordinal())
+    minutes = trading_times(session_date, session_date, "1m")
+    times = np.sort(minutes.values[rng.integers(0, len(minutes), matches)]
+                    + rng.integers(0, 60, matches).astype("timedelta64[s]"))
+    ticks = np.cumsum(rng.choice([-1, 0, 1], matches, p=[0.3, 0.4, 0.3]))
+    return pd.DataFrame({
+        "time": times,
+        "price": (base_price + ticks * 0.05).round(2),
+        "volume": rng.integers(1, 100, matches) * 100,
+        "match_type": rng.choice(["Buy", "Sell", "ATO/ATC"], matches, p=[0.48, 0.48, 0.04]),
+        "id": np.arange(first_id, first_id + matches),
+    })
+
+
+class FakeSource:
+    """
+    Local quote source serving synthetic data through the interface of services.ingest.VnstockSource,
+    so ingestion and the read-through cache can be benchmarked without network calls.
+    """
+    name = "FAKE"
+
+    def __init__(self, start_date, end_date, interval: str = "1m", seed: int = 0, matches: int = 5000):
+        self.start_date, self.end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        self.interval, self.seed, self.matches = interval, seed, matches
+        self._frames = {}
+
+    def _frame(self, symbol: str, interval: str) -> pd.DataFrame:
+        key = (symbol, interval)
+        if key not in self._frames:
+            self._frames[key] = make_ohlcv(symbol, self.start_date, self.end_date, interval, self.seed)
+        return self._frames[key]
+
+    @staticmethod
+    def _slice(df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        return df[(df["time"] >= start) & (df["time"] < end)].reset_index(drop=True)
+
+    def fetch_vnindex(self, start_date, end_date):
+        return self._slice(self._frame("VNINDEX", "1D"), start_date, end_date)
+
+    def fetch_stock(self, symbol, start_date, end_date):
+        return self._slice(self._frame(symbol, self.interval), start_date, end_date)
+
+    def fetch_order_book(self, symbol):
+        session = pd.bdate_range(end=self.end_date, periods=1)[0]
+        return make_order_book(symbol, session, self.matches, self.seed)
@@ -1,3 +1,5 @@
+import os
+
 # Sidebar
 SIDEBAR_HEADER = "⚙️ Parameter Settings"
 STOCK_SELECTION = "**Select Stock Code**"
@@ -5,13 +7,14 @@ START_DATE = "**Start Date**"
 END_DATE = "**End Date**"
 COMPARISON_SELECTION = "**Compare with Other Stocks**"
 STOCK_PREDICT="**Stock Price Predict**"
-STOCK_PREDICT_MODEL=['Linear Regression','Logistic Regression (TODO)','Random Forest (TODO)','LSTM (TODO)','Transformer (TODO)']
+STOCK_PREDICT_MODEL=['Linear Regression','Random Forest','Gradient Boosting','Online SGD']
 
 # Main Page
 APP_TITLE = "📈 Vietnam Stock Market Analytics"
 MAIN_CHART_TITLE = "📊 Stock Price Chart"
-MOVING_AVERAGE_PERIOD = "**Moving Average Period**"
+MOVING_AVERAGE_PERIOD = "**Moving Average Period (sessions)**"
 MOVING_AVERAGE_TOGGLE = "Show Moving Average Line (MA)"
+CHART_RESOLUTION = "Resolution: {} bars"
 
 # Market Info
 MARKET_INFO_TITLE = "📊 Market Information"
@@ -28,16 +31,59 @@ RAW_DATA_TAB = "📂 Raw Data"
 # Order Book
 ORDER_BOOK_TITLE = "📋 Buy/Sell Order Book"
 NO_ORDER_DATA_WARNING = "No matching order data found."
+ORDER_FLOW_TITLE = "📊 Order Flow ({})"
+ORDER_FLOW_VWAP = "**VWAP**"
+ORDER_FLOW_IMBALANCE = "**Buy/Sell Imbalance**"
+ORDER_FLOW_TRADES = "**Matched Orders**"
+VOLUME_AT_PRICE_TITLE = "Volume at Price"
+TRADE_RATE_TITLE = "Matches per Minute"
 
 # Stock Comparison
 STOCK_COMPARISON_TITLE = "📊 Stock Performance Comparison"
 SELECT_MORE_STOCKS_INFO = "Please select at least 2 stock codes for comparison."
+COMPARISON_SUMMARY_TITLE = "📋 Performance Summary"
+COMPARISON_DRAWDOWN_TAB = "📉 Drawdown"
+COMPARISON_CORRELATION_TAB = "🔗 Correlation"
+COMPARISON_CORRELATION_RANGE = "Correlation over the selected range"
+COMPARISON_ROLLING_CORRELATION = "{}-session correlation ending on"
+COMPARISON_SUMMARY_COLUMNS = {"ticker": "Ticker", "last_close": "Last Close", "total_return": "Return",
+                              "volatility": "Volatility (ann.)", "max_drawdown": "Max Drawdown",
+                              "beta": "Beta vs VNINDEX"}
+
+# Stock Screener
+SCREENER_SELECTION = "**Stock Screener**"
+SCREENER_TITLE = "🔎 Stock Screener"
+SCREENER_MA_FILTER = "**Price vs Moving Average**"
+SCREENER_VOLATILITY_RANK = "**Volatility Rank (%)**"
+SCREENER_VOLUME_RATIO = "**Volume Spike (× average volume)**"
+SCREENER_CHANGE_DAYS = "**% Change Over**"
+SCREENER_CHANGE_RANGE = "**% Change Range**"
+SCREENER_CUSTOM = "**Custom Filter**"
+SCREENER_CUSTOM_HELP = ("Comparisons of the snapshot columns and numbers joined with and, or, not and + - * /, "
+                        "e.g. close > ma_50 and change_5d > 0.03")
+SCREENER_SORT_BY = "**Sort By**"
+SCREENER_ASCENDING = "Ascending"
+SCREENER_REBUILD = "🔄 Rebuild Snapshots"
+SCREENER_RESULT = "{} of {} stock codes match ({:.1f} ms)"
+SCREENER_EMPTY = "No indicator snapshot yet, rebuild the snapshots from the stored prices."
+SCREENER_COLUMNS = {"symbol": "Symbol", "time": "Session", "close": "Close", "change_1d": "1D %", "change_5d": "5D %",
+                    "change_20d": "20D %", "change_60d": "60D %", "ma_20": "MA20", "ma_50": "MA50",
+                    "volatility": "Volatility (ann.)", "volatility_rank": "Volatility Rank", "volume": "Volume",
+                    "volume_ratio": "Volume Ratio"}
 
 # Raw Data
 RAW_DATA_TITLE = "📂 Original Price Data"
 
+# Debug Panel
+DEBUG_PANEL_TITLE = "🛠 Performance"
+DEBUG_PANEL_RECENT = "**Latest calls**"
+DEBUG_PANEL_RECENT_LIMIT = 30
+DEBUG_PANEL_EXPORT = "⬇️ Export JSON"
+DEBUG_PANEL_RESET = "Reset"
+
 # Error Message
 ERROR_MESSAGE = "⚠️ An error occurred: {}"
+ERROR_NO_DATA = "⚠️ No data found for {} from {} to {}."
 
 # Stock code
 VNINDEX = 'VNINDEX'
@@ -45,8 +91,15 @@ VNINDEX = 'VNINDEX'
 # Action
 REFRESH_DATA = "🔄 Refresh Data"
 
-DATABASE_URL = "sqlite:///SQLite/stock_data.db"
+DATABASE_URL = os.environ.get("STOCK_DATABASE_URL", "sqlite:///SQLite/stock_data.db")
 
-DATABASE_ABS_PATH = 'SQLite\\stock_data.db'
+# Storage layout for stock prices: one table per symbol or a single shared `bars` table
+STORAGE_LAYOUT_PER_SYMBOL = "per_symbol"
+STORAGE_LAYOUT_BARS = "bars"
+STORAGE_LAYOUT = os.environ.get("STOCK_STORAGE_LAYOUT", STORAGE_LAYOUT_PER_SYMBOL)
 
-MODEL_DIR = "ml_model"
\ No newline at end of file
+MODEL_DIR = os.environ.get("STOCK_MODEL_DIR", "ml_model")
+# Parquet archive of cold minute bars, SQLite only keeps the most recent HOT_WINDOW_DAYS
+ARCHIVE_DIR = os.environ.get("STOCK_ARCHIVE_DIR", "archive")
+ARCHIVE_ENABLED = os.environ.get("STOCK_ARCHIVE_ENABLED", "0") == "1"
+HOT_WINDOW_DAYS = int(os.environ.get("STOCK_HOT_WINDOW_DAYS", 90))
@@ -0,0 +1,145 @@
+import glob
+import os
+import uuid
+import pandas as pd
+from constants import strings
+from services.instrumentation import instrument
+
+# Columns and dtypes of the archived minute bars
+ARCHIVE_COLUMNS = {"time": "datetime64[ns]", "open": "float64", "high": "float64", "low": "float64",
+                   "close": "float64", "volume": "int64"}
+
+
+def _pyarrow():
+    """Import pyarrow on first use, the archive is optional and the app runs without it."""
+    try:
+        import pyarrow
+        import pyarrow.dataset as ds
+        import pyarrow.fs as fs
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The Parquet archive needs pyarrow: pip install pyarrow") from e
+    return pyarrow, ds, fs, pq
+
+
+def symbol_dir(symbol: str) -> str:
+    return os.path.join(strings.ARCHIVE_DIR, f"symbol={symbol.upper()}")
+
+
+def has_archive(symbol: str) -> bool:
+    """Return True if some bars of the stock code were archived."""
+    return os.path.isdir(symbol_dir(symbol))
+
+
+def _months(symbol: str) -> list:
+    """Archived month partitions ('YYYY-MM') of a stock code, oldest first"""
+    if not has_archive(symbol):
+        return []
+    return sorted(name[len("month="):] for name in os.listdir(symbol_dir(symbol)) if name.startswith("month="))
+
+
+def _month_files(symbol: str, month: str) -> list:
+    return sorted(glob.glob(os.path.join(symbol_dir(symbol), f"month={month}", "*.parquet")))
+
+
+def _empty_frame(columns: list) -> pd.DataFrame:
+    return pd.DataFrame(columns=columns).astype({column: ARCHIVE_COLUMNS[column] for column in columns})
+
+
+def _read_files(files: list, columns: list, start=None, end=None) -> pd.DataFrame:
+    """
+    Read Parquet files through memory-mapped Arrow, the time range is pushed down to the scan
+    so row groups outside of it are skipped using their statistics.
+    """
+    pyarrow, ds, fs, _ = _pyarrow()
+    dataset = ds.dataset(files, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True))
+    condition = None
+    if start is not None:
+        condition = ds.field("time") >= pyarrow.scalar(start.to_pydatetime(), pyarrow.timestamp("us"))
+    if end is not None:
+        upper = ds.field("time") <= pyarrow.scalar(end.to_pydatetime(), pyarrow.timestamp("us"))
+        condition = upper if condition is None else condition & upper
+
+    df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    return df.astype({column: ARCHIVE_COLUMNS[column] for column in columns})
+
+
+@instrument()
+def read_archive(symbol: str, start_date=None, end_date=None, columns: list = None,
+                 descending: bool = False, limit: int = None) -> pd.DataFrame:
+    """
+    Read archived bars of a stock code sorted by time. Only the month partitions overlapping
+    [start_date, end_date] are opened; with `limit`, months are read one at a time, newest first
+    when descending, until enough rows are found.
+    """
+    columns = columns or list(ARCHIVE_COLUMNS)
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) if end_date is not None else None
+    months = [month for month in _months(symbol)
+              if (start is None or month >= start.strftime("%Y-%m")) and (end is None or month <= end.strftime("%Y-%m"))]
+    if not months:
+        return _empty_frame(columns)
+
+    read_columns = list(dict.fromkeys(["time"] + columns))
+    if limit is None:
+        files = [path for month in months for path in _month_files(symbol, month)]
+        df = _read_files(files, read_columns, start, end).sort_values("time", ascending=not descending)
+        return df[columns].reset_index(drop=True)
+
+    frames, found = [], 0
+    for month in (reversed(months) if descending else months):
+        frame = _read_files(_month_files(symbol, month), read_columns, start, end)
+        frames.append(frame)
+        found += len(frame)
+        if found >= limit:
+            break
+    df = pd.concat(frames, ignore_index=True).sort_values("time", ascending=not descending)
+    return df[columns].head(limit).reset_index(drop=True)
+
+
+def latest_archived_time(symbol: str):
+    """Time of the newest archived bar of a stock code, None if nothing is archived"""
+    months = _months(symbol)
+    if not months:
+        return None
+    times = _read_files(_month_files(symbol, months[-1]), ["time"])["time"]
+    return times.max().to_pydatetime() if not times.empty else None
+
+
+def earliest_archived_time(symbol: str):
+    """Time of the oldest archived bar of a stock code, None if nothing is archived"""
+    months = _months(symbol)
+    if not months:
+        return None
+    times = _read_files(_month_files(symbol, months[0]), ["time"])["time"]
+    return times.min().to_pydatetime() if not times.empty else None
+
+
+@instrument(rows=int)
+def write_archive(symbol: str, df: pd.DataFrame) -> int:
+    """
+    Append bars to the per-month partitions of a stock code. Partition files are immutable:
+    rows already archived are dropped and the rest is written as a new file of the month,
+    through a temporary file so readers never see a partial file. Return the number of rows written.
+    """
+    if df.empty:
+        return 0
+
+    pyarrow, _, _, pq = _pyarrow()
+    df = df[list(ARCHIVE_COLUMNS)].astype(ARCHIVE_COLUMNS).drop_duplicates(subset="time")
+    written = 0
+    for month, rows in df.groupby(df["time"].dt.strftime("%Y-%m")):
+        existing = _month_files(symbol, month)
+        if existing:
+            rows = rows[~rows["time"].isin(_read_files(existing, ["time"])["time"])]
+        if rows.empty:
+            continue
+
+        month_dir = os.path.join(symbol_dir(symbol), f"month={month}")
+        os.makedirs(month_dir, exist_ok=True)
+        path = os.path.join(month_dir, f"part-{uuid.uuid4().hex}.parquet")
+        table = pyarrow.Table.from_pandas(rows.sort_values("time"), preserve_index=False)
+        pq.write_table(table, path + ".tmp", coerce_timestamps="us", allow_truncated_timestamps=True)
+        os.replace(path + ".tmp", path)
+        written += len(rows)
+    return written
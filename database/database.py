@@ -1,13 +1,15 @@
 import os
 import pandas as pd
-import time
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, exists, inspect
-from vnstock import Vnstock
-from services.fetch_data import fetch_vnindex_data, fetch_stock_data, fetch_order_book_stock_data
+from sqlalchemy import DateTime, Float, Integer, String, create_engine, event, select, text, type_coerce
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from constants import strings
-from database.models import Base, VNIndexPrice, create_stock_table, create_order_book_table
-from datetime import datetime
+from database import archive
+from services.instrumentation import instrument
+from database.models import (Base, Bar, DailyFeature, IndicatorSnapshot, JobRun, JobState, OrderBookWatermark, OrderFlowBucket,
+                             SymbolGroup, VNIndexPrice, create_stock_table, create_order_book_table)
+from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from sqlalchemy.sql import func
 
@@ -19,20 +21,97 @@ SQLITE_DIR = os.path.join(BASE_DIR, "SQLite")
 if not os.path.exists(SQLITE_DIR):
     os.makedirs(SQLITE_DIR)
 
-engine = create_engine(strings.DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite tuning applied to every connection, readers (Streamlit) and the writer (scheduler) share the file
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("STOCK_SQLITE_BUSY_TIMEOUT_MS", 30000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("STOCK_SQLITE_CACHE_SIZE_KB", 64000))
+SQLITE_MMAP_SIZE = int(os.environ.get("STOCK_SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+engine = create_engine(strings.DATABASE_URL, connect_args={
+    "check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets readers run while the writer commits, synchronous=NORMAL is durable enough with WAL,
+    and a busy timeout makes a blocked statement wait for the lock instead of failing at once.
+    """
+    cursor = dbapi_connection.cursor()
+    if engine.url.database not in (None, "", ":memory:"):
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# Number of rows sent to the database per executemany batch
+BULK_CHUNK_SIZE = 5000
+PRICE_COLUMNS = ["time", "open", "high", "low", "close", "volume"]
+ORDER_BOOK_COLUMNS = ["time", "price", "volume", "match_type", "order_book_id"]
+BAR_COLUMNS = ["symbol", "interval", "time", "open", "high", "low", "close", "volume"]
+BAR_KEY = ["symbol", "interval", "time"]
+ORDER_FLOW_COLUMNS = ["symbol", "time", "price", "match_type", "volume", "trades", "value", "last_id"]
+ORDER_FLOW_KEY = ["symbol", "time", "price", "match_type"]
+DAILY_FEATURE_COLUMNS = ["symbol", "time", "close", "returns", "volatility", "ma_5", "ma_10", "ma_20", "ma_50"]
+# Resolution of the stock bars fetched by services.fetch_data
+STOCK_INTERVAL = "1m"
+_indexed_tables = set()
+_existing_tables = set()
+# (symbol, session date) -> highest order book id stored, mirrors the trade_watermarks table
+_order_book_watermarks = {}
+
+
+def use_bars_layout():
+    """Return True if stock prices are stored in the shared `bars` table."""
+    return strings.STORAGE_LAYOUT == strings.STORAGE_LAYOUT_BARS
+
 def get_latest_stock_date(symbol: str):
     """
     Get the most recent date with data for the stock code from the database.
     If the table has no data, return None.
     """
-    StockTable = create_stock_table(symbol)
+    latest_date = None
     with SessionLocal() as session:
-        latest_date = session.query(func.max(StockTable.time)).scalar()
+        if use_bars_layout():
+            latest_date = session.query(func.max(Bar.time)).filter(
+                Bar.symbol == symbol, Bar.interval == STOCK_INTERVAL
+            ).scalar()
+        else:
+            StockTable = create_stock_table(symbol)
+            if table_exists(StockTable.__tablename__):
+                latest_date = session.query(func.max(StockTable.time)).scalar()
+
+    if latest_date is None and archive.has_archive(symbol):
+        latest_date = archive.latest_archived_time(symbol)
     return latest_date
 
+def get_earliest_stock_date(symbol: str):
+    """Get the oldest time with data for the stock code, archived bars included. None if it has no data."""
+    if archive.has_archive(symbol):
+        earliest = archive.earliest_archived_time(symbol)
+        if earliest is not None:
+            return earliest
+
+    with SessionLocal() as session:
+        if use_bars_layout():
+            return session.query(func.min(Bar.time)).filter(
+                Bar.symbol == symbol, Bar.interval == STOCK_INTERVAL
+            ).scalar()
+        StockTable = create_stock_table(symbol)
+        if not table_exists(StockTable.__tablename__):
+            return None
+        return session.query(func.min(StockTable.time)).scalar()
+
+def get_earliest_vnindex_date():
+    """Get the oldest date with VNINDEX data, None if the table has no data"""
+    with SessionLocal() as session:
+        return session.query(func.min(VNIndexPrice.time)).scalar()
+
 def get_latest_vnindex_date():
     """
     Get the most recent date with VNINDEX data from the database. 
@@ -42,117 +121,425 @@ def get_latest_vnindex_date():
         latest_date = session.query(func.max(VNIndexPrice.time)).scalar()
     return latest_date
 
+def database_exists() -> bool:
+    """Return True if the SQLite database file was already created (always for in-memory databases)"""
+    path = engine.url.database
+    return path in (None, "", ":memory:") or os.path.exists(path)
+
 def table_exists(table_name):
-    """Check if the table exists in the database."""
-    inspector = inspect(engine)
-    return table_name in inspector.get_table_names()
+    """Check if the table exists in the database, tables found once are remembered."""
+    if table_name in _existing_tables:
+        return True
+
+    with engine.connect() as conn:
+        found = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table_name}
+        ).first() is not None
+    if found:
+        _existing_tables.add(table_name)
+    return found
+
+def list_tables(prefix: str = "") -> list:
+    """Names of the tables starting with `prefix`"""
+    with engine.connect() as conn:
+        names = [row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))]
+    return sorted(name for name in names if name.startswith(prefix))
 
 def safe_execute(func, *args, **kwargs):
-    """Execute function with retry if database is locked"""
-    retries = 3
-    for attempt in range(retries):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            if "database is locked" in str(e):
-                print(f"⚠️ Database is locked, retrying ({attempt+1}/{retries})...")
-                time.sleep(1) 
-            else:
-                raise e
+    """
+    Execute function, waiting for locks is left to the SQLite busy timeout.
+    A lock still held after SQLITE_BUSY_TIMEOUT_MS is reported and raised.
+    """
+    try:
+        return func(*args, **kwargs)
+    except OperationalError as e:
+        if "database is locked" in str(e):
+            print(f"⚠️ Database stayed locked for more than {SQLITE_BUSY_TIMEOUT_MS} ms")
+        raise
+
+def migrate_indexes():
+    """
+    Add the indexes missing from databases created by older versions: unique `time` on price tables,
+    unique `order_book_id` and `time` on order book tables. Then refresh the query planner statistics.
+    """
+    if table_exists(VNIndexPrice.__tablename__):
+        ensure_unique_index(VNIndexPrice.__table__, "time")
+    for table_name in list_tables("stock_"):
+        ensure_unique_index(create_stock_table(table_name[len("stock_"):].upper()).__table__, "time")
+    for table_name in list_tables("order_book_"):
+        ensure_unique_index(create_order_book_table(table_name[len("order_book_"):].upper()).__table__, "order_book_id")
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table_name}_time ON "{table_name}" (time)'))
+
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA optimize"))
+    print("✅ Database indexes are up to date")
 
+def ensure_unique_index(table, column: str):
+    """
+    Make sure `column` of `table` has the unique index used to skip duplicates on insert.
+    Tables created before the index existed are deduplicated first, keeping the oldest row.
+    """
+    if table.name in _indexed_tables:
+        return
+
+    index_name = f"ix_{table.name}_{column}"
+    with engine.begin() as conn:
+        indexes = {row[1] for row in conn.execute(text(f'PRAGMA index_list("{table.name}")'))}
+        if index_name not in indexes:
+            print(f"🛠 Creating unique index {index_name}...")
+            conn.execute(text(
+                f'DELETE FROM "{table.name}" WHERE id NOT IN '
+                f'(SELECT MIN(id) FROM "{table.name}" GROUP BY {column})'
+            ))
+            conn.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON "{table.name}" ({column})'))
+    _indexed_tables.add(table.name)
+
+def frame_to_records(df: pd.DataFrame, columns: list, key_column: str, rename: dict = None) -> list:
+    """Convert a DataFrame into a list of row dicts for executemany, dropping duplicate keys."""
+    frame = df.rename(columns=rename) if rename else df
+    frame = frame[columns].drop_duplicates(subset=key_column, keep="first")
+    frame = frame.assign(time=pd.to_datetime(frame["time"]))
+    return frame.to_dict("records")
+
+def bulk_insert(table, records: list, conflict_columns: list) -> int:
+    """
+    Insert records with INSERT ... ON CONFLICT DO NOTHING in chunks of BULK_CHUNK_SIZE.
+    Return the number of rows actually inserted.
+    """
+    if not records:
+        return 0
+
+    stmt = sqlite_insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    inserted = 0
+    with engine.begin() as conn:
+        for start in range(0, len(records), BULK_CHUNK_SIZE):
+            result = conn.execute(stmt, records[start:start + BULK_CHUNK_SIZE])
+            inserted += max(result.rowcount, 0)
+    return inserted
+
+def bulk_upsert(table, records: list, conflict_columns: list) -> int:
+    """
+    Insert records with INSERT ... ON CONFLICT DO UPDATE in chunks of BULK_CHUNK_SIZE,
+    overwriting the non-key columns of rows that already exist. Return the number of rows written.
+    """
+    if not records:
+        return 0
+
+    stmt = sqlite_insert(table)
+    update_columns = {name: stmt.excluded[name] for name in records[0] if name not in conflict_columns}
+    stmt = stmt.on_conflict_do_update(index_elements=conflict_columns, set_=update_columns)
+    written = 0
+    with engine.begin() as conn:
+        for start in range(0, len(records), BULK_CHUNK_SIZE):
+            result = conn.execute(stmt, records[start:start + BULK_CHUNK_SIZE])
+            written += max(result.rowcount, 0)
+    return written
+
+@instrument()
 def save_vnindex_prices(df: pd.DataFrame):  
-    """Save VNINDEX data to table `vnindex_prices`"""
-    def _execute():
-        with SessionLocal() as session:
-            for _, row in df.iterrows():
-                exists_query = session.query(
-                    exists().where(VNIndexPrice.time == row['time'])
-                ).scalar()
-
-                if not exists_query:
-                    stock_data = VNIndexPrice(
-                        time=row['time'],
-                        open=row['open'],
-                        high=row['high'],
-                        low=row['low'],
-                        close=row['close'],
-                        volume=row['volume']
-                    )
-                    session.add(stock_data)
-            session.commit()
+    """Save VNINDEX data to table `vnindex_prices`, return (inserted, skipped) row counts"""
+    if df.empty:
+        print("⚠️ VNINDEX data is empty!")
+        return 0, 0
 
-    safe_execute(_execute)
+    VNIndexPrice.__table__.create(bind=engine, checkfirst=True)
+    ensure_unique_index(VNIndexPrice.__table__, "time")
 
+    records = frame_to_records(df, PRICE_COLUMNS, "time")
+    inserted = safe_execute(bulk_insert, VNIndexPrice.__table__, records, ["time"])
+    skipped = len(df) - inserted
+    print(f"✅ VNINDEX: {inserted} rows inserted, {skipped} skipped")
+    return inserted, skipped
+
+@instrument()
 def save_stock_prices(symbol: str, df: pd.DataFrame):
-    """Save stock price data in separate tables for each stock code"""
-    StockTable = create_stock_table(symbol)
-    
+    """Save stock price data in separate tables for each stock code, return (inserted, skipped) row counts"""
     if df.empty:
         print(f"⚠️ Data for {symbol} is empty!")
-        return
+        return 0, 0
 
+    if use_bars_layout():
+        return save_bars(symbol, STOCK_INTERVAL, df)
+
+    StockTable = create_stock_table(symbol)
     is_exists = table_exists(StockTable.__tablename__)
 
     if not is_exists:
         print(f"🛠 Creating table {StockTable.__tablename__} for {symbol}...")
         with engine.begin() as conn:
             StockTable.__table__.create(bind=conn)
+    ensure_unique_index(StockTable.__table__, "time")
+
+    records = frame_to_records(df, PRICE_COLUMNS, "time")
+    inserted = safe_execute(bulk_insert, StockTable.__table__, records, ["time"])
+    skipped = len(df) - inserted
+    print(f"✅ {symbol}: {inserted} rows inserted, {skipped} skipped")
+    return inserted, skipped
+
+@instrument()
+def save_bars(symbol: str, interval: str, df: pd.DataFrame):
+    """Save OHLCV bars of one symbol and interval to the shared `bars` table, return (inserted, skipped)"""
+    Bar.__table__.create(bind=engine, checkfirst=True)
+
+    records = frame_to_records(df.assign(symbol=symbol, interval=interval), BAR_COLUMNS, "time")
+    inserted = safe_execute(bulk_insert, Bar.__table__, records, BAR_KEY)
+    skipped = len(df) - inserted
+    print(f"✅ {symbol} ({interval}): {inserted} rows inserted, {skipped} skipped")
+    return inserted, skipped
+
+def _column_dtype(column):
+    """pandas dtype used for a table column when building DataFrames from query results"""
+    if isinstance(column.type, DateTime):
+        return "datetime64[ns]"
+    if isinstance(column.type, Float):
+        return "float64"
+    if isinstance(column.type, Integer):
+        return "int64"
+    return "object"
+
+@instrument()
+def read_frame(table, columns: list = None, filters: list = None, start_date=None, end_date=None,
+               descending: bool = False, limit: int = None, order_column: str = "time") -> pd.DataFrame:
+    """
+    Run a core SELECT of `columns` (all columns by default) on `table` and build the DataFrame
+    straight from the cursor rows with datetime64/float64/int64 dtypes, without ORM objects.
+    The [start_date, end_date] range, ordering by `order_column` and limit are pushed down into the query.
+    """
+    columns = columns or [column.name for column in table.columns]
+    filters = list(filters or [])
+    if start_date is not None:
+        filters.append(table.c.time >= pd.Timestamp(start_date).to_pydatetime())
+    if end_date is not None:
+        filters.append(table.c.time <= pd.Timestamp(end_date).to_pydatetime())
+
+    # Read `time` as the stored ISO string and parse the whole column at once in pandas,
+    # instead of letting SQLAlchemy build one datetime object per row
+    selected = [type_coerce(table.c[column], String).label(column) if isinstance(table.c[column].type, DateTime)
+                else table.c[column] for column in columns]
+    stmt = select(*selected).where(*filters)
+    if order_column in table.c:
+        order = table.c[order_column]
+        stmt = stmt.order_by(order.desc() if descending else order.asc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
 
     def _execute():
-        with SessionLocal() as session:
-            for _, row in df.iterrows():
-                exists_query = session.query(
-                    exists().where(StockTable.time == row['time'])
-                ).scalar()
-
-                if not exists_query:
-                    stock_data = StockTable(
-                        time=row['time'],
-                        open=row['open'],
-                        high=row['high'],
-                        low=row['low'],
-                        close=row['close'],
-                        volume=row['volume']
-                    )
-                    session.add(stock_data)
-            session.commit()
+        with engine.connect() as conn:
+            return conn.execute(stmt).fetchall()
+
+    df = pd.DataFrame.from_records(safe_execute(_execute), columns=columns)
+    return df.astype({column: _column_dtype(table.c[column]) for column in columns})
+
+def read_arrays(table, columns: list = None, **kwargs) -> dict:
+    """Same as read_frame but return a dict of column name -> NumPy array"""
+    df = read_frame(table, columns, **kwargs)
+    return {column: df[column].to_numpy() for column in df.columns}
+
+def _price_table(symbol: str):
+    """Return (table, filters) holding the prices of a stock code, (None, None) if it has no table"""
+    if use_bars_layout():
+        table = Bar.__table__
+        return table, [table.c.symbol == symbol, table.c.interval == STOCK_INTERVAL]
+
+    table = create_stock_table(symbol).__table__
+    if not table_exists(table.name):
+        return None, None
+    return table, []
+
+@instrument()
+def read_price_frame(symbol: str, start_date=None, end_date=None, columns: list = None,
+                     descending: bool = False, limit: int = None) -> pd.DataFrame:
+    """
+    Read prices of a stock code as a typed DataFrame, with optional column projection and date range.
+    Recent bars come from SQLite and older ones from the Parquet archive, if the symbol has one.
+    """
+    columns = columns or PRICE_COLUMNS
+    table, filters = _price_table(symbol)
+    hot = pd.DataFrame(columns=columns) if table is None else \
+        read_frame(table, columns, filters, start_date, end_date, descending, limit)
+    if not archive.has_archive(symbol) or (descending and limit is not None and len(hot) >= limit):
+        return hot
+
+    # Archived bars are older than the ones kept in SQLite, only the range before them is read
+    cold_end = end_date
+    if not hot.empty and "time" in hot:
+        hot_start = pd.Timestamp(hot["time"].min())
+        cold_end = hot_start - pd.Timedelta(microseconds=1)
+        if end_date is not None:
+            cold_end = min(cold_end, pd.Timestamp(end_date))
+    cold_limit = limit - len(hot) if descending and limit is not None else limit
+    cold = archive.read_archive(symbol, start_date, cold_end, columns, descending, cold_limit)
+
+    frames = [frame for frame in ([hot, cold] if descending else [cold, hot]) if not frame.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else hot
+    return df.head(limit) if limit is not None else df
+
+@instrument(rows=int)
+def upsert_bars(symbol: str, interval: str, df: pd.DataFrame) -> int:
+    """Write aggregated bars of one symbol and interval, replacing buckets that already exist"""
+    if df.empty:
+        return 0
 
-    safe_execute(_execute)
+    Bar.__table__.create(bind=engine, checkfirst=True)
+    records = frame_to_records(df.assign(symbol=symbol, interval=interval), BAR_COLUMNS, "time")
+    return safe_execute(bulk_upsert, Bar.__table__, records, BAR_KEY)
 
-def get_stock_prices(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
-    """Get stock price data from separate table for each stock code"""
-    StockTable = create_stock_table(symbol)
+def get_latest_bar_time(symbol: str, interval: str):
+    """Get the start of the newest stored bar of a symbol and interval, None if there is none"""
+    Bar.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as session:
+        return session.query(func.max(Bar.time)).filter(Bar.symbol == symbol, Bar.interval == interval).scalar()
+
+@instrument()
+def get_bars(symbol: str, interval: str, start_date=None, end_date=None) -> pd.DataFrame:
+    """Get stored bars of a symbol and interval from the `bars` table"""
+    table = Bar.__table__
+    if not table_exists(table.name):
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    return read_frame(table, PRICE_COLUMNS, [table.c.symbol == symbol, table.c.interval == interval],
+                      start_date, end_date)
+
+@instrument()
+def get_latest_bars(symbol: str, interval: str, limit: int) -> pd.DataFrame:
+    """Get the `limit` newest stored bars of a symbol and interval, oldest first"""
+    table = Bar.__table__
+    if not table_exists(table.name):
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    df = read_frame(table, PRICE_COLUMNS, [table.c.symbol == symbol, table.c.interval == interval],
+                    descending=True, limit=limit)
+    return df.iloc[::-1].reset_index(drop=True)
+
+def get_bar_symbols(interval: str) -> list:
+    """Get every symbol with stored bars of `interval`"""
+    if not table_exists(Bar.__tablename__):
+        return []
+    with SessionLocal() as session:
+        rows = session.query(Bar.symbol).filter(Bar.interval == interval).distinct().order_by(Bar.symbol).all()
+    return [row.symbol for row in rows]
 
-    inspector = inspect(engine)
-    if StockTable.__tablename__ not in inspector.get_table_names():
-        print(f"⚠️ Table {StockTable.__tablename__} does not exist!")
-        return pd.DataFrame()
+@instrument()
+def get_stock_prices(symbol: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    """Get stock price data of a stock code, optionally limited to [start_date, end_date]"""
+    return read_price_frame(symbol, start_date, end_date)
+
+@instrument()
+def get_stock_prices_multi(symbols: list, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    """
+    Get stock prices of several stock codes as one long DataFrame with a `symbol` column.
+    With the `bars` layout this is a single range scan over the (symbol, interval, time) key.
+    """
+    if not use_bars_layout():
+        frames = [read_price_frame(symbol, start_date, end_date).assign(symbol=symbol) for symbol in symbols]
+        frames = [frame for frame in frames if not frame.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["symbol"] + PRICE_COLUMNS)
+
+    table = Bar.__table__
+    archived = [symbol for symbol in symbols if archive.has_archive(symbol)]
+    df = read_frame(table, ["symbol"] + PRICE_COLUMNS,
+                    [table.c.symbol.in_([symbol for symbol in symbols if symbol not in archived]),
+                     table.c.interval == STOCK_INTERVAL], start_date, end_date)
+    frames = [df] + [read_price_frame(symbol, start_date, end_date).assign(symbol=symbol) for symbol in archived]
+    df = pd.concat([frame for frame in frames if not frame.empty] or [df], ignore_index=True)
+    return df.sort_values(["symbol", "time"], kind="stable").reset_index(drop=True)
+
+@instrument(rows=int)
+def archive_stock_prices(symbol: str, hot_days: int = strings.HOT_WINDOW_DAYS) -> int:
+    """
+    Move the minute bars of a stock code older than the hot window to the Parquet archive.
+    Only whole months are archived; rows are deleted from SQLite once their partitions are written.
+    Return the number of rows moved.
+    """
+    table, filters = _price_table(symbol)
+    if table is None:
+        return 0
+
+    cutoff = (pd.Timestamp.now() - pd.Timedelta(days=hot_days)).to_period("M").to_timestamp()
+    cold = read_frame(table, PRICE_COLUMNS, filters + [table.c.time < cutoff.to_pydatetime()])
+    if cold.empty:
+        return 0
+
+    written = archive.write_archive(symbol, cold)
 
     def _execute():
-        with SessionLocal() as session:
-            query = session.query(StockTable).filter(
-                StockTable.time >= start_date,
-                StockTable.time <= end_date
-            ).order_by(StockTable.time.asc()).all()
-            
-            return pd.DataFrame([{
-                "time": record.time,
-                "open": record.open,
-                "high": record.high,
-                "low": record.low,
-                "close": record.close,
-                "volume": record.volume
-            } for record in query])
+        with engine.begin() as conn:
+            conn.execute(table.delete().where(*filters, table.c.time < cutoff.to_pydatetime()))
 
-    return safe_execute(_execute)
+    safe_execute(_execute)
+    print(f"✅ {symbol}: {len(cold)} rows older than {cutoff:%Y-%m} moved to the archive ({written} new)")
+    return len(cold)
 
+def archive_cold_prices(symbols: list, hot_days: int = strings.HOT_WINDOW_DAYS) -> dict:
+    """Archive the cold minute bars of several stock codes, return symbol -> rows moved"""
+    return {symbol: archive_stock_prices(symbol, hot_days) for symbol in symbols}
+
+def migrate_to_bars(drop_old_tables: bool = False):
+    """
+    One-shot migration copying every `stock_<symbol>` table into the shared `bars` table.
+    Rows already present in `bars` are skipped, so the migration can safely be re-run.
+    Return a dict of symbol -> number of rows copied.
+    """
+    Base.metadata.create_all(bind=engine, tables=[Bar.__table__])
+
+    stock_tables = list_tables("stock_")
+    copied = {}
+    for table_name in stock_tables:
+        symbol = table_name[len("stock_"):].upper()
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                f'INSERT OR IGNORE INTO bars (symbol, interval, time, open, high, low, close, volume) '
+                f'SELECT :symbol, :interval, time, open, high, low, close, volume FROM "{table_name}"'
+            ), {"symbol": symbol, "interval": STOCK_INTERVAL})
+            copied[symbol] = max(result.rowcount, 0)
+            if drop_old_tables:
+                conn.execute(text(f'DROP TABLE "{table_name}"'))
+                _existing_tables.discard(table_name)
+                _indexed_tables.discard(table_name)
+        print(f"✅ Migrated {copied[symbol]} rows from {table_name} to bars")
+
+    return copied
+
+def get_order_book_watermark(symbol: str, session_date):
+    """Highest order book id stored for a stock code in a trading session, None if none"""
+    key = (symbol, session_date)
+    if key not in _order_book_watermarks:
+        OrderBookWatermark.__table__.create(bind=engine, checkfirst=True)
+        with SessionLocal() as session:
+            _order_book_watermarks[key] = session.query(OrderBookWatermark.last_id).filter(
+                OrderBookWatermark.symbol == symbol, OrderBookWatermark.session_date == session_date
+            ).scalar()
+    return _order_book_watermarks[key]
+
+def get_order_book_watermarks(symbol: str) -> dict:
+    """Highest order book id stored for a stock code in each trading session, by session date"""
+    OrderBookWatermark.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as session:
+        rows = session.query(OrderBookWatermark.session_date, OrderBookWatermark.last_id).filter(
+            OrderBookWatermark.symbol == symbol
+        ).all()
+    return {session_date: last_id for session_date, last_id in rows}
+
+def _set_order_book_watermark(conn, symbol: str, session_date, last_id: int):
+    stmt = sqlite_insert(OrderBookWatermark.__table__).values(
+        symbol=symbol, session_date=session_date, last_id=last_id, updated_at=datetime.now()
+    )
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["symbol", "session_date"],
+        set_={"last_id": stmt.excluded.last_id, "updated_at": stmt.excluded.updated_at}
+    ))
+
+@instrument()
 def save_order_book(symbol: str, df: pd.DataFrame):
-    """Save Order Book data to database, avoid duplicate storage"""
+    """
+    Save Order Book data to database, avoid duplicate storage. Return (inserted, skipped) row counts.
+    Matches with an id at or below the watermark of their session were stored by an earlier poll
+    and are dropped before touching the table; the unique index still guards against duplicates.
+    """
     OrderBookTable  = create_order_book_table(symbol)
     
     if df.empty:
         print(f"⚠️ Data for {symbol} is empty!")
-        return
+        return 0, 0
 
     is_exists = table_exists(OrderBookTable.__tablename__)
 
@@ -160,99 +547,316 @@ def save_order_book(symbol: str, df: pd.DataFrame):
         print(f"🛠 Creating table {OrderBookTable.__tablename__} for {symbol}...")
         with engine.begin() as conn:
             OrderBookTable.__table__.create(bind=conn)
-    
-    def _execute():
-        with SessionLocal() as session:
-            for _, row in df.iterrows():
-                exists_query = session.query(
-                    exists().where(
-                        (OrderBookTable.order_book_id == row['id'])
-                    )
-                ).scalar()
-
-                if not exists_query:
-                    order_data = OrderBookTable(
-                        time=row['time'],
-                        price=row['price'],
-                        volume=row['volume'],
-                        match_type=row['match_type'],
-                        order_book_id=row['id']
-                    )
-                    session.add(order_data)
-
-            session.commit()
+    ensure_unique_index(OrderBookTable.__table__, "order_book_id")
 
-    safe_execute(_execute)
+    frame = df.rename(columns={"id": "order_book_id"})
+    sessions = pd.to_datetime(frame["time"]).dt.date
+    new_rows, watermarks = [], {}
+    for session_date, rows in frame.groupby(sessions):
+        watermark = get_order_book_watermark(symbol, session_date)
+        if watermark is not None:
+            rows = rows[rows["order_book_id"] > watermark]
+        if not rows.empty:
+            new_rows.append(rows)
+            watermarks[session_date] = int(rows["order_book_id"].max())
 
-def get_order_book(symbol: str) -> pd.DataFrame:
-    """Get Order Book data from database"""
+    records = frame_to_records(pd.concat(new_rows), ORDER_BOOK_COLUMNS, "order_book_id") if new_rows else []
 
+    def _execute():
+        inserted = bulk_insert(OrderBookTable.__table__, records, ["order_book_id"])
+        with engine.begin() as conn:
+            for session_date, last_id in watermarks.items():
+                _set_order_book_watermark(conn, symbol, session_date, last_id)
+        return inserted
+
+    inserted = safe_execute(_execute)
+    for session_date, last_id in watermarks.items():
+        _order_book_watermarks[(symbol, session_date)] = last_id
+    skipped = len(df) - inserted
+    print(f"✅ Order book {symbol}: {inserted} rows inserted, {skipped} skipped")
+    return inserted, skipped
+
+@instrument()
+def get_order_book(symbol: str, start_date=None, end_date=None, limit: int = None,
+                   descending: bool = False, before_id: int = None, after_id: int = None) -> pd.DataFrame:
+    """
+    Get Order Book data from database, optionally limited to a time window.
+    With descending=True and `limit` this returns the latest matches; pages further back are read
+    by passing the smallest id of the previous page as `before_id`. `after_id` only returns
+    matches newer than an id already processed.
+    """
     OrderBookTable = create_order_book_table(symbol)
 
-    inspector = inspect(engine)
-    if OrderBookTable.__tablename__ not in inspector.get_table_names():
+    if not table_exists(OrderBookTable.__tablename__):
         print(f"⚠️ Table {OrderBookTable.__tablename__} does not exist!")
         return pd.DataFrame()
-    
+
+    table = OrderBookTable.__table__
+    filters = []
+    if before_id is not None:
+        filters.append(table.c.order_book_id < int(before_id))
+    if after_id is not None:
+        filters.append(table.c.order_book_id > int(after_id))
+    df = read_frame(table, ORDER_BOOK_COLUMNS, filters, start_date, end_date, descending, limit,
+                    order_column="order_book_id")
+    return df.rename(columns={"order_book_id": "id"})
+
+@instrument()
+def aggregate_order_book(symbol: str, by: str = "price", start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    Aggregate the matches of a stock code by price level or by match_type in SQL:
+    total volume, number of matches and traded value per group, sorted by `by`.
+    """
+    OrderBookTable = create_order_book_table(symbol)
+    columns = [by, "volume", "trades", "value"]
+    if not table_exists(OrderBookTable.__tablename__):
+        return pd.DataFrame(columns=columns)
+
+    table = OrderBookTable.__table__
+    filters = []
+    if start_date is not None:
+        filters.append(table.c.time >= pd.Timestamp(start_date).to_pydatetime())
+    if end_date is not None:
+        filters.append(table.c.time <= pd.Timestamp(end_date).to_pydatetime())
+    stmt = select(
+        table.c[by], func.sum(table.c.volume), func.count(), func.sum(table.c.volume * table.c.price)
+    ).where(*filters).group_by(table.c[by]).order_by(table.c[by])
+
     def _execute():
-        with SessionLocal() as session:
-            query = session.query(OrderBookTable).all()
-            
-            return pd.DataFrame([{
-                "time": record.time,
-                "price": record.price,
-                "volume": record.volume,
-                "match_type": record.match_type,
-                "id" : record.order_book_id
-            } for record in query])
+        with engine.connect() as conn:
+            return conn.execute(stmt).fetchall()
+
+    df = pd.DataFrame.from_records(safe_execute(_execute), columns=columns)
+    return df.astype({"volume": "float64", "trades": "int64", "value": "float64"})
+
+def get_latest_order_book_id(symbol: str):
+    """Id of the newest stored match of a stock code, None if there is none"""
+    OrderBookTable = create_order_book_table(symbol)
+    if not table_exists(OrderBookTable.__tablename__):
+        return None
+    with SessionLocal() as session:
+        return session.query(func.max(OrderBookTable.order_book_id)).scalar()
+
+@instrument(rows=int)
+def save_order_flow(buckets: pd.DataFrame) -> int:
+    """
+    Insert or replace per-minute order flow buckets in the `order_flow` table. Buckets are recomputed from
+    every match they hold, so a bucket is only replaced by one counting at least as many matches:
+    concurrent updates write the same rows, and one computed from an older read cannot undo a newer one.
+    """
+    if buckets.empty:
+        return 0
+
+    table = OrderFlowBucket.__table__
+    table.create(bind=engine, checkfirst=True)
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=ORDER_FLOW_KEY, set_={
+        "volume": stmt.excluded.volume,
+        "trades": stmt.excluded.trades,
+        "value": stmt.excluded.value,
+        "last_id": stmt.excluded.last_id,
+    }, where=stmt.excluded.trades >= table.c.trades)
+    records = buckets[ORDER_FLOW_COLUMNS].assign(time=pd.to_datetime(buckets["time"])).to_dict("records")
+
+    def _execute():
+        with engine.begin() as conn:
+            for start in range(0, len(records), BULK_CHUNK_SIZE):
+                conn.execute(stmt, records[start:start + BULK_CHUNK_SIZE])
+        return len(records)
 
     return safe_execute(_execute)
 
+def get_order_flow_watermarks(symbol: str) -> dict:
+    """Id of the newest match folded into the order flow buckets of a stock code in each session, by session date"""
+    if not table_exists(OrderFlowBucket.__tablename__):
+        return {}
+    session_date = func.date(OrderFlowBucket.time)
+    with SessionLocal() as session:
+        rows = session.query(session_date, func.max(OrderFlowBucket.last_id)).filter(
+            OrderFlowBucket.symbol == symbol
+        ).group_by(session_date).all()
+    return {date.fromisoformat(day): last_id for day, last_id in rows}
+
+@instrument()
+def get_order_flow_buckets(symbol: str, start_date=None, end_date=None, descending: bool = False,
+                           limit: int = None) -> pd.DataFrame:
+    """Get the order flow buckets of a stock code sorted by time"""
+    table = OrderFlowBucket.__table__
+    columns = ORDER_FLOW_COLUMNS[1:]
+    if not table_exists(table.name):
+        return pd.DataFrame(columns=columns)
+    return read_frame(table, columns, [table.c.symbol == symbol], start_date, end_date, descending, limit)
+
+@instrument()
 def get_vnindex_infor(start_date: str, end_date: str) -> pd.DataFrame:
     """Get data vnindex from database"""
+    return read_frame(VNIndexPrice.__table__, PRICE_COLUMNS, start_date=start_date, end_date=end_date)
+
+@instrument(rows=int)
+def save_daily_features(symbol: str, df: pd.DataFrame) -> int:
+    """Insert or replace the daily feature rows of a stock code (or VNINDEX), return rows written"""
+    if df.empty:
+        return 0
+
+    DailyFeature.__table__.create(bind=engine, checkfirst=True)
+    records = frame_to_records(df.assign(symbol=symbol), DAILY_FEATURE_COLUMNS, "time")
+    return safe_execute(bulk_upsert, DailyFeature.__table__, records, ["symbol", "time"])
+
+def get_latest_daily_feature_time(symbol: str):
+    """Get the session of the newest stored daily feature row of a stock code, None if it has none"""
+    if not table_exists(DailyFeature.__tablename__):
+        return None
+    with SessionLocal() as session:
+        return session.query(func.max(DailyFeature.time)).filter(DailyFeature.symbol == symbol).scalar()
+
+@instrument()
+def get_daily_features(symbol: str, start_date=None, end_date=None, columns: list = None, before=None,
+                       limit: int = None) -> pd.DataFrame:
+    """
+    Get the stored daily features of a stock code sorted by time. `before` keeps only the sessions
+    strictly older than it; with `limit` the newest of them are returned.
+    """
+    table = DailyFeature.__table__
+    columns = columns or DAILY_FEATURE_COLUMNS[1:]
+    if not table_exists(table.name):
+        return pd.DataFrame(columns=columns)
+
+    filters = [table.c.symbol == symbol]
+    if before is not None:
+        filters.append(table.c.time < pd.Timestamp(before).to_pydatetime())
+    df = read_frame(table, columns, filters, start_date, end_date, descending=limit is not None, limit=limit)
+    return df.iloc[::-1].reset_index(drop=True) if limit is not None else df
+
+@instrument(rows=int)
+def save_indicator_snapshots(df: pd.DataFrame) -> int:
+    """Insert or replace the latest indicator row of every symbol in `df`, return rows written"""
+    if df.empty:
+        return 0
+
+    IndicatorSnapshot.__table__.create(bind=engine, checkfirst=True)
+    columns = [column.name for column in IndicatorSnapshot.__table__.columns]
+    records = frame_to_records(df, columns, "symbol")
+    return safe_execute(bulk_upsert, IndicatorSnapshot.__table__, records, ["symbol"])
+
+@instrument()
+def get_indicator_snapshots() -> pd.DataFrame:
+    """Get the latest indicator row of every symbol"""
+    table = IndicatorSnapshot.__table__
+    if not table_exists(table.name):
+        return pd.DataFrame(columns=[column.name for column in table.columns])
+    return read_frame(table, order_column="symbol")
+
+def save_symbol_group(group_name: str, symbols: list):
+    """Replace the stored members of a symbol group (VN30, HOSE, ...)"""
+    SymbolGroup.__table__.create(bind=engine, checkfirst=True)
+    updated_at = datetime.now()
 
     def _execute():
-        with SessionLocal() as session:
-            query = session.query(VNIndexPrice).filter(
-                VNIndexPrice.time >= start_date,
-                VNIndexPrice.time <= end_date
-            ).order_by(VNIndexPrice.time.asc()).all()
-            
-            return pd.DataFrame([{
-                "time": record.time,
-                "open": record.open,
-                "high": record.high,
-                "low": record.low,
-                "close": record.close,
-                "volume": record.volume
-            } for record in query])
+        with engine.begin() as conn:
+            conn.execute(SymbolGroup.__table__.delete().where(SymbolGroup.group_name == group_name))
+            conn.execute(SymbolGroup.__table__.insert(), [
+                {"group_name": group_name, "symbol": symbol, "updated_at": updated_at}
+                for symbol in dict.fromkeys(symbols)
+            ])
 
-    return safe_execute(_execute)
+    safe_execute(_execute)
+    return updated_at
+
+def get_symbol_group(group_name: str):
+    """Get the stored members of a symbol group and when they were last refreshed, ([], None) if unknown"""
+    if not table_exists(SymbolGroup.__tablename__):
+        return [], None
 
-def init_db():
+    with SessionLocal() as session:
+        rows = session.query(SymbolGroup.symbol, SymbolGroup.updated_at).filter(
+            SymbolGroup.group_name == group_name
+        ).order_by(SymbolGroup.symbol.asc()).all()
+
+    if not rows:
+        return [], None
+    return [row.symbol for row in rows], min(row.updated_at for row in rows)
+
+def try_start_job(job_name: str, lease_seconds: float):
+    """
+    Mark a job as running if no other run holds it. A running mark older than `lease_seconds`
+    is considered left by a crashed process and is taken over.
+    Return the start time of the run, or None if the job is already running.
+    """
+    JobState.__table__.create(bind=engine, checkfirst=True)
+    JobRun.__table__.create(bind=engine, checkfirst=True)
+    now = datetime.now()
+    table = JobState.__table__
+
+    def _execute():
+        with engine.begin() as conn:
+            conn.execute(sqlite_insert(table).values(
+                job_name=job_name, status="idle", run_count=0, failure_count=0
+            ).on_conflict_do_nothing(index_elements=["job_name"]))
+            result = conn.execute(table.update().where(
+                table.c.job_name == job_name,
+                (table.c.status != "running") | (table.c.started_at < now - relativedelta(seconds=int(lease_seconds)))
+            ).values(status="running", started_at=now))
+            return result.rowcount
+
+    return now if safe_execute(_execute) else None
+
+def finish_job(job_name: str, started_at, status: str, duration: float, error: str = None, watermark: str = None):
+    """Record the outcome of a job run and release it; the watermark only moves on success."""
+    table = JobState.__table__
+    finished_at = datetime.now()
+    values = {
+        "status": status, "finished_at": finished_at, "last_duration": duration, "last_error": error,
+        "run_count": table.c.run_count + 1,
+        "failure_count": table.c.failure_count + (1 if status == "error" else 0),
+    }
+    if status == "ok":
+        values["last_success_at"] = finished_at
+        if watermark is not None:
+            values["watermark"] = str(watermark)
+
+    def _execute():
+        with engine.begin() as conn:
+            conn.execute(table.update().where(table.c.job_name == job_name).values(**values))
+            conn.execute(JobRun.__table__.insert(), [{
+                "job_name": job_name, "started_at": started_at, "duration": duration,
+                "status": status, "error": error,
+            }])
+
+    safe_execute(_execute)
+
+def get_job_states() -> pd.DataFrame:
+    """Get the persisted state of every scheduled job"""
+    if not table_exists(JobState.__tablename__):
+        return pd.DataFrame(columns=[column.name for column in JobState.__table__.columns])
+    return read_frame(JobState.__table__)
+
+def get_job_runs(job_name: str = None, limit: int = 100) -> pd.DataFrame:
+    """Get the most recent runs of the scheduled jobs (or of one job), newest first"""
+    if not table_exists(JobRun.__tablename__):
+        return pd.DataFrame(columns=[column.name for column in JobRun.__table__.columns])
+    filters = [JobRun.__table__.c.job_name == job_name] if job_name else None
+    return read_frame(JobRun.__table__, filters=filters, descending=True, limit=limit, order_column="started_at")
+
+def init_db(source=None):
     """Initialize database: create tables and fetch data for the first time if needed."""
+    from services.ingest import ingest
+    from services.universe import get_symbols
+
     print("🔧 Initializing database...")
 
     Base.metadata.create_all(bind=engine)
+    migrate_indexes()
 
     today = datetime.today().strftime("%Y-%m-%d")
     start_date = (datetime.today() - relativedelta(years=3)).strftime("%Y-%m-%d") 
-    print("🚀 Fetching initial VNINDEX data...")
-    vnindex_df = fetch_vnindex_data(start_date, today)
-    if not vnindex_df.empty:
-        save_vnindex_prices(vnindex_df)
+    start_dates = {strings.VNINDEX: start_date}
 
-    symbols = Vnstock().stock().listing.symbols_by_group('VN30')
+    symbols = get_symbols('VN30')
     for symbol in symbols:
-        table_name = f"stock_prices_{symbol.lower()}"
-        if not table_exists(table_name):
-            print(f"🚀 Fetching initial data for {symbol}...")
-            stock_df = fetch_stock_data(symbol, start_date, today)
-            order_book_df = fetch_order_book_stock_data(symbol)
-            if not stock_df.empty:
-                save_stock_prices(symbol, stock_df)
-            
-            if not order_book_df.empty:
-                save_order_book(symbol,order_book_df)
-
-    print("✅ Database initialized successfully!")
\ No newline at end of file
+        if get_latest_stock_date(symbol) is None:
+            start_dates[symbol] = start_date
+
+    print(f"🚀 Fetching initial data for {len(start_dates)} symbols...")
+    ingest(start_dates, today, source=source)
+
+    print("✅ Database initialized successfully!")
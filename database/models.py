@@ -10,13 +10,136 @@ class VNIndexPrice(Base):
     __tablename__ = "vnindex_prices"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    time = Column(DateTime, nullable=False)
+    time = Column(DateTime, nullable=False, unique=True, index=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=False)
+
+class Bar(Base):
+    """
+    Bảng chung lưu dữ liệu giá của mọi mã chứng khoán, khóa theo (symbol, interval, time).
+    Bảng WITHOUT ROWID nên khóa chính đồng thời là chỉ mục bao phủ cho truy vấn theo khoảng thời gian.
+    """
+    __tablename__ = "bars"
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    symbol = Column(String, primary_key=True)
+    interval = Column(String, primary_key=True)
+    time = Column(DateTime, primary_key=True)
     open = Column(Float, nullable=False)
     high = Column(Float, nullable=False)
     low = Column(Float, nullable=False)
     close = Column(Float, nullable=False)
     volume = Column(Integer, nullable=False)
 
+class DailyFeature(Base):
+    """
+    Bảng lưu các chỉ báo theo ngày tính sẵn từ nến ngày của từng mã và VNINDEX (lợi suất, độ biến động,
+    các đường MA), dùng chung cho huấn luyện, dự đoán và biểu đồ. Chỉ các phiên mới được tính lại khi có dữ liệu mới.
+    """
+    __tablename__ = "daily_features"
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    symbol = Column(String, primary_key=True)
+    time = Column(DateTime, primary_key=True)
+    close = Column(Float, nullable=False)
+    returns = Column(Float)
+    volatility = Column(Float)
+    ma_5 = Column(Float)
+    ma_10 = Column(Float)
+    ma_20 = Column(Float)
+    ma_50 = Column(Float)
+
+class IndicatorSnapshot(Base):
+    """
+    Bảng lưu các chỉ báo mới nhất theo ngày của từng mã (giá, MA, biến động, khối lượng, % thay đổi),
+    mỗi mã một dòng, được cập nhật sau mỗi lần lưu dữ liệu mới để bộ lọc cổ phiếu không phải đọc lịch sử.
+    """
+    __tablename__ = "indicator_snapshot"
+
+    symbol = Column(String, primary_key=True)
+    time = Column(DateTime, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+    prev_close = Column(Float)
+    ma_20 = Column(Float)
+    ma_50 = Column(Float)
+    prev_ma_20 = Column(Float)
+    prev_ma_50 = Column(Float)
+    volatility = Column(Float)
+    avg_volume = Column(Float)
+    change_1d = Column(Float)
+    change_5d = Column(Float)
+    change_20d = Column(Float)
+    change_60d = Column(Float)
+    sessions = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class SymbolGroup(Base):
+    """Bảng lưu danh sách mã chứng khoán theo nhóm (VN30, VN100, HNX30, HOSE, ...)"""
+    __tablename__ = "symbol_groups"
+
+    group_name = Column(String, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    updated_at = Column(DateTime, nullable=False)
+
+class OrderBookWatermark(Base):
+    """Bảng lưu id lệnh khớp lớn nhất đã lưu của từng mã trong từng phiên giao dịch"""
+    __tablename__ = "trade_watermarks"
+
+    symbol = Column(String, primary_key=True)
+    session_date = Column(Date, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class OrderFlowBucket(Base):
+    """
+    Bảng tổng hợp lệnh khớp theo từng phút, mức giá và loại lệnh (mua/bán) của từng mã,
+    được cập nhật dần khi có lệnh khớp mới. last_id là id lệnh khớp mới nhất đã được cộng vào.
+    """
+    __tablename__ = "order_flow"
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    symbol = Column(String, primary_key=True)
+    time = Column(DateTime, primary_key=True)
+    price = Column(Float, primary_key=True)
+    match_type = Column(String, primary_key=True)
+    volume = Column(Float, nullable=False)
+    trades = Column(Integer, nullable=False)
+    value = Column(Float, nullable=False)
+    last_id = Column(Integer, nullable=False)
+
+class JobState(Base):
+    """
+    Bảng lưu trạng thái của từng tác vụ định kỳ (đang chạy hay không, lần chạy gần nhất,
+    mốc dữ liệu của lần chạy thành công gần nhất).
+    """
+    __tablename__ = "job_state"
+
+    job_name = Column(String, primary_key=True)
+    status = Column(String, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    last_success_at = Column(DateTime)
+    watermark = Column(String)
+    last_duration = Column(Float)
+    last_error = Column(String)
+    run_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+
+class JobRun(Base):
+    """Bảng lưu lịch sử từng lần chạy của tác vụ định kỳ và thời gian chạy"""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_name = Column(String, nullable=False, index=True)
+    started_at = Column(DateTime, nullable=False)
+    duration = Column(Float, nullable=False)
+    status = Column(String, nullable=False)
+    error = Column(String)
+
 def create_stock_table(symbol: str):
     """
     Tạo bảng riêng cho từng mã chứng khoán (ví dụ: stock_vnd, stock_hpg).
@@ -31,7 +154,7 @@ def create_stock_table(symbol: str):
         __table_args__ = {'extend_existing': True}
 
         id = Column(Integer, primary_key=True, autoincrement=True)
-        time = Column(DateTime, nullable=False)
+        time = Column(DateTime, nullable=False, unique=True, index=True)
         open = Column(Float, nullable=False)
         high = Column(Float, nullable=False)
         low = Column(Float, nullable=False)
@@ -55,11 +178,11 @@ def create_order_book_table(symbol: str):
         __table_args__ = {'extend_existing': True}
 
         id = Column(Integer, primary_key=True, autoincrement=True)
-        time = Column(DateTime, nullable=False)
+        time = Column(DateTime, nullable=False, index=True)
         price = Column(Float, nullable=False)
         volume = Column(Float, nullable=False)
         match_type = Column(String, nullable=False)
-        order_book_id = Column(Integer, nullable=False)
+        order_book_id = Column(Integer, nullable=False, unique=True, index=True)
 
     _order_book_table_cache[symbol] = OrderBookTable
     return OrderBookTable
@@ -0,0 +1,74 @@
+import pandas as pd
+from database.database import STOCK_INTERVAL, get_bars, get_latest_bar_time, read_price_frame, upsert_bars
+
+# Intervals pre-aggregated from the stored minute bars
+ROLLUP_INTERVALS = ["5m", "15m", "1h", "1D", "1W"]
+# pandas resample rule of each interval, weeks start on Monday
+RESAMPLE_RULES = {"1m": "1min", "5m": "5min", "15m": "15min", "1h": "60min", "1D": "1D", "1W": "W-MON"}
+# Approximate number of bars per trading day (09:00-11:30 and 13:00-14:45 sessions)
+BARS_PER_TRADING_DAY = {"1m": 255, "5m": 51, "15m": 17, "1h": 5, "1D": 1, "1W": 0.2}
+# Default maximum number of points shipped to a chart
+DEFAULT_MAX_POINTS = 500
+
+
+def resample_ohlcv(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Aggregate OHLCV rows with a `time` column into bars of `interval`, empty buckets dropped."""
+    if df.empty:
+        return df
+
+    bars = df.set_index("time").resample(RESAMPLE_RULES[interval], label="left", closed="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    )
+    return bars.dropna(subset=["close"]).reset_index()
+
+
+def choose_interval(start_date, end_date, max_points: int = DEFAULT_MAX_POINTS) -> str:
+    """Finest interval whose estimated number of bars over [start_date, end_date] fits in `max_points`."""
+    days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    trading_days = max(1.0, days * 5 / 7)
+    for interval in [STOCK_INTERVAL] + ROLLUP_INTERVALS:
+        if trading_days * BARS_PER_TRADING_DAY[interval] <= max_points:
+            return interval
+    return ROLLUP_INTERVALS[-1]
+
+
+def update_rollups(symbol: str, since=None) -> int:
+    """
+    Bring every rollup interval of a stock code up to date with its minute bars.
+    The newest stored bucket of each interval may be partial, so aggregation restarts from it
+    and the buckets are upserted. Minute bars are read once, from the oldest of those buckets.
+    `since` also re-aggregates the buckets from that time, e.g. after older bars were backfilled.
+    Return the number of rollup rows written.
+    """
+    watermarks = {interval: get_latest_bar_time(symbol, interval) for interval in ROLLUP_INTERVALS}
+    if since is not None:
+        # Restart from the Monday of `since`, the start of the coarsest bucket containing it
+        since = pd.Timestamp(since).normalize()
+        since -= pd.Timedelta(days=since.weekday())
+        watermarks = {interval: None if watermark is None else min(pd.Timestamp(watermark), since)
+                      for interval, watermark in watermarks.items()}
+    known = [pd.Timestamp(watermark) for watermark in watermarks.values() if watermark is not None]
+    start = min(known) if len(known) == len(watermarks) else None
+
+    minutes = read_price_frame(symbol, start_date=start)
+    if minutes.empty:
+        return 0
+
+    written = 0
+    for interval, watermark in watermarks.items():
+        rows = minutes if watermark is None else minutes[minutes["time"] >= pd.Timestamp(watermark)]
+        written += upsert_bars(symbol, interval, resample_ohlcv(rows, interval))
+    return written
+
+
+def get_rollup(symbol: str, interval: str, start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    Get bars of a stock code at `interval`, minute bars come from the price table and coarser
+    intervals from the stored rollups, which are built on first use.
+    """
+    if interval == STOCK_INTERVAL:
+        return read_price_frame(symbol, start_date, end_date)
+
+    if get_latest_bar_time(symbol, interval) is None:
+        update_rollups(symbol)
+    return get_bars(symbol, interval, start_date, end_date)
@@ -0,0 +1,187 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from services.estimators import DEFAULT_MODEL_TYPE, ONLINE_MODEL_TYPES, TRAIN_MODEL_TYPES, make_estimator
+from services.features import FEATURE_COLUMNS, load_training_frame, to_ordinal
+from services.train import TRAIN_WORKERS, _init_worker
+
+# "expanding" trains every fold on all sessions before it, "rolling" on the last BACKTEST_TRAIN_DAYS only
+BACKTEST_WINDOW = os.environ.get("STOCK_BACKTEST_WINDOW", "expanding")
+# Trading sessions in the training window of a rolling backtest
+BACKTEST_TRAIN_DAYS = int(os.environ.get("STOCK_BACKTEST_TRAIN_DAYS", 120))
+# Trading sessions predicted by each fold, the model is retrained between folds
+BACKTEST_TEST_DAYS = int(os.environ.get("STOCK_BACKTEST_TEST_DAYS", 20))
+# Sessions needed before the first fold of an expanding backtest
+BACKTEST_MIN_TRAIN_DAYS = int(os.environ.get("STOCK_BACKTEST_MIN_TRAIN_DAYS", 60))
+# Folder of the CSV reports written by `python -m services.backtest`
+BACKTEST_DIR = os.environ.get("STOCK_BACKTEST_DIR", "backtests")
+
+
+def load_backtest_arrays(symbol: str) -> dict:
+    """
+    Features, target, previous close and session day of every bar of a stock code as NumPy arrays,
+    loaded once and sliced by every fold.
+    """
+    df = load_training_frame(symbol)
+    if df.empty:
+        return None
+
+    X = df[FEATURE_COLUMNS].assign(time=to_ordinal(df['time'])).to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    return {
+        "X": X,
+        "y": close,
+        "previous_close": np.concatenate([[np.nan], close[:-1]]),
+        "days": df['time'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]'),
+    }
+
+
+def fold_bounds(days: np.ndarray, window: str = BACKTEST_WINDOW, train_days: int = BACKTEST_TRAIN_DAYS,
+                test_days: int = BACKTEST_TEST_DAYS, min_train_days: int = None) -> list:
+    """
+    Row offsets (train_start, test_start, test_end) of the walk-forward folds over bars sorted by time,
+    `days` being the session day of every bar. Folds cover whole sessions and never overlap.
+    """
+    if window not in ("expanding", "rolling"):
+        raise ValueError(f"Unknown backtest window: {window}")
+    if min_train_days is None:
+        min_train_days = train_days if window == "rolling" else BACKTEST_MIN_TRAIN_DAYS
+
+    _, starts = np.unique(days, return_index=True)
+    starts = np.append(starts, len(days))
+    sessions = len(starts) - 1
+
+    folds = []
+    for test_first in range(min_train_days, sessions, test_days):
+        test_last = min(test_first + test_days, sessions)
+        train_first = 0 if window == "expanding" else max(0, test_first - train_days)
+        folds.append((int(starts[train_first]), int(starts[test_first]), int(starts[test_last])))
+    return folds
+
+
+def fold_metrics(y_true: np.ndarray, y_pred: np.ndarray, previous_close: np.ndarray) -> dict:
+    """
+    MAE, RMSE and R² of the predicted closes, and the directional accuracy: the share of bars whose
+    close moved from the previous close in the predicted direction (unchanged bars are ignored).
+    """
+    errors = y_pred - y_true
+    total = np.sum((y_true - y_true.mean()) ** 2)
+    moved = ~np.isnan(previous_close) & (y_true != previous_close)
+    hits = np.sign(y_pred[moved] - previous_close[moved]) == np.sign(y_true[moved] - previous_close[moved])
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "r2": float(1 - np.sum(errors ** 2) / total) if total else np.nan,
+        "directional_accuracy": float(hits.mean()) if moved.any() else np.nan,
+    }
+
+
+def backtest_symbol(symbol: str, window: str = BACKTEST_WINDOW, train_days: int = BACKTEST_TRAIN_DAYS,
+                    test_days: int = BACKTEST_TEST_DAYS, min_train_days: int = None,
+                    model_type: str = DEFAULT_MODEL_TYPE) -> pd.DataFrame:
+    """
+    Walk-forward retrain and predict over the stored history of a stock code, one row per fold.
+    With an expanding window, online models are not refitted but updated with the bars added to the window,
+    as they are in production.
+    """
+    arrays = load_backtest_arrays(symbol)
+    if arrays is None:
+        return pd.DataFrame()
+
+    X, y, previous_close, days = arrays["X"], arrays["y"], arrays["previous_close"], arrays["days"]
+    incremental = window == "expanding" and model_type in ONLINE_MODEL_TYPES
+    model, learned = None, 0
+    rows = []
+    for fold, (train_start, test_start, test_end) in enumerate(
+            fold_bounds(days, window, train_days, test_days, min_train_days)):
+        started = time.perf_counter()
+        if incremental and model is not None:
+            model.partial_fit(X[learned:test_start], y[learned:test_start])
+        else:
+            model = make_estimator(model_type).fit(X[train_start:test_start], y[train_start:test_start])
+        learned = test_start
+        y_pred = model.predict(X[test_start:test_end])
+
+        rows.append({
+            "symbol": symbol,
+            "model_type": model_type,
+            "fold": fold,
+            "train_start": days[train_start],
+            "test_start": days[test_start],
+            "test_end": days[test_end - 1],
+            "train_rows": test_start - train_start,
+            "test_rows": test_end - test_start,
+            **fold_metrics(y[test_start:test_end], y_pred, previous_close[test_start:test_end]),
+            "seconds": time.perf_counter() - started,
+        })
+    return pd.DataFrame(rows)
+
+
+def _backtest_timed(symbol: str, options: dict):
+    """Backtest one symbol and return (folds, error), runs in a worker process"""
+    try:
+        return backtest_symbol(symbol, **options), None
+    except Exception as e:
+        print(f"❌ Error when backtesting {symbol}: {e}")
+        return pd.DataFrame(), str(e)
+
+
+def summarize_backtest(folds: pd.DataFrame) -> pd.DataFrame:
+    """Per-symbol and model type errors over every fold, weighted by the number of predicted bars"""
+    columns = ["symbol", "model_type", "folds", "test_rows", "mae", "rmse", "r2", "directional_accuracy"]
+    if folds.empty:
+        return pd.DataFrame(columns=columns)
+
+    weights = folds["test_rows"]
+    weighted = folds.assign(mae=folds["mae"] * weights, mse=folds["rmse"] ** 2 * weights,
+                            directional_accuracy=folds["directional_accuracy"] * weights)
+    summary = weighted.groupby(["symbol", "model_type"]).agg(folds=("fold", "size"), test_rows=("test_rows", "sum"),
+                                             mae=("mae", "sum"), mse=("mse", "sum"), r2=("r2", "mean"),
+                                             directional_accuracy=("directional_accuracy", "sum"))
+    summary["mae"] /= summary["test_rows"]
+    summary["rmse"] = np.sqrt(summary.pop("mse") / summary["test_rows"])
+    summary["directional_accuracy"] /= summary["test_rows"]
+    return summary.reset_index()[columns]
+
+
+def backtest_all(symbols: list, window: str = BACKTEST_WINDOW, train_days: int = BACKTEST_TRAIN_DAYS,
+                 test_days: int = BACKTEST_TEST_DAYS, min_train_days: int = None,
+                 model_type: str = DEFAULT_MODEL_TYPE, workers: int = TRAIN_WORKERS):
+    """
+    Walk-forward backtest of every stock code, in parallel across `workers` processes.
+    Return (folds, summary): the errors of every fold and their per-symbol aggregate.
+    """
+    started = time.perf_counter()
+    options = {"window": window, "train_days": train_days, "test_days": test_days, "min_train_days": min_train_days,
+               "model_type": model_type}
+    workers = max(1, min(workers, len(symbols)))
+
+    if workers == 1:
+        results = [_backtest_timed(symbol, options) for symbol in symbols]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(_backtest_timed, symbol, options) for symbol in symbols]
+            results = [future.result() for future in as_completed(futures)]
+
+    frames = [folds for folds, _ in results if not folds.empty]
+    folds = pd.concat(frames, ignore_index=True).sort_values(["symbol", "fold"], ignore_index=True) if frames \
+        else pd.DataFrame()
+    summary = summarize_backtest(folds)
+    failed = sum(error is not None for _, error in results)
+    print(summary.to_string(index=False))
+    print(f"✅ Backtested {len(symbols)} symbols with the {model_type} model ({len(folds)} folds, {failed} failed, "
+          f"{window} window) with {workers} workers in {time.perf_counter() - started:.2f}s")
+    return folds, summary
+
+
+if __name__ == "__main__":
+    from services.universe import get_symbols
+    reports = [backtest_all(get_symbols('VN30'), model_type=model_type) for model_type in TRAIN_MODEL_TYPES]
+    folds = pd.concat([folds for folds, _ in reports], ignore_index=True)
+    summary = pd.concat([summary for _, summary in reports], ignore_index=True)
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    folds.to_csv(os.path.join(BACKTEST_DIR, "folds.csv"), index=False)
+    summary.to_csv(os.path.join(BACKTEST_DIR, "summary.csv"), index=False)
+    print(f"✅ Backtest reports written to {BACKTEST_DIR}")
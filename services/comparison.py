@@ -0,0 +1,220 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from constants import strings
+from services.ingest import INGEST_MAX_WORKERS
+from services.instrumentation import instrument, span
+from services.market_data import DAILY_TTL_SECONDS, TTLCache, get_history
+
+# Trading sessions of the rolling correlation window
+CORRELATION_WINDOW = int(os.environ.get("STOCK_CORRELATION_WINDOW", 20))
+# Sessions per year, used to annualize volatility
+TRADING_DAYS_PER_YEAR = 252
+# Maximum number of aligned (ticker set, range) matrices and of their analytics kept in memory
+COMPARISON_CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_COMPARISON_CACHE_MAX_ENTRIES", 16))
+
+_cache = TTLCache(COMPARISON_CACHE_MAX_ENTRIES)
+
+
+class AlignedPrices:
+    """
+    Daily closes of several stock codes on the union of their sessions, one column per ticker,
+    with VNINDEX aligned on the same days. A ticker without a bar on a session keeps its last close,
+    sessions before its first bar are NaN.
+    """
+
+    def __init__(self, days: np.ndarray, tickers: list, close: np.ndarray, benchmark: np.ndarray):
+        self.days = days
+        self.tickers = tickers
+        self.close = close
+        self.benchmark = benchmark
+
+    @property
+    def empty(self) -> bool:
+        return len(self.days) == 0 or not self.tickers
+
+
+def clear_cache():
+    """Drop every aligned matrix and analytics kept in memory."""
+    _cache.clear()
+
+
+def _cache_key(tickers: list, start_date, end_date) -> tuple:
+    return tuple(sorted(set(tickers))), pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+
+
+def _fill_forward(values: np.ndarray) -> np.ndarray:
+    """Replace NaN by the last value above it in each column, leading NaN are kept"""
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def align_closes(frames: dict, benchmark: pd.DataFrame = None) -> AlignedPrices:
+    """Align the daily bars (`time`, `close`) of every ticker in `frames` into one matrix"""
+    frames = {ticker: df for ticker, df in frames.items() if not df.empty}
+    if not frames:
+        return AlignedPrices(np.array([], dtype="datetime64[D]"), [], np.empty((0, 0)), np.array([]))
+
+    tickers = list(frames)
+    days_by_ticker = [pd.to_datetime(frames[t]["time"]).to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+                      for t in tickers]
+    days = np.unique(np.concatenate(days_by_ticker))
+
+    close = np.full((len(days), len(tickers)), np.nan)
+    for column, (ticker, ticker_days) in enumerate(zip(tickers, days_by_ticker)):
+        close[np.searchsorted(days, ticker_days), column] = frames[ticker]["close"].to_numpy(dtype=float)
+
+    index = np.full(len(days), np.nan)
+    if benchmark is not None and not benchmark.empty:
+        benchmark_days = pd.to_datetime(benchmark["time"]).to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        positions = np.searchsorted(days, benchmark_days)
+        known = (positions < len(days)) & (days[np.minimum(positions, len(days) - 1)] == benchmark_days)
+        index[positions[known]] = benchmark["close"].to_numpy(dtype=float)[known]
+
+    return AlignedPrices(days, tickers, _fill_forward(close), _fill_forward(index[:, None])[:, 0])
+
+
+@instrument(rows=lambda aligned: aligned.close.size)
+def load_aligned_prices(tickers: list, start_date, end_date, source=None) -> AlignedPrices:
+    """
+    Daily closes of `tickers` and VNINDEX between start_date and end_date as one aligned matrix,
+    kept in memory per (ticker set, range). Histories are read and fetched concurrently through the market data
+    cache, which only calls the API for sessions missing from the database and writes them back one at a time.
+    """
+    key = _cache_key(tickers, start_date, end_date)
+    aligned = _cache.get(key)
+    if aligned is not None:
+        return aligned
+
+    symbols = list(key[0]) + [strings.VNINDEX]
+    workers = max(1, min(INGEST_MAX_WORKERS, len(symbols)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        histories = list(executor.map(lambda symbol: get_history(symbol, start_date, end_date, "1D", source),
+                                      symbols))
+
+    aligned = align_closes(dict(zip(key[0], histories[:-1])), histories[-1])
+    _cache.put(key, aligned, DAILY_TTL_SECONDS)
+    return aligned
+
+
+def _returns(values: np.ndarray) -> np.ndarray:
+    """Simple returns between consecutive rows, NaN on the first row and before the first close"""
+    returns = np.full(values.shape, np.nan)
+    returns[1:] = values[1:] / values[:-1] - 1
+    return returns
+
+
+def _pairwise_correlation(windows: np.ndarray, min_periods: int) -> np.ndarray:
+    """
+    Correlation matrices of windows shaped (windows, tickers, rows), each pair of tickers over the rows
+    where both have a value. Pairs with fewer than `min_periods` such rows or a constant column give NaN.
+    """
+    present = ~np.isnan(windows)
+    mask = present.astype(float)
+    values = np.where(present, windows, 0.0)
+    count = np.einsum("wik,wjk->wij", mask, mask)
+    # Sums of each ticker of a pair restricted to the rows both have
+    sum_x = np.einsum("wik,wjk->wij", values, mask)
+    sum_y = np.einsum("wik,wjk->wij", mask, values)
+    sum_xx = np.einsum("wik,wjk->wij", values ** 2, mask)
+    sum_yy = np.einsum("wik,wjk->wij", mask, values ** 2)
+    sum_xy = np.einsum("wik,wjk->wij", values, values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sum_xy - sum_x * sum_y / count
+        variance_x = sum_xx - sum_x ** 2 / count
+        variance_y = sum_yy - sum_y ** 2 / count
+        correlation = covariance / np.sqrt(variance_x * variance_y)
+    correlation[(count < max(min_periods, 2)) | (variance_x <= 0) | (variance_y <= 0)] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def rolling_correlation(returns: np.ndarray, window: int = CORRELATION_WINDOW) -> np.ndarray:
+    """
+    Correlation matrices of the columns of `returns` over every window of `window` rows,
+    shaped (rows - window + 1, tickers, tickers). As with pandas rolling().corr(), a pair is NaN
+    in the windows where either ticker has a missing return, constant columns give NaN.
+    """
+    if len(returns) < window:
+        return np.empty((0, returns.shape[1], returns.shape[1]))
+    return _pairwise_correlation(sliding_window_view(returns, window, axis=0), window)
+
+
+def correlation_matrix(returns: np.ndarray) -> np.ndarray:
+    """
+    Correlation matrix of the columns of `returns` over all of its rows, each pair over the rows where
+    both tickers have a return (as pandas DataFrame.corr), so shorter histories are not padded with zeros.
+    """
+    return _pairwise_correlation(returns.T[None], 2)[0]
+
+
+def compute_analytics(aligned: AlignedPrices, window: int = CORRELATION_WINDOW) -> dict:
+    """
+    Performance of every ticker of an aligned matrix in one vectorized pass:
+    normalized prices (100 at the first close, VNINDEX included), drawdowns, summary statistics, the correlation
+    matrix of the whole range and the rolling correlation matrices of `window` sessions.
+    """
+    close = aligned.close
+    first = close[np.argmax(~np.isnan(close), axis=0), np.arange(close.shape[1])]
+    normalized = close / first * 100
+    benchmark = aligned.benchmark
+    benchmark_normalized = benchmark / benchmark[np.argmax(~np.isnan(benchmark))] * 100 if len(benchmark) else benchmark
+    drawdown = close / np.fmax.accumulate(close, axis=0) - 1
+
+    returns = _returns(close)
+    market = _returns(aligned.benchmark)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Beta over the sessions where both the ticker and VNINDEX have a return
+        paired = ~np.isnan(returns) & ~np.isnan(market)[:, None]
+        count = paired.sum(axis=0)
+        stock = np.where(paired, returns, 0)
+        index = np.where(paired, market[:, None], 0)
+        stock_mean, index_mean = stock.sum(axis=0) / count, index.sum(axis=0) / count
+        covariance = (stock * index).sum(axis=0) / count - stock_mean * index_mean
+        variance = (index ** 2).sum(axis=0) / count - index_mean ** 2
+        beta = covariance / variance
+
+        last = close[-1] if len(close) else np.full(len(aligned.tickers), np.nan)
+        summary = pd.DataFrame({
+            "ticker": aligned.tickers,
+            "last_close": last,
+            "total_return": last / first - 1,
+            "volatility": np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR),
+            "max_drawdown": np.nanmin(drawdown, axis=0),
+            "beta": beta,
+        })
+
+    days = pd.DatetimeIndex(aligned.days)
+    return {
+        "normalized": pd.DataFrame(normalized, index=days, columns=aligned.tickers),
+        "benchmark": pd.Series(benchmark_normalized, index=days, name=strings.VNINDEX),
+        "drawdown": pd.DataFrame(drawdown, index=days, columns=aligned.tickers),
+        "summary": summary,
+        "correlation": pd.DataFrame(correlation_matrix(returns[1:]), index=aligned.tickers, columns=aligned.tickers),
+        "rolling_correlation": rolling_correlation(returns[1:], window),
+        "rolling_days": days[window:] if len(days) > window else days[:0],
+    }
+
+
+def compare_stocks(tickers: list, start_date, end_date, window: int = CORRELATION_WINDOW, source=None) -> dict:
+    """
+    Aligned matrix and analytics of `tickers` between start_date and end_date, see compute_analytics.
+    The analytics are kept in memory next to the aligned matrix, so a rerun of the screen reuses them.
+    """
+    aligned = load_aligned_prices(tickers, start_date, end_date, source)
+    if aligned.empty:
+        return None
+
+    key = ("analytics", _cache_key(tickers, start_date, end_date), window)
+    analytics = _cache.get(key)
+    if analytics is not None and analytics["aligned"] is aligned:
+        return analytics
+
+    with span("comparison.compute_analytics", tickers=len(aligned.tickers)) as current:
+        analytics = compute_analytics(aligned, window)
+        current.set_rows(aligned.close.size)
+    analytics["aligned"] = aligned
+    _cache.put(key, analytics, DAILY_TTL_SECONDS)
+    return analytics
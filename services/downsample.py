@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def _as_float(x) -> np.ndarray:
+    """Numeric view of x values, datetimes become nanoseconds since epoch"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+    The first and last points are always kept; each bucket in between keeps the point forming
+    the largest triangle with the previously kept point and the mean of the next bucket.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    # Bucket boundaries of the n - 2 inner points split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Mean point of every bucket, used as the third vertex for the previous bucket
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[previous] - mean_x[bucket]) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (mean_y[bucket] - y[previous]))
+        previous = start + int(np.argmax(area))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def minmax_indices(y, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of each of n_out // 2 equal buckets, in order.
+    Fully vectorized, keeps every spike of the series visible.
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    buckets = np.arange(n) * n_buckets // n
+    # Sort by bucket then value: the first row of a bucket is its minimum, the last its maximum
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets[order], np.arange(n_buckets), side="left")
+    ends = np.append(starts[1:], n) - 1
+    indices = np.concatenate([order[starts], order[ends], [0, n - 1]])
+    return np.unique(indices)
+
+
+def downsample(x, y, n_out: int, method: str = "lttb"):
+    """Return (x, y) reduced to about n_out points with the `lttb` or `minmax` method"""
+    x, y = np.asarray(x), np.asarray(y)
+    if method == "minmax":
+        indices = minmax_indices(y, n_out)
+    else:
+        indices = lttb_indices(x, y, n_out)
+    return x[indices], y[indices]
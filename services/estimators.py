@@ -0,0 +1,74 @@
+import os
+import numpy as np
+
+# Model types by sidebar label (constants/strings.py STOCK_PREDICT_MODEL)
+MODEL_TYPES = {
+    "Linear Regression": "linear",
+    "Random Forest": "random_forest",
+    "Gradient Boosting": "gradient_boosting",
+    "Online SGD": "online",
+}
+DEFAULT_MODEL_TYPE = "linear"
+# Types updated with the newest bars only (partial_fit) instead of being retrained on the full history
+ONLINE_MODEL_TYPES = {"online"}
+# Types trained by train_all_models, e.g. after the end of day sync
+TRAIN_MODEL_TYPES = [model_type.strip() for model_type in
+                     os.environ.get("STOCK_TRAIN_MODEL_TYPES", "linear,random_forest,gradient_boosting,online").split(",")
+                     if model_type.strip()]
+
+
+class OnlineRegressor:
+    """
+    Standardized linear regression fitted by stochastic gradient descent. Unlike the batch models,
+    it can be updated with new bars only through `partial_fit`, the scaling statistics included.
+    """
+
+    def __init__(self, random_state: int = 42):
+        from sklearn.linear_model import SGDRegressor
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.regressor = SGDRegressor(penalty="l2", alpha=1e-6, learning_rate="invscaling", eta0=0.01,
+                                      max_iter=20, tol=None, random_state=random_state)
+
+    def fit(self, X, y):
+        X = self.scaler.fit_transform(np.asarray(X, dtype=float))
+        self.regressor.fit(X, np.asarray(y, dtype=float))
+        return self
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        self.scaler.partial_fit(X)
+        self.regressor.partial_fit(self.scaler.transform(X), np.asarray(y, dtype=float))
+        return self
+
+    def predict(self, X):
+        return self.regressor.predict(self.scaler.transform(np.asarray(X, dtype=float)))
+
+
+def model_type_for(label: str) -> str:
+    """Model type of a sidebar label, the default type for None or an unknown label"""
+    return MODEL_TYPES.get(label, DEFAULT_MODEL_TYPE)
+
+
+def model_key(symbol: str, model_type: str = DEFAULT_MODEL_TYPE) -> str:
+    """Name of a model in the registry and the manifest, linear models keep the historical `<symbol>` name"""
+    return symbol if model_type == DEFAULT_MODEL_TYPE else f"{symbol}_{model_type}"
+
+
+def make_estimator(model_type: str = DEFAULT_MODEL_TYPE):
+    """New unfitted estimator of a model type, scikit-learn is imported on first use"""
+    if model_type == "linear":
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression()
+    if model_type == "random_forest":
+        from sklearn.ensemble import RandomForestRegressor
+        # Shallow trees on a row sample keep training in seconds on minute bars
+        return RandomForestRegressor(n_estimators=50, max_depth=12, min_samples_leaf=5, max_samples=0.5,
+                                     random_state=42)
+    if model_type == "gradient_boosting":
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(max_iter=200, learning_rate=0.1, random_state=42)
+    if model_type == "online":
+        return OnlineRegressor()
+    raise ValueError(f"Unknown model type: {model_type}")
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from constants import strings
+from database.database import (get_daily_features, get_latest_daily_feature_time, get_vnindex_infor, read_price_frame,
+                               save_daily_features)
+from services.aggregate import get_rollup
+
+# Model inputs, in the order the models were trained with
+FEATURE_COLUMNS = ['time', 'open', 'high', 'low', 'volume', 'ma_10', 'volatility']
+# Meaning of the model inputs, models trained on another version must be retrained.
+# 2: ma_10 and volatility are daily, taken from the last session before the bar (see services/point_in_time.py)
+FEATURE_VERSION = 2
+MA_WINDOW = 10
+VOLATILITY_WINDOW = 5
+# Moving averages of the daily closes materialized in the feature store as ma_<window>
+# (columns of database.models.DailyFeature): MA_WINDOW for the models, the others for the charts
+FEATURE_MA_WINDOWS = (5, 10, 20, 50)
+# Stored sessions read before the first recomputed one to seed the rolling windows
+WARMUP_SESSIONS = max(max(FEATURE_MA_WINDOWS), VOLATILITY_WINDOW + 1)
+
+
+def moving_average(closes: pd.Series, window: int) -> pd.Series:
+    """Simple moving average of closing prices, shared by the charts and the model features"""
+    return closes.rolling(window=window).mean()
+
+
+def compute_features(prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute returns, volatility and the FEATURE_MA_WINDOWS moving averages for daily bars sorted by time.
+    This is the only definition of the features, materialized in the feature store by update_features.
+    """
+    closes = prices['close'].astype(float)
+    returns = closes.pct_change()
+    features = pd.DataFrame({
+        'time': prices['time'].to_numpy(),
+        'close': closes.to_numpy(),
+        'returns': returns.to_numpy(),
+        'volatility': returns.rolling(window=VOLATILITY_WINDOW).std().to_numpy(),
+    })
+    for window in FEATURE_MA_WINDOWS:
+        features[f'ma_{window}'] = moving_average(closes, window).to_numpy()
+    return features
+
+
+def to_ordinal(times) -> np.ndarray:
+    """Vectorized pd.Timestamp.toordinal for a datetime64 series or array"""
+    days = np.asarray(times, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    return days + pd.Timestamp('1970-01-01').toordinal()
+
+
+def _daily_bars(symbol: str, start_date=None) -> pd.DataFrame:
+    """Daily bars of a stock code from its 1D rollup, or of VNINDEX from its daily table"""
+    if symbol == strings.VNINDEX:
+        return get_vnindex_infor(start_date, None)
+    return get_rollup(symbol, "1D", start_date)
+
+
+def update_features(symbol: str, since=None) -> int:
+    """
+    Materialize the daily features of the sessions of a stock code (or VNINDEX) from its newest stored row on;
+    that row is recomputed as its session may have been partial. Only the WARMUP_SESSIONS stored rows before
+    it are read to seed the rolling windows. `since` recomputes from that time instead, e.g. after older bars
+    were backfilled. Return the number of rows written.
+    """
+    start = get_latest_daily_feature_time(symbol)
+    if start is not None and since is not None:
+        start = min(pd.Timestamp(start), pd.Timestamp(since).normalize())
+
+    daily = _daily_bars(symbol, start)
+    if daily.empty:
+        return 0
+
+    columns = ['time', 'close']
+    warmup = get_daily_features(symbol, columns=columns, before=start, limit=WARMUP_SESSIONS) \
+        if start is not None else pd.DataFrame(columns=columns)
+    closes = pd.concat([warmup, daily[columns]], ignore_index=True)
+    return save_daily_features(symbol, compute_features(closes).iloc[len(warmup):])
+
+
+def load_daily_features(symbol: str, start_date=None, end_date=None, columns: list = None) -> pd.DataFrame:
+    """Stored daily features of a stock code (or VNINDEX) sorted by time, materialized on first use"""
+    if get_latest_daily_feature_time(symbol) is None:
+        update_features(symbol)
+    return get_daily_features(symbol, start_date, end_date, columns)
+
+
+def daily_moving_average(symbol: str, times, window: int, interval: str = "1D") -> np.ndarray:
+    """
+    Stored `window`-session moving average of the daily closes of a stock code (or VNINDEX) at each bar time,
+    so that an MA20 spans 20 sessions whatever the chart resolution. Intraday bars take the value of their
+    session, weekly bars that of the last session of their week; NaN where no session is stored.
+    """
+    if window not in FEATURE_MA_WINDOWS:
+        raise ValueError(f"No stored {window}-session moving average, choose one of {FEATURE_MA_WINDOWS}")
+
+    days = pd.to_datetime(pd.Series(times)).dt.normalize()
+    if interval == "1W":
+        days = days + pd.Timedelta(days=6)
+    if days.empty:
+        return np.array([])
+
+    features = load_daily_features(symbol, days.min(), days.max() + pd.Timedelta(days=1), ["time", f"ma_{window}"])
+    sessions = features["time"].to_numpy(dtype="datetime64[ns]")
+    positions = np.searchsorted(sessions, days.to_numpy(dtype="datetime64[ns]"), side="right") - 1
+    values = features[f"ma_{window}"].to_numpy(dtype=float)
+    return np.where(positions >= 0, values[np.maximum(positions, 0)] if len(values) else np.nan, np.nan)
+
+
+def load_training_frame(symbol: str, start_date=None) -> pd.DataFrame:
+    """
+    Prices (from `start_date` if given) with the point-in-time daily MA10 and volatility of their session,
+    rows without enough daily history dropped
+    """
+    from services.point_in_time import features_for
+
+    prices = read_price_frame(symbol, start_date=start_date)
+    if prices.empty:
+        return prices
+
+    ma_10, volatility = features_for(symbol, prices['time'])
+    df = prices.assign(ma_10=ma_10, volatility=volatility)
+    return df.dropna().reset_index(drop=True)
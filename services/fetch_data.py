@@ -1,12 +1,19 @@
-from vnstock import Vnstock
 import pandas as pd
 
 from constants import strings
+from services.instrumentation import instrument
 
+def _stock(symbol):
+    """vnstock client of a stock code, vnstock is imported on the first API call."""
+    from vnstock import Vnstock
+
+    return Vnstock().stock(symbol=symbol, source='VCI')
+
+@instrument()
 def fetch_vnindex_data(start_date, end_date):
     """Get VNINDEX data from API."""
     try:
-        stock = Vnstock().stock(symbol=strings.VNINDEX, source='VCI')
+        stock = _stock(strings.VNINDEX)
         df = stock.quote.history(symbol=strings.VNINDEX, start=start_date, 
             end=end_date, interval="1D")
         if df.empty:
@@ -16,10 +23,11 @@ def fetch_vnindex_data(start_date, end_date):
         print(f"❌ Error when fetching VNINDEX: {e}")
         return pd.DataFrame()
 
+@instrument()
 def fetch_stock_data(symbol, start_date, end_date):
     """Get stock data from API."""
     try:
-        stock = Vnstock().stock(symbol=symbol, source='VCI')
+        stock = _stock(symbol)
         df = stock.quote.history(symbol=symbol, start=start_date, 
             end=end_date, interval="1m")
         if df.empty:
@@ -29,10 +37,11 @@ def fetch_stock_data(symbol, start_date, end_date):
         print(f"❌ Error when fetching {symbol}: {e}")
         return pd.DataFrame()
     
+@instrument()
 def fetch_order_book_stock_data(symbol):
     """Get stock order matching data from API."""
     try:
-        stock = Vnstock().stock(symbol=symbol, source='VCI')
+        stock = _stock(symbol)
         order_book_df = stock.quote.intraday(symbol=symbol, show_log=False)
         if order_book_df.empty:
             print(f"⚠️ No data for {symbol}!")
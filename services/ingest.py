@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from constants import strings
+from services import fetch_data
+from database.database import save_vnindex_prices, save_stock_prices, save_order_book
+from services.aggregate import update_rollups
+from services.features import update_features
+from services.order_flow import update_order_flow
+from services import point_in_time
+from services.screener import update_snapshot
+
+# Maximum number of symbols fetched at the same time
+INGEST_MAX_WORKERS = int(os.environ.get("STOCK_INGEST_MAX_WORKERS", 8))
+# Maximum number of API calls per second sent to one quote source
+INGEST_RATE_LIMIT = float(os.environ.get("STOCK_INGEST_RATE_LIMIT", 5))
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+# Held while fetched data is written, so the threads of this process never write to SQLite concurrently
+_write_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Spread calls evenly so that at most `rate` calls per second reach a source."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next call slot is available."""
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_time, now)
+            self._next_time = slot + self.interval
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class VnstockSource:
+    """
+    Quote source backed by the vnstock API.
+    Any object exposing `name`, `fetch_vnindex`, `fetch_stock` and `fetch_order_book`
+    can be passed to `ingest` instead, e.g. a local fake source for tests and benchmarks.
+    """
+    name = "VCI"
+
+    def fetch_vnindex(self, start_date, end_date):
+        return fetch_data.fetch_vnindex_data(start_date, end_date)
+
+    def fetch_stock(self, symbol, start_date, end_date):
+        return fetch_data.fetch_stock_data(symbol, start_date, end_date)
+
+    def fetch_order_book(self, symbol):
+        return fetch_data.fetch_order_book_stock_data(symbol)
+
+
+def get_rate_limiter(source, rate: float = INGEST_RATE_LIMIT) -> RateLimiter:
+    """Return the rate limiter shared by every caller of the same source."""
+    with _rate_limiters_lock:
+        if source.name not in _rate_limiters:
+            _rate_limiters[source.name] = RateLimiter(rate)
+        return _rate_limiters[source.name]
+
+
+def refresh_derived_data(symbol: str, since=None):
+    """
+    Update the rollups, daily features, screener snapshot and trading calendar derived from the minute bars
+    of a stock code (only the daily features for VNINDEX, stored as daily bars).
+    `since` is the oldest new bar when bars older than the stored ones were added.
+    """
+    if symbol == strings.VNINDEX:
+        update_features(symbol, since)
+        return
+
+    update_rollups(symbol, since)
+    update_features(symbol, since)
+    update_snapshot(symbol)
+    # The trading calendar is rebuilt from the new daily bars on next use
+    point_in_time.invalidate(symbol)
+
+
+def _fetch_symbol(source, limiter, symbol, start_date, end_date, include_order_book, include_prices):
+    """Fetch price and order book data of one symbol, runs in a worker thread."""
+    started = time.perf_counter()
+    if symbol == strings.VNINDEX:
+        limiter.wait()
+        return source.fetch_vnindex(start_date, end_date), pd.DataFrame(), time.perf_counter() - started
+
+    stock_df = pd.DataFrame()
+    if include_prices:
+        limiter.wait()
+        stock_df = source.fetch_stock(symbol, start_date, end_date)
+    order_book_df = pd.DataFrame()
+    if include_order_book:
+        limiter.wait()
+        order_book_df = source.fetch_order_book(symbol)
+    return stock_df, order_book_df, time.perf_counter() - started
+
+
+def save_fetched(symbol: str, stock_df: pd.DataFrame, order_book_df: pd.DataFrame = None, since=None) -> int:
+    """
+    Write fetched data of one symbol and update what derives from it, one writer at a time in this process
+    whichever thread fetched it. `since` is passed on to refresh_derived_data. Return inserted row count.
+    """
+    with _write_lock:
+        if symbol == strings.VNINDEX:
+            inserted = save_vnindex_prices(stock_df)[0]
+            refresh_derived_data(symbol, since)
+            return inserted
+
+        inserted = 0
+        if not stock_df.empty:
+            inserted += save_stock_prices(symbol, stock_df)[0]
+            refresh_derived_data(symbol, since)
+        if order_book_df is not None and not order_book_df.empty:
+            matches = save_order_book(symbol, order_book_df)[0]
+            if matches:
+                update_order_flow(symbol)
+            inserted += matches
+        return inserted
+
+
+def ingest(start_dates: dict, end_date: str, source=None, max_workers: int = INGEST_MAX_WORKERS,
+           rate: float = INGEST_RATE_LIMIT, include_order_book: bool = True,
+           include_prices: bool = True) -> pd.DataFrame:
+    """
+    Fetch data for every symbol in `start_dates` (symbol -> start date, VNINDEX included) concurrently.
+    `include_prices=False` only polls the order books, e.g. during the trading session.
+    Fetches overlap in a thread pool limited by `max_workers` and the per-source rate limiter,
+    while the calling thread is the only one writing to SQLite. Return a per-symbol report DataFrame.
+    """
+    source = source or VnstockSource()
+    limiter = get_rate_limiter(source, rate)
+    report = []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_fetch_symbol, source, limiter, symbol, start_date, end_date,
+                            include_order_book, include_prices): symbol
+            for symbol, start_date in start_dates.items()
+        }
+
+        for future in as_completed(futures):
+            symbol = futures[future]
+            row = {"symbol": symbol, "status": "ok", "fetch_seconds": None, "save_seconds": None,
+                   "rows_fetched": 0, "rows_inserted": 0, "error": None}
+            try:
+                stock_df, order_book_df, row["fetch_seconds"] = future.result()
+                row["rows_fetched"] = len(stock_df) + len(order_book_df)
+                if stock_df.empty and order_book_df.empty:
+                    row["status"] = "empty"
+                else:
+                    save_started = time.perf_counter()
+                    row["rows_inserted"] = save_fetched(symbol, stock_df, order_book_df)
+                    row["save_seconds"] = time.perf_counter() - save_started
+            except Exception as e:
+                row["status"] = "error"
+                row["error"] = str(e)
+                print(f"❌ Error when ingesting {symbol}: {e}")
+            report.append(row)
+
+    report = pd.DataFrame(report)
+    failed = int((report["status"] == "error").sum()) if not report.empty else 0
+    print(f"✅ Ingested {len(report)} symbols in {time.perf_counter() - started:.2f}s ({failed} failed)")
+    return report
@@ -0,0 +1,230 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import pandas as pd
+
+# Set STOCK_INSTRUMENTATION=1 to record spans, disabled spans cost one flag check
+INSTRUMENTATION_ENABLED = os.environ.get("STOCK_INSTRUMENTATION", "0") == "1"
+# Optional JSON lines file receiving one record per finished span
+INSTRUMENTATION_LOG = os.environ.get("STOCK_INSTRUMENTATION_LOG")
+# Upper bounds (ms) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+# Number of finished spans kept for the debug panel
+RECENT_SPANS = int(os.environ.get("STOCK_INSTRUMENTATION_RECENT", 500))
+
+_enabled = INSTRUMENTATION_ENABLED
+_stats = {}
+_recent = deque(maxlen=RECENT_SPANS)
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+_local = threading.local()
+
+
+class SpanStats:
+    """Call count, latency histogram and row count of one span name."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, duration_ms: float, rows, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += rows or 0
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped by the slowest call"""
+        target, seen = q * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+class Span:
+    """A timed section, `rows` and extra attributes can be set while it runs. Use through `span` or `instrument`."""
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.rows = None
+
+    def set_rows(self, rows):
+        self.rows = rows
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        _stack().pop()
+        _record(self, duration_ms, exc)
+        return False
+
+
+class _NoopSpan:
+    """Returned by `span` while instrumentation is disabled."""
+
+    def set_rows(self, rows):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _record(span: Span, duration_ms: float, exc):
+    record = {
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "span": span.name,
+        "parent": span.parent,
+        "duration_ms": round(duration_ms, 3),
+        "rows": span.rows,
+        "thread": threading.current_thread().name,
+        "error": repr(exc) if exc is not None else None,
+        **span.attrs,
+    }
+    with _lock:
+        stats = _stats.get(span.name)
+        if stats is None:
+            stats = _stats[span.name] = SpanStats()
+        stats.add(duration_ms, span.rows, exc is not None)
+        _recent.append(record)
+
+    if INSTRUMENTATION_LOG:
+        with _log_lock, open(INSTRUMENTATION_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool = True):
+    """Turn span recording on or off at runtime."""
+    global _enabled
+    _enabled = enabled
+
+
+def span(name: str, **attrs):
+    """
+    Context manager timing a section under `name`, extra keyword arguments are added to its log record:
+        with span("render.stock_chart", points=len(df)) as s:
+            ...
+            s.set_rows(len(df))
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def count_rows(result):
+    """Default row count of an instrumented call: rows of a DataFrame/array, inserted rows of (inserted, skipped)"""
+    if hasattr(result, "shape"):
+        return result.shape[0] if result.shape else 1
+    if isinstance(result, tuple) and result and isinstance(result[0], int):
+        return result[0]
+    return None
+
+
+def instrument(name: str = None, rows=count_rows):
+    """
+    Decorator recording every call of a function as a span, named `module.function` by default.
+    `rows` maps the return value to a row count, None to skip counting.
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, {}) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.set_rows(rows(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def snapshot() -> pd.DataFrame:
+    """Aggregated stats of every span name, slowest total first"""
+    with _lock:
+        rows = [{
+            "span": name,
+            "count": stats.count,
+            "errors": stats.errors,
+            "total_ms": round(stats.total_ms, 1),
+            "mean_ms": round(stats.total_ms / stats.count, 2),
+            "p50_ms": round(stats.quantile(0.5), 2),
+            "p95_ms": round(stats.quantile(0.95), 2),
+            "max_ms": round(stats.max_ms, 1),
+            "rows": stats.rows,
+        } for name, stats in _stats.items()]
+    columns = ["span", "count", "errors", "total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms", "rows"]
+    return pd.DataFrame(rows, columns=columns).sort_values("total_ms", ascending=False, ignore_index=True)
+
+
+def recent_spans(limit: int = None) -> list:
+    """Most recent finished span records, newest last"""
+    with _lock:
+        records = list(_recent)
+    return records[-limit:] if limit else records
+
+
+def export() -> dict:
+    """Histograms and totals of every span name as a JSON-serializable dict"""
+    with _lock:
+        spans = {name: {"count": stats.count, "errors": stats.errors, "total_ms": stats.total_ms,
+                        "max_ms": stats.max_ms, "rows": stats.rows, "buckets": list(stats.buckets)}
+                 for name, stats in _stats.items()}
+    return {"exported_at": datetime.now().isoformat(timespec="seconds"),
+            "bucket_bounds_ms": LATENCY_BUCKETS_MS, "spans": spans}
+
+
+def export_json(path: str):
+    """Write `export()` to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(export(), f, indent=2)
+
+
+def reset():
+    """Drop every recorded stat and span."""
+    with _lock:
+        _stats.clear()
+        _recent.clear()
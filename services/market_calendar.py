@@ -0,0 +1,41 @@
+import os
+from datetime import date, timedelta
+from datetime import time as dtime
+from zoneinfo import ZoneInfo
+import numpy as np
+
+MARKET_TIMEZONE = ZoneInfo("Asia/Ho_Chi_Minh")
+# Continuous trading sessions of HOSE, Monday to Friday outside the market holidays
+TRADING_SESSIONS = [(dtime(9, 0), dtime(11, 30)), (dtime(13, 0), dtime(15, 0))]
+# Weekdays HOSE is closed (New Year, Tet, Hung Kings, Reunification and Labour days, National Day), extra
+# closures can be added as comma separated ISO dates in STOCK_MARKET_HOLIDAYS
+MARKET_HOLIDAYS = frozenset(date.fromisoformat(day) for day in [
+    "2023-01-02", "2023-01-20", "2023-01-23", "2023-01-24", "2023-01-25", "2023-01-26",
+    "2023-05-01", "2023-05-02", "2023-05-03", "2023-09-01", "2023-09-04",
+    "2024-01-01", "2024-02-08", "2024-02-09", "2024-02-12", "2024-02-13", "2024-02-14",
+    "2024-04-18", "2024-04-29", "2024-04-30", "2024-05-01", "2024-09-02", "2024-09-03",
+    "2025-01-01", "2025-01-27", "2025-01-28", "2025-01-29", "2025-01-30", "2025-01-31",
+    "2025-04-07", "2025-04-30", "2025-05-01", "2025-05-02", "2025-09-01", "2025-09-02",
+    "2026-01-01", "2026-02-16", "2026-02-17", "2026-02-18", "2026-02-19", "2026-02-20",
+    "2026-04-27", "2026-04-30", "2026-05-01", "2026-09-01", "2026-09-02",
+] + [day.strip() for day in os.environ.get("STOCK_MARKET_HOLIDAYS", "").split(",") if day.strip()])
+
+
+def is_trading_day(day) -> bool:
+    """Return True if the market opens on `day` (a date, datetime or Timestamp)."""
+    day = day.date() if hasattr(day, "date") else day
+    return day.weekday() < 5 and day not in MARKET_HOLIDAYS
+
+
+def previous_trading_day(day):
+    """Last trading day on or before `day`, of the same type."""
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def trading_days_between(start, end):
+    """Number of trading days strictly after `start` and strictly before `end`, element-wise on arrays."""
+    start = np.asarray(start, dtype="datetime64[D]") + 1
+    end = np.asarray(end, dtype="datetime64[D]")
+    return np.maximum(np.busday_count(start, end, holidays=sorted(MARKET_HOLIDAYS)), 0)
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import pandas as pd
+from collections import OrderedDict
+from datetime import datetime
+from datetime import time as dtime
+from constants import strings
+from database.database import (get_earliest_stock_date, get_earliest_vnindex_date, get_latest_stock_date,
+                               get_latest_vnindex_date, get_vnindex_infor)
+from services.aggregate import get_rollup, resample_ohlcv
+from services.ingest import VnstockSource, get_rate_limiter, save_fetched
+from services.instrumentation import span
+from services.market_calendar import MARKET_TIMEZONE, TRADING_SESSIONS, previous_trading_day
+
+# Time to live of cached frames, intraday data changes during the session while daily bars do not
+INTRADAY_TTL_SECONDS = int(os.environ.get("STOCK_CACHE_INTRADAY_TTL", 60))
+DAILY_TTL_SECONDS = int(os.environ.get("STOCK_CACHE_DAILY_TTL", 3600))
+# Maximum number of (symbol, interval, range) frames kept in memory
+CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_CACHE_MAX_ENTRIES", 64))
+# Start of the last minute bar of a trading day, matching ends with the closing auction (ATC) at 14:45
+LAST_BAR_TIME = dtime(14, 44)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a per-entry time to live."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl: float):
+        """Store a value, evicting the least recently used entries above `max_entries`."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TTLCache(CACHE_MAX_ENTRIES)
+# (oldest, newest) time of the ranges already requested from the API by this process, by symbol
+_fetched_ranges = {}
+_fetched_lock = threading.Lock()
+
+
+def clear_cache():
+    """Drop every frame cached in memory and forget the ranges already requested from the API."""
+    _cache.clear()
+    with _fetched_lock:
+        _fetched_ranges.clear()
+
+
+def _ttl_for(interval: str) -> int:
+    return DAILY_TTL_SECONDS if interval.endswith(("D", "W")) else INTRADAY_TTL_SECONDS
+
+
+def _expected_latest(end: pd.Timestamp) -> pd.Timestamp:
+    """
+    Newest bar time the stored data can have for a range ending at `end`: the current minute during
+    a trading day, the last bar of the previous trading day before the open.
+    """
+    expected = min(end, pd.Timestamp(datetime.now(MARKET_TIMEZONE).replace(tzinfo=None)))
+    day = expected.normalize()
+    if expected.time() < TRADING_SESSIONS[0][0]:
+        day -= pd.Timedelta(days=1)
+    day = previous_trading_day(day)
+    last_bar = day + pd.Timedelta(hours=LAST_BAR_TIME.hour, minutes=LAST_BAR_TIME.minute)
+    return expected if day == expected.normalize() and expected < last_bar else last_bar
+
+
+def _is_behind(latest: pd.Timestamp, expected: pd.Timestamp, daily: bool) -> bool:
+    """
+    Whether the newest stored bar is older than the expected one. Minute bars compare the full timestamp so the
+    running session keeps updating; daily bars are stamped at 00:00 and compare the session date, except while
+    the session of the day is still trading.
+    """
+    if not daily:
+        return latest < expected
+    return latest.normalize() < expected.normalize() or expected.time() < LAST_BAR_TIME
+
+
+def _fetch_range(symbol: str, fetch_start: pd.Timestamp, fetch_end: pd.Timestamp, source) -> pd.DataFrame:
+    """Fetch the days from fetch_start to fetch_end from the API, return the fetched bars."""
+    fetch_start, fetch_end = fetch_start.strftime("%Y-%m-%d"), fetch_end.strftime("%Y-%m-%d")
+    print(f"🔄 Fetching {symbol} from {fetch_start} to {fetch_end}...")
+
+    get_rate_limiter(source).wait()
+    if symbol == strings.VNINDEX:
+        return source.fetch_vnindex(fetch_start, fetch_end)
+    return source.fetch_stock(symbol, fetch_start, fetch_end)
+
+
+def _fetch_missing(symbol: str, start: pd.Timestamp, end: pd.Timestamp, source):
+    """
+    Fetch from the API only the parts of [start, end] missing from the stored data and save them:
+    the sessions older than the oldest stored bar and those newer than the newest one.
+    Ranges already requested by this process are not fetched again, the API may simply have no bars there.
+    """
+    is_index = symbol == strings.VNINDEX
+    earliest = get_earliest_vnindex_date() if is_index else get_earliest_stock_date(symbol)
+    latest = get_latest_vnindex_date() if is_index else get_latest_stock_date(symbol)
+    expected = _expected_latest(end)
+    with _fetched_lock:
+        requested_from, requested_until = _fetched_ranges.get(symbol, (None, None))
+
+    fetched, since = [], None
+    if earliest is None or latest is None:
+        if None not in (requested_from, requested_until) and requested_from <= start and requested_until >= expected:
+            return
+        fetched.append(_fetch_range(symbol, start, end, source))
+        requested_from, requested_until = start, expected
+    else:
+        earliest, latest = pd.Timestamp(earliest), pd.Timestamp(latest)
+        # Days before the oldest stored one, which is complete since the API is requested by whole days
+        if start < earliest.normalize() and (requested_from is None or start < requested_from):
+            head = _fetch_range(symbol, start, earliest.normalize() - pd.Timedelta(days=1), source)
+            if not head.empty:
+                since = pd.Timestamp(head["time"].min())
+            fetched.append(head)
+            requested_from = start
+        # Sessions after the newest stored bar
+        if _is_behind(latest, expected, daily=is_index) and (requested_until is None or requested_until < expected):
+            fetched.append(_fetch_range(symbol, max(latest.normalize(), start), end, source))
+            requested_until = expected
+    if not fetched:
+        return
+
+    with _fetched_lock:
+        known_from, known_until = _fetched_ranges.get(symbol, (None, None))
+        _fetched_ranges[symbol] = (min((t for t in (known_from, requested_from) if t is not None), default=None),
+                                   max((t for t in (known_until, requested_until) if t is not None), default=None))
+    fetched = [df for df in fetched if not df.empty]
+    if fetched:
+        # Fetched concurrently by the callers, written back one at a time
+        save_fetched(symbol, pd.concat(fetched, ignore_index=True), since=since)
+
+
+def _read_through(symbol: str, start: pd.Timestamp, end: pd.Timestamp, interval: str, source) -> pd.DataFrame:
+    """Serve a range from SQLite (stored rollups for coarse intervals), fetching only the missing head and tail first."""
+    try:
+        _fetch_missing(symbol, start, end, source)
+    except Exception as e:
+        print(f"❌ Error when fetching {symbol}, serving stored data: {e}")
+
+    if symbol != strings.VNINDEX:
+        # Weekly rollups are stamped on Monday, keep the week `start` falls in
+        rollup_start = start - pd.Timedelta(days=start.weekday()) if interval == "1W" else start
+        return get_rollup(symbol, interval, rollup_start, end)
+
+    # VNINDEX is stored as daily bars, coarser intervals are aggregated on the fly
+    df = get_vnindex_infor(start, end)
+    if interval == "1W":
+        df = resample_ohlcv(df, interval)
+    return df
+
+
+def get_history(symbol: str, start_date, end_date, interval: str = "1D", source=None) -> pd.DataFrame:
+    """
+    Get OHLCV history of `symbol` between start_date and end_date (inclusive) with a `time` column.
+    Frames are served from an in-memory LRU, then from SQLite; the API is only called
+    for data older or newer than what is stored, which is written back to the database.
+    """
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    key = (symbol, interval, start, end)
+
+    with span("market_data.get_history", symbol=symbol, interval=interval) as current:
+        df = _cache.get(key)
+        current.set(cache_hit=df is not None)
+        if df is None:
+            df = _read_through(symbol, start, end, interval, source or VnstockSource())
+            _cache.put(key, df, _ttl_for(interval))
+        current.set_rows(len(df))
+    return df.copy()
@@ -0,0 +1,201 @@
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from constants import strings
+
+# Maximum number of models kept in memory, least recently used models are dropped first
+MODEL_REGISTRY_MAX_MODELS = int(os.environ.get("STOCK_MODEL_REGISTRY_MAX_MODELS", 64))
+# Metadata of every trained model, written by services/train.py
+MANIFEST_FILE = "manifest.json"
+# Seconds to wait for another process writing the manifest
+MANIFEST_LOCK_TIMEOUT = 30
+# Age in seconds after which a lock file is considered left behind by a crashed process,
+# writing the manifest takes milliseconds
+MANIFEST_LOCK_STALE_SECONDS = 60
+
+
+def manifest_path(model_dir: str = None) -> str:
+    return os.path.join(model_dir or strings.MODEL_DIR, MANIFEST_FILE)
+
+
+def read_manifest(model_dir: str = None) -> dict:
+    """Read the model manifest, an empty dict if it does not exist yet."""
+    path = manifest_path(model_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _is_stale_lock(lock_path: str) -> bool:
+    """Whether a lock file was left behind: its process is gone or it is older than MANIFEST_LOCK_STALE_SECONDS."""
+    try:
+        with open(lock_path, "r", encoding="utf-8") as f:
+            pid, _, created_at = f.read().partition(" ")
+        age = time.time() - float(created_at)
+    except (OSError, ValueError):
+        # Unreadable or still being written, fall back on the file age
+        try:
+            age = time.time() - os.path.getmtime(lock_path)
+        except OSError:
+            return False
+        pid = None
+    if age > MANIFEST_LOCK_STALE_SECONDS:
+        return True
+    if pid and os.name == "posix":
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            pass
+    return False
+
+
+def _acquire_manifest_lock(lock_path: str):
+    """
+    Create the lock file exclusively with the PID and time of this process, waiting while another
+    training process holds it. A lock left behind by a crashed process is removed.
+    """
+    deadline = time.monotonic() + MANIFEST_LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, f"{os.getpid()} {time.time()}".encode())
+            return fd
+        except FileExistsError:
+            if _is_stale_lock(lock_path):
+                print(f"⚠️ Removing stale lock {lock_path}")
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.05)
+
+
+def record_model_metadata(symbol: str, metadata: dict, model_dir: str = None):
+    """
+    Add or replace the manifest entry of a model. The file is replaced atomically and guarded
+    by a lock file, so training processes running in parallel do not lose each other's entries.
+    """
+    model_dir = model_dir or strings.MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    lock_path = manifest_path(model_dir) + ".lock"
+    fd = _acquire_manifest_lock(lock_path)
+    try:
+        manifest = read_manifest(model_dir)
+        manifest[symbol] = metadata
+
+        tmp_path = manifest_path(model_dir) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True, default=str)
+        os.replace(tmp_path, manifest_path(model_dir))
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+class ModelRegistry:
+    """
+    Keep trained models in memory. Models are unpickled on first use, reloaded when their
+    file changes on disk (e.g. after retraining) and evicted in LRU order above `max_models`.
+    """
+
+    def __init__(self, model_dir: str = None, max_models: int = MODEL_REGISTRY_MAX_MODELS):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._manifest = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def model_path(self, symbol: str) -> str:
+        return os.path.join(self.model_dir or strings.MODEL_DIR, f"{symbol}_model.pkl")
+
+    def _refresh_manifest(self):
+        path = manifest_path(self.model_dir)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if mtime != self._manifest_mtime:
+            self._manifest = read_manifest(self.model_dir)
+            self._manifest_mtime = mtime
+
+    def get(self, symbol: str):
+        """Return the model of a stock code, None if it has not been trained."""
+        entry = self._get_entry(symbol)
+        return entry[0] if entry else None
+
+    def get_with_metadata(self, symbol: str):
+        """Return (model, metadata) of a stock code from the same file, (None, {}) if it has not been trained."""
+        entry = self._get_entry(symbol)
+        return (entry[0], dict(entry[2])) if entry else (None, {})
+
+    def metadata(self, symbol: str) -> dict:
+        """Return the metadata (version, trained_at, r2, mae, features, ...) of a model, {} if missing."""
+        entry = self._get_entry(symbol)
+        return dict(entry[2]) if entry else {}
+
+    def _get_entry(self, symbol: str):
+        path = self.model_path(symbol)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            with self._lock:
+                self._models.pop(symbol, None)
+            return None
+
+        with self._lock:
+            entry = self._models.get(symbol)
+            if entry is not None and entry[1] == mtime:
+                self._models.move_to_end(symbol)
+                return entry
+
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+
+            if isinstance(model, dict) and "model" in model:
+                model, metadata = model["model"], dict(model["metadata"])
+            else:
+                # Pickles saved before the metadata was stored with the model
+                self._refresh_manifest()
+                metadata = dict(self._manifest.get(symbol, {}))
+            metadata.setdefault("version", datetime.fromtimestamp(mtime).isoformat(timespec="seconds"))
+            if entry is not None:
+                print(f"🔄 Reloaded model for {symbol} ({metadata['version']})")
+
+            entry = (model, mtime, metadata)
+            self._models[symbol] = entry
+            self._models.move_to_end(symbol)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return entry
+
+    def clear(self):
+        """Drop every model kept in memory."""
+        with self._lock:
+            self._models.clear()
+            self._manifest_mtime = None
+
+
+registry = ModelRegistry()
+
+
+def get_model(symbol: str):
+    """Return the model of a stock code from the shared registry."""
+    return registry.get(symbol)
+
+
+def get_model_with_metadata(symbol: str):
+    """Return a stock code's model and its metadata from the shared registry."""
+    return registry.get_with_metadata(symbol)
+
+
+def get_model_metadata(symbol: str) -> dict:
+    """Return the metadata of a stock code's model from the shared registry."""
+    return registry.metadata(symbol)
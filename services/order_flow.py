@@ -0,0 +1,134 @@
+import threading
+import pandas as pd
+from collections import OrderedDict
+from database.database import (get_order_book, get_order_book_watermarks, get_order_flow_buckets,
+                               get_order_flow_watermarks, save_order_flow)
+
+# Width of the order flow buckets, also the step of the trade rate series
+ORDER_FLOW_FREQ = "1min"
+# Maximum number of (symbol, session) summaries kept in memory
+ORDER_FLOW_MAX_SESSIONS = 256
+BUY, SELL = "Buy", "Sell"
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+# Newest match id folded into the buckets, by symbol then session date, loaded from the database on first use.
+# A value older than the database (folded by another process) only makes the next update recompute more minutes.
+_folded = {}
+_folded_lock = threading.Lock()
+
+
+def bucket_matches(matches: pd.DataFrame) -> pd.DataFrame:
+    """Group matches by (minute, price, match_type): volume, number of matches, traded value and newest id"""
+    volume = matches["volume"].astype(float)
+    price = matches["price"].astype(float)
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(matches["time"]).dt.floor(ORDER_FLOW_FREQ),
+        "price": price,
+        "match_type": matches["match_type"],
+        "volume": volume,
+        "value": volume * price,
+        "id": matches["id"],
+    })
+    buckets = frame.groupby(["time", "price", "match_type"], sort=False).agg(
+        volume=("volume", "sum"), trades=("id", "size"), value=("value", "sum"), last_id=("id", "max")
+    )
+    return buckets.reset_index()
+
+
+def _folded_watermarks(symbol: str) -> dict:
+    with _folded_lock:
+        if symbol not in _folded:
+            _folded[symbol] = get_order_flow_watermarks(symbol)
+        return dict(_folded[symbol])
+
+
+def _fold_session(symbol: str, session_date, watermark) -> int:
+    """Fold the matches of one session stored after `watermark` into the buckets, return how many"""
+    start = pd.Timestamp(session_date)
+    end = start + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    matches = get_order_book(symbol, start_date=start, end_date=end, after_id=watermark)
+    if matches.empty:
+        return 0
+
+    if watermark is not None:
+        since = pd.to_datetime(matches["time"]).min().floor(ORDER_FLOW_FREQ)
+        matches = get_order_book(symbol, start_date=since, end_date=end)
+        folded = int((matches["id"] > watermark).sum())
+    else:
+        folded = len(matches)
+    save_order_flow(bucket_matches(matches).assign(symbol=symbol))
+    return folded
+
+
+def update_order_flow(symbol: str) -> int:
+    """
+    Fold the matches stored since the last update into the order flow buckets of a stock code.
+    Watermarks are kept per session like those of the order book, whose ids are only ordered within a session:
+    a session is read when its order book watermark is above the id folded into its buckets, and only from there.
+    The minutes the new matches fall in are recomputed from every stored match instead of being added to,
+    so updates running concurrently (the scheduler and the app) cannot count a match twice.
+    Return the number of matches folded.
+    """
+    folded_ids = _folded_watermarks(symbol)
+    folded = 0
+    for session_date, last_id in sorted(get_order_book_watermarks(symbol).items()):
+        watermark = folded_ids.get(session_date)
+        if watermark is not None and watermark >= last_id:
+            continue
+        folded += _fold_session(symbol, session_date, watermark)
+        with _folded_lock:
+            _folded[symbol][session_date] = max(last_id, _folded[symbol].get(session_date) or last_id)
+    return folded
+
+
+def summarize_order_flow(buckets: pd.DataFrame) -> dict:
+    """VWAP, buy/sell imbalance, volume per match_type and price level, and the trade rate series"""
+    volume, value = buckets["volume"].sum(), buckets["value"].sum()
+    by_match_type = buckets.groupby("match_type")[["volume", "trades"]].sum()
+    buy = by_match_type["volume"].get(BUY, 0.0)
+    sell = by_match_type["volume"].get(SELL, 0.0)
+    return {
+        "vwap": value / volume if volume else None,
+        "volume": volume,
+        "trades": int(buckets["trades"].sum()),
+        "buy_volume": buy,
+        "sell_volume": sell,
+        # Between -1 (only sells) and 1 (only buys)
+        "imbalance": (buy - sell) / (buy + sell) if buy + sell else None,
+        "by_match_type": by_match_type.reset_index(),
+        "volume_at_price": buckets.groupby(["price", "match_type"])["volume"].sum().unstack(fill_value=0).reset_index(),
+        "trade_rate": buckets.groupby("time")[["trades", "volume"]].sum().reset_index(),
+    }
+
+
+def get_order_flow(symbol: str, session_date=None) -> dict:
+    """
+    Order flow summary of a stock code for one session (the latest by default), None without data.
+    Summaries are cached per (symbol, session) and only recomputed when new matches of that session were
+    folded into the buckets; update_order_flow folds them incrementally as they are ingested.
+    """
+    update_order_flow(symbol)
+    watermarks = _folded_watermarks(symbol)
+    if not watermarks:
+        return None
+
+    session_date = pd.Timestamp(session_date).date() if session_date is not None else max(watermarks)
+    watermark = watermarks.get(session_date)
+    key = (symbol, session_date)
+    with _summaries_lock:
+        cached = _summaries.get(key)
+        if cached is not None and cached[0] == watermark:
+            _summaries.move_to_end(key)
+            return cached[1]
+
+    start = pd.Timestamp(session_date)
+    buckets = get_order_flow_buckets(symbol, start, start + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1))
+    summary = summarize_order_flow(buckets) if not buckets.empty else None
+
+    with _summaries_lock:
+        _summaries[key] = (watermark, summary)
+        _summaries.move_to_end(key)
+        while len(_summaries) > ORDER_FLOW_MAX_SESSIONS:
+            _summaries.popitem(last=False)
+    return summary
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from services.features import load_daily_features
+from services.market_calendar import trading_days_between
+
+# Seconds a calendar is trusted before checking the database for new sessions written by another process
+PIT_REFRESH_SECONDS = int(os.environ.get("STOCK_PIT_REFRESH_SECONDS", 60))
+# Trading days that may be missing after the last stored session before its features no longer apply
+PIT_MAX_STALE_SESSIONS = int(os.environ.get("STOCK_PIT_MAX_STALE_SESSIONS", 5))
+
+_calendars = {}
+_lock = threading.Lock()
+
+
+class TradingCalendar:
+    """
+    Trading sessions of a stock code and the daily features known at the close of each of them.
+    A target date uses the features of the last session strictly before it, so weekends, holidays
+    and missing days resolve to the previous session and no feature ever sees the target day.
+    """
+
+    def __init__(self, days: np.ndarray, ma_10: np.ndarray, volatility: np.ndarray):
+        self.days = days
+        self.ma_10 = ma_10
+        self.volatility = volatility
+
+    def positions(self, dates) -> np.ndarray:
+        """Index of the last session strictly before each date, -1 without one or if it is too old"""
+        dates = np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]")
+        positions = np.searchsorted(self.days, dates, side="left") - 1
+        known = positions >= 0
+        stale = np.zeros_like(known)
+        stale[known] = trading_days_between(self.days[positions[known]], dates[known]) > PIT_MAX_STALE_SESSIONS
+        positions[stale] = -1
+        return positions
+
+    def features(self, dates):
+        """(ma_10, volatility) arrays of the given dates, NaN where no session applies"""
+        positions = self.positions(dates)
+        valid = positions >= 0
+        ma_10 = np.full(len(positions), np.nan)
+        volatility = np.full(len(positions), np.nan)
+        ma_10[valid] = self.ma_10[positions[valid]]
+        volatility[valid] = self.volatility[positions[valid]]
+        return ma_10, volatility
+
+
+def build_calendar(symbol: str) -> TradingCalendar:
+    """Read the stored daily MA10 and volatility of a stock code, one entry per session"""
+    features = load_daily_features(symbol, columns=["time", "ma_10", "volatility"])
+    if features.empty:
+        return TradingCalendar(np.array([], dtype="datetime64[D]"), np.array([]), np.array([]))
+
+    days = features["time"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    return TradingCalendar(days, features["ma_10"].to_numpy(dtype=float),
+                           features["volatility"].to_numpy(dtype=float))
+
+
+def get_calendar(symbol: str) -> TradingCalendar:
+    """Trading calendar of a stock code, kept in memory and rebuilt at most every PIT_REFRESH_SECONDS"""
+    now = time.monotonic()
+    entry = _calendars.get(symbol)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+
+    calendar = build_calendar(symbol)
+    with _lock:
+        _calendars[symbol] = (calendar, now + PIT_REFRESH_SECONDS)
+    return calendar
+
+
+def invalidate(symbol: str = None):
+    """Drop the calendar of a stock code (every calendar by default) after new bars were stored."""
+    with _lock:
+        if symbol is None:
+            _calendars.clear()
+        else:
+            _calendars.pop(symbol, None)
+
+
+def features_for(symbol: str, dates):
+    """(ma_10, volatility) arrays of a stock code at every date, NaN where no session applies"""
+    return get_calendar(symbol).features(dates)
+
+
+def features_at(symbol: str, target_date) -> dict:
+    """Point-in-time MA10 and volatility of a stock code for a target date, None if unavailable"""
+    calendar = get_calendar(symbol)
+    position = calendar.positions([pd.Timestamp(target_date).to_datetime64()])[0]
+    if position < 0:
+        return None
+
+    ma_10, volatility = calendar.ma_10[position], calendar.volatility[position]
+    if np.isnan(ma_10) or np.isnan(volatility):
+        return None
+    return {"session": pd.Timestamp(calendar.days[position]), "ma_10": float(ma_10), "volatility": float(volatility)}
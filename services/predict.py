@@ -1,49 +1,42 @@
-import pickle
+import numpy as np
 import pandas as pd
-import os
-from datetime import datetime, timedelta
-from database.database import SessionLocal
-from database.models import create_stock_table
-from constants import strings
+from datetime import datetime
+from database.database import get_stock_prices_multi
+from services.estimators import DEFAULT_MODEL_TYPE, model_key
+from services.features import FEATURE_COLUMNS, FEATURE_VERSION, to_ordinal
+from services.instrumentation import instrument
+from services.model_registry import get_model_with_metadata
+from services.point_in_time import features_at, features_for
 
+@instrument(rows=None)
 def calculate_ma_volatility(symbol: str, target_date: str):
-    """Calculate MA10 and Volatility for target date based on historical data"""
-    db = SessionLocal()
-    StockTable = create_stock_table(symbol)
-    
+    """Get the daily MA10 and Volatility known before the target date from the trading calendar"""
     # Convert target_date to datetime format
     target_date_dt = datetime.strptime(target_date, '%Y-%m-%d')
 
-    # Get data 10 days before target date
-    stock_data = db.query(StockTable).filter(
-        StockTable.time < target_date_dt
-    ).order_by(StockTable.time.desc()).limit(10).all()
-    
-    db.close()
+    features = features_at(symbol, target_date_dt)
 
-    if len(stock_data) < 10:
+    if features is None:
         return None, None
 
-    df = pd.DataFrame([s.__dict__ for s in stock_data])
-    df = df.drop(columns=['_sa_instance_state', 'id'])
-
-    df.set_index('time', inplace=True)
-
-    ma_10 = df['close'].rolling(window=10, min_periods=1).mean().iloc[-1]
-    returns = df['close'].pct_change().fillna(0)
-    volatility = returns.rolling(window=5, min_periods=1).std().iloc[-1]
+    return features['ma_10'], features['volatility']
 
-    return ma_10, volatility
+def _is_current(metadata: dict) -> bool:
+    """Whether a model was trained on the current feature definitions"""
+    return metadata.get('feature_version') == FEATURE_VERSION
 
-def predict_stock_price(symbol: str, target_date: str, open_price: float, high_price: float, low_price: float, volume: float):
-    """Predict the closing price of a stock on a specific date"""
-    model_path = os.path.join(strings.MODEL_DIR, f"{symbol}_model.pkl")
+@instrument(rows=None)
+def predict_stock_price(symbol: str, target_date: str, open_price: float, high_price: float, low_price: float, volume: float,
+                        model_type: str = DEFAULT_MODEL_TYPE):
+    """Predict the closing price of a stock on a specific date with the model of `model_type`"""
+    key = model_key(symbol, model_type)
+    model, metadata = get_model_with_metadata(key)
     
-    if not os.path.exists(model_path):
-        return f"⚠️ Model for {symbol} not found. Please train the model first."
+    if model is None:
+        return f"⚠️ {model_type} model for {symbol} not found. Please train the model first."
 
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    if not _is_current(metadata):
+        return f"⚠️ {model_type} model for {symbol} was trained on outdated features. Please retrain the model."
 
     try:
         target_date_str = target_date  
@@ -58,9 +51,70 @@ def predict_stock_price(symbol: str, target_date: str, open_price: float, high_p
 
     target_date = datetime.strptime(target_date, '%Y-%m-%d').toordinal()
 
-    # Prepare input data
-    input_data = pd.DataFrame([[target_date, open_price, high_price, low_price, volume, ma_10, volatility]],
-                              columns=['time', 'open', 'high', 'low', 'volume', 'ma_10', 'volatility'])
+    # Prepare input data, in FEATURE_COLUMNS order
+    input_data = np.array([[target_date, open_price, high_price, low_price, volume, ma_10, volatility]], dtype=float)
 
     predicted_price = model.predict(input_data)
-    return round(predicted_price[0], 3)
+    return round(float(predicted_price[0]), 3)
+
+
+def _predict_frame(inputs: pd.DataFrame, model_type: str = DEFAULT_MODEL_TYPE) -> pd.DataFrame:
+    """Look up the point-in-time features of every input row and run each symbol's model once"""
+    result = inputs.copy()
+    result['date'] = pd.to_datetime(result['date'])
+    result['ma_10'] = np.nan
+    result['volatility'] = np.nan
+    result['predicted_close'] = np.nan
+    result['model_version'] = None
+    if result.empty:
+        return result
+
+    for symbol, rows in result.groupby('symbol', sort=False).groups.items():
+        key = model_key(symbol, model_type)
+        model, metadata = get_model_with_metadata(key)
+        if model is None or not _is_current(metadata):
+            continue
+        result.loc[rows, 'model_version'] = metadata.get('version')
+
+        ma_10, volatility = features_for(symbol, result.loc[rows, 'date'])
+        valid = ~np.isnan(ma_10) & ~np.isnan(volatility)
+        if not valid.any():
+            continue
+
+        rows = rows[valid]
+        result.loc[rows, 'ma_10'] = ma_10[valid]
+        result.loc[rows, 'volatility'] = volatility[valid]
+
+        inputs_x = result.loc[rows, ['date', 'open', 'high', 'low', 'volume', 'ma_10', 'volatility']]
+        inputs_x = inputs_x.rename(columns={'date': 'time'})
+        inputs_x['time'] = to_ordinal(inputs_x['time'])
+        result.loc[rows, 'predicted_close'] = np.round(model.predict(inputs_x[FEATURE_COLUMNS].to_numpy(dtype=float)), 3)
+
+    return result
+
+@instrument()
+def predict_batch(inputs: pd.DataFrame, model_type: str = DEFAULT_MODEL_TYPE) -> pd.DataFrame:
+    """
+    Predict closing prices for many (symbol, date) rows at once.
+    `inputs` needs the columns symbol, date, open, high, low and volume; the result adds
+    ma_10, volatility, predicted_close (NaN without a model or enough history) and the
+    model_version that produced each prediction.
+    Features come from the in-memory trading calendars and every model runs once on its stacked rows.
+    """
+    return _predict_frame(inputs, model_type)
+
+@instrument()
+def backfill_predictions(symbols: list, start_date: str, end_date: str,
+                         model_type: str = DEFAULT_MODEL_TYPE) -> pd.DataFrame:
+    """
+    Predict every stored price row of `symbols` between start_date and end_date from its own
+    open/high/low/volume and the preceding rows, next to the actual close for evaluation.
+    """
+    start = pd.Timestamp(start_date)
+    history = get_stock_prices_multi(symbols, start, end_date)
+    if history.empty:
+        return pd.DataFrame()
+
+    inputs = history.rename(columns={'time': 'date'})
+    result = _predict_frame(inputs, model_type)
+    return result.rename(columns={'close': 'actual_close'})
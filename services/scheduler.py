@@ -1,19 +1,145 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from services.update_db import update_db
+import os
+import threading
 import time
+from datetime import datetime
+from constants import strings
+from database.database import archive_cold_prices, finish_job, get_latest_vnindex_date, migrate_indexes, try_start_job
+from services.market_calendar import MARKET_TIMEZONE, TRADING_SESSIONS, is_trading_day
+from services.universe import get_symbols
+from services.update_db import poll_order_books, update_db
 
-def start_scheduler():
-    """Start the scheduler to update the database periodically."""
-    scheduler = BackgroundScheduler()
+# Seconds between two order book polls during the trading sessions
+ORDER_BOOK_POLL_SECONDS = int(os.environ.get("STOCK_ORDER_BOOK_POLL_SECONDS", 15))
+# End of day bar sync after the close, the models are retrained once it succeeds
+EOD_SYNC_HOUR, EOD_SYNC_MINUTE = 15, 15
+# Set STOCK_SCHEDULER_ENABLED=1 to start the jobs inside the web app instead of running this module separately
+SCHEDULER_ENABLED = os.environ.get("STOCK_SCHEDULER_ENABLED", "0") == "1"
 
-    scheduler.add_job(update_db, 'interval', hours=24, next_run_time=None)
+# A running mark older than the lease is left by a crashed process and can be taken over
+JOB_LEASE_SECONDS = {"order_book": 300, "eod_sync": 3 * 3600, "retrain": 6 * 3600}
+_job_locks = {name: threading.Lock() for name in JOB_LEASE_SECONDS}
 
-    scheduler.start()
-    print("✅ Scheduler started! Updating data every 24 hours.")
+
+def is_trading_session(now: datetime = None) -> bool:
+    """Return True if `now` (market time by default) falls in a trading session of a trading day."""
+    now = now or datetime.now(MARKET_TIMEZONE)
+    if not is_trading_day(now):
+        return False
+    return any(start <= now.time() < end for start, end in TRADING_SESSIONS)
+
+
+def run_job(name: str, func):
+    """
+    Run `func` as the single flight of job `name`: skipped if a run is already in progress in this
+    process (thread lock) or in another one (lease in the job_state table). The outcome, duration
+    and the watermark returned by `func` are persisted. Return the run status, None if skipped.
+    """
+    lock = _job_locks[name]
+    if not lock.acquire(blocking=False):
+        print(f"⚠️ Job {name} is still running, skipped.")
+        return None
 
     try:
-        while True:
-            time.sleep(1)
+        started_at = try_start_job(name, JOB_LEASE_SECONDS[name])
+        if started_at is None:
+            print(f"⚠️ Job {name} is running in another process, skipped.")
+            return None
+
+        started = time.perf_counter()
+        status, error, watermark = "ok", None, None
+        try:
+            watermark = func()
+        except Exception as e:
+            status, error = "error", str(e)
+            print(f"❌ Job {name} failed: {e}")
+
+        duration = time.perf_counter() - started
+        finish_job(name, started_at, status, duration, error=error, watermark=watermark)
+        print(f"✅ Job {name} finished in {duration:.2f}s ({status})")
+        return status
+    finally:
+        lock.release()
+
+
+def _check_report(report):
+    """Fail the run if no symbol of an ingest report could be fetched."""
+    if not report.empty and (report["status"] == "error").all():
+        raise RuntimeError(f"every symbol failed, e.g. {report['error'].iloc[0]}")
+
+
+def order_book_job():
+    """Poll the intraday order books, only during the trading sessions."""
+    if not is_trading_session():
+        return
+
+    def _poll():
+        _check_report(poll_order_books())
+        return datetime.now(MARKET_TIMEZONE).replace(tzinfo=None).isoformat(timespec="seconds")
+
+    run_job("order_book", _poll)
+
+
+def eod_sync_job():
+    """
+    Sync the bars of the day once the market is closed, move bars older than the hot window to
+    the Parquet archive if enabled, then retrain the models. Nothing runs on market holidays.
+    """
+    if not is_trading_day(datetime.now(MARKET_TIMEZONE)):
+        return
+
+    def _sync():
+        _check_report(update_db())
+        if strings.ARCHIVE_ENABLED:
+            archive_cold_prices(get_symbols('VN30'))
+        latest = get_latest_vnindex_date()
+        return latest.isoformat() if latest else None
+
+    if run_job("eod_sync", _sync) == "ok":
+        retrain_job()
+
+
+def retrain_job():
+    """Retrain every model on the stored bars."""
+    def _retrain():
+        from services.train import train_all_models
+        train_all_models(get_symbols('VN30'))
+        latest = get_latest_vnindex_date()
+        return latest.isoformat() if latest else None
+
+    run_job("retrain", _retrain)
+
+
+def start_scheduler(blocking: bool = True):
+    """
+    Start the market-hours-aware jobs: order book polling every ORDER_BOOK_POLL_SECONDS during the
+    trading sessions, end of day sync followed by retraining after the close on trading days.
+    With blocking=False the scheduler runs in a background thread and is returned.
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    migrate_indexes()
+    scheduler = (BlockingScheduler if blocking else BackgroundScheduler)(timezone=MARKET_TIMEZONE)
+    # One instance per job; runs missed while busy are merged into a single one
+    options = {"max_instances": 1, "coalesce": True}
+
+    scheduler.add_job(order_book_job, 'interval', seconds=ORDER_BOOK_POLL_SECONDS, id="order_book",
+                      misfire_grace_time=ORDER_BOOK_POLL_SECONDS, **options)
+    scheduler.add_job(eod_sync_job, 'cron', day_of_week='mon-fri', hour=EOD_SYNC_HOUR, minute=EOD_SYNC_MINUTE,
+                      id="eod_sync", misfire_grace_time=3600, **options)
+
+    print(f"✅ Scheduler started! Order books every {ORDER_BOOK_POLL_SECONDS}s during sessions, "
+          f"sync and retraining at {EOD_SYNC_HOUR}:{EOD_SYNC_MINUTE:02d}.")
+    if not blocking:
+        scheduler.start()
+        return scheduler
+
+    try:
+        scheduler.start()
     except (KeyboardInterrupt, SystemExit):
-        scheduler.shutdown()
         print("❌ Scheduler stopped.")
+    return scheduler
+
+
+if __name__ == "__main__":
+    start_scheduler()
@@ -0,0 +1,204 @@
+import ast
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from database.database import get_bar_symbols, get_indicator_snapshots, get_latest_bars, save_indicator_snapshots
+from services.aggregate import update_rollups
+from services.instrumentation import instrument
+
+# Moving averages of the daily closes kept in the snapshot, as ma_<window>
+SCREENER_MA_WINDOWS = (20, 50)
+# Daily returns in the volatility and sessions in the average volume of the snapshot
+SCREENER_VOLATILITY_WINDOW = 20
+SCREENER_VOLUME_WINDOW = 20
+# Horizons in sessions of the % change columns, as change_<days>d
+SCREENER_CHANGE_DAYS = (1, 5, 20, 60)
+# Sessions read to compute a snapshot row, the current one included
+SNAPSHOT_SESSIONS = max(max(SCREENER_MA_WINDOWS) + 1, max(SCREENER_CHANGE_DAYS) + 1,
+                        SCREENER_VOLATILITY_WINDOW + 1, SCREENER_VOLUME_WINDOW + 1)
+# Sessions per year, used to annualize volatility
+TRADING_DAYS_PER_YEAR = 252
+# Default sort of the screener results
+SCREENER_SORT = os.environ.get("STOCK_SCREENER_SORT", "change_20d")
+
+# Ready-made conditions on the price and its moving averages, by label
+MA_FILTERS = {
+    "Price above MA20": "close > ma_20",
+    "Price below MA20": "close < ma_20",
+    "Price above MA50": "close > ma_50",
+    "Price below MA50": "close < ma_50",
+    "Price crossed above MA20": "prev_close <= prev_ma_20 and close > ma_20",
+    "Price crossed below MA20": "prev_close >= prev_ma_20 and close < ma_20",
+    "MA20 crossed above MA50": "prev_ma_20 <= prev_ma_50 and ma_20 > ma_50",
+    "MA20 crossed below MA50": "prev_ma_20 >= prev_ma_50 and ma_20 < ma_50",
+}
+# Syntax allowed in a filter expression: comparisons of snapshot columns and numbers combined with
+# and/or/not, and arithmetic between them. Anything else (calls, attributes, @ variables) is rejected.
+EXPRESSION_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.BitAnd, ast.BitOr,
+    ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+    ast.Name, ast.Load, ast.Constant,
+)
+
+
+def compute_snapshot(symbol: str, daily: pd.DataFrame) -> dict:
+    """
+    Latest indicators of a stock code from its newest daily bars sorted by time (SNAPSHOT_SESSIONS are enough),
+    None without bars. Indicators needing more sessions than available are NaN.
+    """
+    if daily.empty:
+        return None
+
+    close = daily["close"].to_numpy(dtype=float)
+    volume = daily["volume"].to_numpy(dtype=float)
+    sessions = len(close)
+
+    def mean_of_last(values, window, skip=0):
+        end = len(values) - skip
+        return float(values[end - window:end].mean()) if end >= window else np.nan
+
+    returns = close[1:] / close[:-1] - 1
+    row = {
+        "symbol": symbol,
+        "time": daily["time"].iloc[-1],
+        "close": close[-1],
+        "volume": volume[-1],
+        "prev_close": close[-2] if sessions > 1 else np.nan,
+        # Volatility of the last daily returns, annualized
+        "volatility": float(returns[-SCREENER_VOLATILITY_WINDOW:].std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR))
+        if len(returns) >= SCREENER_VOLATILITY_WINDOW else np.nan,
+        # Average volume of the sessions before the current one, a spike is measured against it
+        "avg_volume": mean_of_last(volume, SCREENER_VOLUME_WINDOW, skip=1),
+        "sessions": sessions,
+        "updated_at": datetime.now(),
+    }
+    for window in SCREENER_MA_WINDOWS:
+        row[f"ma_{window}"] = mean_of_last(close, window)
+        row[f"prev_ma_{window}"] = mean_of_last(close, window, skip=1)
+    for days in SCREENER_CHANGE_DAYS:
+        row[f"change_{days}d"] = close[-1] / close[-1 - days] - 1 if sessions > days else np.nan
+    return row
+
+
+def update_snapshot(symbol: str) -> int:
+    """Recompute the snapshot row of a stock code from its newest daily rollups, return rows written"""
+    row = compute_snapshot(symbol, get_latest_bars(symbol, "1D", SNAPSHOT_SESSIONS))
+    if row is None:
+        return 0
+    return save_indicator_snapshots(pd.DataFrame([row]))
+
+
+def _latest_daily_bars(symbol: str) -> pd.DataFrame:
+    """Newest SNAPSHOT_SESSIONS daily bars of a stock code, its rollups are built first if it has none"""
+    daily = get_latest_bars(symbol, "1D", SNAPSHOT_SESSIONS)
+    if daily.empty and update_rollups(symbol):
+        daily = get_latest_bars(symbol, "1D", SNAPSHOT_SESSIONS)
+    return daily
+
+
+@instrument(rows=int)
+def rebuild_snapshots(symbols: list = None) -> int:
+    """
+    Recompute the snapshot rows of `symbols` (every symbol with daily rollups by default) in one write,
+    e.g. for a database created before the screener.
+    """
+    started = time.perf_counter()
+    symbols = symbols or get_bar_symbols("1D")
+
+    rows = [compute_snapshot(symbol, _latest_daily_bars(symbol)) for symbol in symbols]
+    written = save_indicator_snapshots(pd.DataFrame([row for row in rows if row is not None]))
+    print(f"✅ Rebuilt {written} indicator snapshots in {time.perf_counter() - started:.2f}s")
+    return written
+
+
+def load_snapshots() -> pd.DataFrame:
+    """
+    Snapshot rows of every stored symbol with the columns derived across the universe:
+    volatility_rank (percentile of the volatility among all symbols, 0 to 1) and volume_ratio
+    (volume of the latest session over the average volume).
+    """
+    df = get_indicator_snapshots()
+    df["volatility_rank"] = df["volatility"].rank(pct=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["volume_ratio"] = df["volume"] / df["avg_volume"].where(df["avg_volume"] > 0)
+    return df
+
+
+def validate_expression(expression: str, columns) -> str:
+    """
+    Check that a filter expression only uses EXPRESSION_NODES, snapshot `columns` and numbers before
+    it is given to DataFrame.query, which would evaluate any Python. Raise ValueError otherwise.
+    """
+    if "@" in expression:
+        raise ValueError(f"Invalid filter expression '{expression}': '@' is not allowed")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter expression '{expression}': {e.msg}") from e
+
+    for node in ast.walk(tree):
+        if not isinstance(node, EXPRESSION_NODES):
+            raise ValueError(f"Invalid filter expression '{expression}': {type(node).__name__} is not allowed")
+        if isinstance(node, ast.Name) and node.id not in columns:
+            raise ValueError(f"Invalid filter expression '{expression}': unknown column '{node.id}'")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or
+                                               not isinstance(node.value, (int, float))):
+            raise ValueError(f"Invalid filter expression '{expression}': only numbers are allowed, "
+                             f"got {node.value!r}")
+    return expression
+
+
+@instrument()
+def screen_stocks(expression: str = None, sort_by: str = SCREENER_SORT, ascending: bool = False,
+                  limit: int = None, symbols: list = None, snapshots: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Evaluate a filter expression over the snapshot of every stored symbol (or of `symbols`) and return
+    the matching rows sorted by `sort_by`. The expression is a pandas query over the snapshot columns, e.g.
+    "close > ma_20 and volume_ratio >= 2 and change_20d > 0.05 and volatility_rank < 0.5".
+    `snapshots` reuses a frame returned by load_snapshots. Raise ValueError for an invalid expression,
+    see validate_expression.
+    """
+    df = load_snapshots() if snapshots is None else snapshots
+    if symbols is not None:
+        df = df[df["symbol"].isin(symbols)]
+    if expression and expression.strip():
+        validate_expression(expression, df.columns)
+        try:
+            df = df.query(expression, engine="python")
+        except Exception as e:
+            raise ValueError(f"Invalid filter expression '{expression}': {e}") from e
+    if sort_by in df:
+        df = df.sort_values(sort_by, ascending=ascending, na_position="last", kind="stable")
+    if limit is not None:
+        df = df.head(limit)
+    return df.reset_index(drop=True)
+
+
+def build_expression(ma_filter: str = None, volatility_rank: tuple = None, min_volume_ratio: float = None,
+                     change_days: int = None, change_range: tuple = None, custom: str = None) -> str:
+    """
+    Combine the screener conditions into one filter expression, conditions left to None are skipped.
+    Ranges are (min, max) tuples whose bounds may be None, changes and ranks are fractions (0.05 for 5%).
+    """
+    def between(column, bounds):
+        low, high = bounds
+        return [condition for bound, condition in ((low, f"{column} >= {low}"), (high, f"{column} <= {high}"))
+                if bound is not None]
+
+    conditions = []
+    if ma_filter:
+        conditions.append(MA_FILTERS[ma_filter])
+    if volatility_rank is not None:
+        conditions += between("volatility_rank", volatility_rank)
+    if min_volume_ratio:
+        conditions.append(f"volume_ratio >= {min_volume_ratio}")
+    if change_days is not None and change_range is not None:
+        if change_days not in SCREENER_CHANGE_DAYS:
+            raise ValueError(f"Unknown change horizon: {change_days} days")
+        conditions += between(f"change_{change_days}d", change_range)
+    if custom and custom.strip():
+        conditions.append(custom.strip())
+    return " and ".join(f"({condition})" for condition in conditions)
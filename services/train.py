@@ -1,66 +1,169 @@
+import copy
 import os
 import pickle
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_absolute_error
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from constants import strings
-from database.database import SessionLocal
-from database.models import create_stock_table
+from services.estimators import (DEFAULT_MODEL_TYPE, ONLINE_MODEL_TYPES, TRAIN_MODEL_TYPES, make_estimator,
+                                 model_key)
+from services.model_registry import get_model_with_metadata, record_model_metadata
+from services.features import FEATURE_COLUMNS, FEATURE_VERSION, load_training_frame, to_ordinal
 
-def train_model(symbol: str):
-    """Training a stock price prediction model for a stock symbol"""
-    db = SessionLocal()
-    StockTable = create_stock_table(symbol)
-    stock_data = db.query(StockTable).all()
-    db.close()
+# Number of processes used by train_all_models, 1 trains sequentially
+TRAIN_WORKERS = int(os.environ.get("STOCK_TRAIN_WORKERS", os.cpu_count() or 1))
 
-    if not stock_data:
+def _model_inputs(df: pd.DataFrame):
+    """Feature matrix (FEATURE_COLUMNS order) and target of a training frame as NumPy arrays"""
+    X = df[FEATURE_COLUMNS].assign(time=to_ordinal(df['time'])).to_numpy(dtype=float)
+    return X, df['close'].to_numpy(dtype=float)
+
+def _save_model(key: str, model, metadata: dict):
+    """
+    Save model together with its metadata in one pickle swapped in atomically, so the registry always
+    serves a model with its own metadata. The manifest copy lists the models without unpickling them.
+    """
+    os.makedirs(strings.MODEL_DIR, exist_ok=True)
+    model_path = os.path.join(strings.MODEL_DIR, f"{key}_model.pkl")
+    with open(model_path + ".tmp", "wb") as f:
+        pickle.dump({"model": model, "metadata": metadata}, f)
+
+    record_model_metadata(key, metadata)
+    os.replace(model_path + ".tmp", model_path)
+
+def train_model(symbol: str, model_type: str = DEFAULT_MODEL_TYPE):
+    """Training a stock price prediction model of `model_type` for a stock symbol"""
+    # scikit-learn is only needed to train, not to serve the app
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import r2_score, mean_absolute_error
+
+    df = load_training_frame(symbol)
+
+    if df.empty:
         print(f"❌ No data found for {symbol}. Skipping training...")
         return
     
-    df = pd.DataFrame([s.__dict__ for s in stock_data])
-    df.drop(columns=['_sa_instance_state', 'id'], inplace=True)
-    df['time'] = pd.to_datetime(df['time']).map(pd.Timestamp.toordinal)
-    
-    df['returns'] = df['close'].pct_change()
-    df['volatility'] = df['returns'].rolling(window=5).std()
-    df['ma_10'] = df['close'].rolling(window=10).mean()
-    # Check and process data is missed
-    df.dropna(inplace=True)
-    
-    X = df[['time', 'open', 'high', 'low', 'volume', 'ma_10', 'volatility']]
-    y = df['close']
+    X, y = _model_inputs(df)
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Hold out the most recent bars, a random split would leak future prices into training
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
     
-    model = LinearRegression()
+    model = make_estimator(model_type)
     model.fit(X_train, y_train)
     
     # Model Evaluation
     y_pred = model.predict(X_test)
     r2 = r2_score(y_test, y_pred)
     mae = mean_absolute_error(y_test, y_pred)
-    print(f"✅ {symbol}: R² = {r2:.4f}, MAE = {mae:.4f}")
-    
-    # Save model
-    os.makedirs(strings.MODEL_DIR, exist_ok=True)
-    model_path = os.path.join(strings.MODEL_DIR, f"{symbol}_model.pkl")
-    with open(model_path, "wb") as f:
-        pickle.dump(model, f)
+    print(f"✅ {symbol} ({model_type}): R² = {r2:.4f}, MAE = {mae:.4f}")
+
+    # The served model also learns the held-out bars, online models only need to be updated with them
+    if model_type in ONLINE_MODEL_TYPES:
+        model.partial_fit(X_test, y_test)
+    else:
+        model = make_estimator(model_type).fit(X, y)
+
+    trained_at = datetime.now().isoformat(timespec="seconds")
+    metadata = {
+        "version": trained_at,
+        "trained_at": trained_at,
+        "model_type": model_type,
+        "estimator": type(model).__name__,
+        "r2": r2,
+        "mae": mae,
+        "rows": len(df),
+        "trained_until": df['time'].max().isoformat(),
+        "features": FEATURE_COLUMNS,
+        "feature_version": FEATURE_VERSION,
+    }
+    _save_model(model_key(symbol, model_type), model, metadata)
     
     print(f"✅ Model trained and saved for {symbol}!")
+    return metadata
+
+def update_online_model(symbol: str, model_type: str = "online"):
+    """
+    Update the online model of a stock symbol with the bars stored after the last ones it learned,
+    without reading the rest of the history. The model is trained in full if it does not exist yet
+    or was trained on other feature definitions.
+    Return its metadata.
+    """
+    key = model_key(symbol, model_type)
+    model, metadata = get_model_with_metadata(key)
+    if model is None or not metadata.get("trained_until") or metadata.get("feature_version") != FEATURE_VERSION:
+        return train_model(symbol, model_type)
+
+    since = pd.Timestamp(metadata["trained_until"]) + pd.Timedelta(microseconds=1)
+    df = load_training_frame(symbol, start_date=since)
+    if df.empty:
+        return metadata
+
+    # The registry instance may be serving predictions, update a copy
+    model = copy.deepcopy(model)
+    model.partial_fit(*_model_inputs(df))
+
+    updated_at = datetime.now().isoformat(timespec="seconds")
+    metadata.update(version=updated_at, updated_at=updated_at, rows=metadata.get("rows", 0) + len(df),
+                    trained_until=df['time'].max().isoformat())
+    _save_model(key, model, metadata)
+    print(f"✅ {symbol}: online model updated with {len(df)} new bars")
+    return metadata
+
+
+def _init_worker():
+    """Drop database connections inherited from the parent process"""
+    from database.database import engine
+    engine.dispose(close=False)
+
+def _train_timed(symbol: str, model_type: str = DEFAULT_MODEL_TYPE) -> dict:
+    """Train (or update, for online models) one symbol and return its summary row, runs in a worker process"""
+    started = time.perf_counter()
+    row = {"symbol": symbol, "model_type": model_type, "status": "ok", "seconds": None, "r2": None, "mae": None,
+           "rows": 0, "error": None}
+    try:
+        if model_type in ONLINE_MODEL_TYPES:
+            metadata = update_online_model(symbol, model_type)
+        else:
+            metadata = train_model(symbol, model_type)
+        if metadata is None:
+            row["status"] = "no data"
+        else:
+            row.update(r2=metadata["r2"], mae=metadata["mae"], rows=metadata["rows"])
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = str(e)
+        print(f"❌ Error when training {symbol} ({model_type}): {e}")
+    row["seconds"] = time.perf_counter() - started
+    return row
 
+def train_all_models(symbols: list, workers: int = TRAIN_WORKERS, model_types: list = None) -> pd.DataFrame:
+    """
+    Train the models of every type in `model_types` (TRAIN_MODEL_TYPES by default) for the list of
+    stock codes, in parallel across `workers` processes. Online models are only updated with new bars.
+    Return a summary with the wall time, R² and MAE of every symbol and model type.
+    """
+    started = time.perf_counter()
+    tasks = [(symbol, model_type) for model_type in (model_types or TRAIN_MODEL_TYPES) for symbol in symbols]
+    workers = max(1, min(workers, len(tasks)))
 
-def train_all_models(symbols: list):
-    """Train the model for the list of stock codes"""
-    for symbol in symbols:
-        train_model(symbol)
+    if workers == 1:
+        report = [_train_timed(symbol, model_type) for symbol, model_type in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(_train_timed, symbol, model_type) for symbol, model_type in tasks]
+            report = [future.result() for future in as_completed(futures)]
 
+    report = pd.DataFrame(report)
+    if not report.empty:
+        report = report.sort_values(["symbol", "model_type"]).reset_index(drop=True)
+    print(report.to_string(index=False))
+    print(f"✅ Trained {len(tasks)} models with {workers} workers in {time.perf_counter() - started:.2f}s")
+    return report
 
 if __name__ == "__main__":
-    from vnstock import Vnstock
-    symbols = Vnstock().stock().listing.symbols_by_group('VN30')
+    from services.universe import get_symbols
+    symbols = get_symbols('VN30')
     train_all_models(symbols)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from database.database import get_symbol_group, save_symbol_group
+
+# Default symbol group used by the app, update_db and training
+DEFAULT_GROUP = "VN30"
+# Groups listed by exchange instead of by index basket
+EXCHANGE_GROUPS = ("HOSE", "HNX", "UPCOM")
+# How long a stored symbol list is trusted before it is refreshed from the API
+UNIVERSE_REFRESH_HOURS = int(os.environ.get("STOCK_UNIVERSE_REFRESH_HOURS", 24))
+# Delay before retrying the API after a failed refresh
+UNIVERSE_RETRY_MINUTES = 5
+
+_groups = {}
+_lock = threading.Lock()
+
+
+def fetch_symbol_group(group_name: str) -> list:
+    """Get the members of a group (VN30, VN100, HNX30, HOSE, HNX, UPCOM, ...) from the API."""
+    from vnstock import Vnstock
+
+    listing = Vnstock().stock().listing
+    if group_name not in EXCHANGE_GROUPS:
+        return list(listing.symbols_by_group(group_name))
+
+    df = listing.symbols_by_exchange()
+    if "type" in df.columns:
+        df = df[df["type"] == "STOCK"]
+    return list(df.loc[df["exchange"] == group_name, "symbol"])
+
+
+def _expires_at(updated_at):
+    return updated_at + timedelta(hours=UNIVERSE_REFRESH_HOURS) if updated_at is not None else None
+
+
+def _remember(group_name: str, symbols: list, expires_at):
+    with _lock:
+        _groups[group_name] = (symbols, expires_at)
+
+
+def refresh_symbols(group_name: str = DEFAULT_GROUP) -> list:
+    """Fetch a group from the API, persist it and update the in-memory lookup."""
+    symbols = fetch_symbol_group(group_name)
+    if not symbols:
+        raise ValueError(f"Empty symbol list for group {group_name}")
+
+    updated_at = save_symbol_group(group_name, symbols)
+    _remember(group_name, symbols, _expires_at(updated_at))
+    print(f"✅ Refreshed {group_name}: {len(symbols)} symbols")
+    return list(symbols)
+
+
+def get_symbols(group_name: str = DEFAULT_GROUP) -> list:
+    """
+    Get the symbols of a group. Served from memory, then from the database;
+    the API is only called when the stored list is missing or older than UNIVERSE_REFRESH_HOURS.
+    A stale list is returned if the refresh fails.
+    """
+    now = datetime.now()
+    with _lock:
+        symbols, expires_at = _groups.get(group_name, ([], None))
+    if expires_at is not None and now < expires_at:
+        return list(symbols)
+
+    stored, stored_at = get_symbol_group(group_name)
+    if stored and now < _expires_at(stored_at):
+        _remember(group_name, stored, _expires_at(stored_at))
+        return list(stored)
+
+    try:
+        return refresh_symbols(group_name)
+    except Exception as e:
+        print(f"❌ Error when refreshing {group_name}, using stored list: {e}")
+        fallback = stored or symbols
+        _remember(group_name, fallback, now + timedelta(minutes=UNIVERSE_RETRY_MINUTES))
+        return list(fallback)
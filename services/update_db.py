@@ -1,33 +1,51 @@
-from vnstock import Vnstock
-from database.database import save_vnindex_prices, save_stock_prices, save_order_book, get_latest_stock_date, get_latest_vnindex_date
-from services.fetch_data import fetch_vnindex_data, fetch_stock_data, fetch_order_book_stock_data
+from constants import strings
+from database.database import get_latest_stock_date, get_latest_vnindex_date
+from services.estimators import ONLINE_MODEL_TYPES, model_key
+from services.ingest import ingest
+from services.model_registry import get_model_metadata
+from services.universe import get_symbols
 from datetime import datetime, timedelta
 
-def update_db():
+def update_db(source=None):
     """Update database with latest data (only add new data)."""
     today = datetime.today().strftime("%Y-%m-%d")
+    default_start = (datetime.today() - timedelta(days=10)).strftime("%Y-%m-%d")
 
     latest_vnindex_date = get_latest_vnindex_date()
-    start_date_vnindex = latest_vnindex_date if latest_vnindex_date else (datetime.today() - timedelta(days=10)).strftime("%Y-%m-%d")
+    start_dates = {strings.VNINDEX: latest_vnindex_date.strftime("%Y-%m-%d") if latest_vnindex_date else default_start}
 
-    print(f"🔄 Fetching VNINDEX data from {start_date_vnindex} to {today}...")
-    vnindex_df = fetch_vnindex_data(start_date_vnindex, today)
-    if not vnindex_df.empty:
-        save_vnindex_prices(vnindex_df)
-
-    symbols = Vnstock().stock().listing.symbols_by_group('VN30')
+    symbols = get_symbols('VN30')
     for symbol in symbols:
         latest_stock_date = get_latest_stock_date(symbol)
-        start_date_stock = latest_stock_date if latest_stock_date else (datetime.today() - timedelta(days=10)).strftime("%Y-%m-%d")
+        start_dates[symbol] = latest_stock_date.strftime("%Y-%m-%d") if latest_stock_date else default_start
+
+    print(f"🔄 Fetching data for {len(start_dates)} symbols up to {today}...")
+    report = ingest(start_dates, today, source=source)
+    update_online_models(report)
+    return report
+
+def update_online_models(report):
+    """Update the trained online models of the symbols that received new rows with those rows only."""
+    if report.empty:
+        return
+    # The training code is only loaded when some symbol received rows
+    from services.train import update_online_model
 
-        print(f"🔄 Fetching stock data for {symbol} from {start_date_stock} to {today}...")
-        stock_df = fetch_stock_data(symbol, start_date_stock, today)
-        order_book_df = fetch_order_book_stock_data(symbol)
-        if not stock_df.empty:
-            save_stock_prices(symbol, stock_df)
-        
-        if not order_book_df.empty:
-            save_order_book(symbol, order_book_df)
+    updated = report[(report["status"] == "ok") & (report["rows_inserted"] > 0) & (report["symbol"] != strings.VNINDEX)]
+    for symbol in updated["symbol"]:
+        for model_type in ONLINE_MODEL_TYPES:
+            if not get_model_metadata(model_key(symbol, model_type)):
+                continue
+            try:
+                update_online_model(symbol, model_type)
+            except Exception as e:
+                print(f"❌ Error when updating the {model_type} model of {symbol}: {e}")
+
+def poll_order_books(source=None):
+    """Fetch only the intraday order book of every tracked stock code, new matches are appended."""
+    start_dates = {symbol: None for symbol in get_symbols('VN30')}
+    today = datetime.today().strftime("%Y-%m-%d")
+    return ingest(start_dates, today, source=source, include_prices=False)
 
 if __name__ == "__main__":
-    update_db()
\ No newline at end of file
+    update_db()
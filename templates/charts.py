@@ -0,0 +1,25 @@
+import os
+import plotly.graph_objects as go
+from services.downsample import downsample
+
+# Maximum number of points of one trace sent to the browser
+CHART_TARGET_POINTS = int(os.environ.get("STOCK_CHART_TARGET_POINTS", 1500))
+# Traces with more points than this are drawn with WebGL
+SCATTERGL_THRESHOLD = 5000
+# Downsampling method: "lttb" keeps the visual shape, "minmax" keeps every spike
+DOWNSAMPLE_METHOD = os.environ.get("STOCK_CHART_DOWNSAMPLE", "lttb")
+
+
+def line_trace(x, y, target_points: int = CHART_TARGET_POINTS, **kwargs):
+    """
+    Build a line trace for a (possibly very long) series: missing values are dropped, the series is
+    downsampled to `target_points` and WebGL is used if it is still large.
+    """
+    mask = y.notna().to_numpy() if hasattr(y, "notna") else None
+    x, y = (x[mask], y[mask]) if mask is not None else (x, y)
+
+    if target_points and len(y) > target_points:
+        x, y = downsample(x, y, target_points, DOWNSAMPLE_METHOD)
+
+    trace_type = go.Scattergl if len(y) > SCATTERGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, mode='lines', **kwargs)
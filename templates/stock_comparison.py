@@ -1,37 +1,87 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
-from vnstock import Vnstock
 import constants.strings as strings
-from database.database import get_stock_prices
-
-def fetch_stock_data(ticker, start_date, end_date):
-    """Get stock data from API or database backup"""
-    stock = Vnstock().stock(symbol=ticker, source='VCI')
-    df = stock.quote.history(symbol=ticker, start=start_date.strftime('%Y-%m-%d'), 
-                             end=end_date.strftime('%Y-%m-%d'), interval="1D")
-    if df.empty:
-        df = get_stock_prices(ticker, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-    
-    if not df.empty:
-        df.rename(columns={"time": "date"}, inplace=True)
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-    return df
-
-def plot_stock_comparison_chart(stock_data):
-    """Draw a chart comparing stock codes"""
+from templates.charts import line_trace
+from services.comparison import CORRELATION_WINDOW, compare_stocks, clear_cache as clear_comparison_cache
+from services.market_data import clear_cache
+from services.instrumentation import instrument, span
+
+@instrument(rows=None)
+def fetch_comparison(tickers, start_date, end_date):
+    """Get the aligned daily closes of every stock code and their analytics, cached per ticker set and range"""
+    return compare_stocks(tickers, start_date, end_date)
+
+@instrument()
+def plot_stock_comparison_chart(analytics):
+    """Draw a chart comparing the performance of stock codes, every close is rebased to 100"""
     fig = go.Figure()
 
-    for ticker, df in stock_data.items():
-        fig.add_trace(go.Scatter(x=df.index, y=df['close'], mode='lines',
-                                 name=ticker, line=dict(width=2), 
-                                 hovertemplate='%{y:,.3f} VND<br>%{x|%Y-%m-%d}'))
+    normalized = analytics["normalized"]
+    for ticker in normalized.columns:
+        fig.add_trace(line_trace(normalized.index, normalized[ticker],
+                                 name=ticker, line=dict(width=2),
+                                 hovertemplate='%{y:,.1f}<br>%{x|%Y-%m-%d}'))
+
+    benchmark = analytics["benchmark"]
+    fig.add_trace(line_trace(benchmark.index, benchmark,
+                             name=strings.VNINDEX, line=dict(color='#2a4d8f', width=2, dash='dash'),
+                             hovertemplate='%{y:,.1f}<br>%{x|%Y-%m-%d}'))
 
     fig.update_layout(title=dict(text=strings.STOCK_COMPARISON_TITLE, font=dict(size=28)),
-                      xaxis_title="Date", yaxis_title="Price (VND)")
+                      xaxis_title="Date", yaxis_title="Performance (base 100)", hovermode='x unified')
+    return fig
+
+@instrument()
+def plot_drawdown_chart(analytics):
+    """Draw the drawdown from the running peak of every stock code"""
+    fig = go.Figure()
+
+    drawdown = analytics["drawdown"]
+    for ticker in drawdown.columns:
+        fig.add_trace(line_trace(drawdown.index, drawdown[ticker],
+                                 name=ticker, line=dict(width=1),
+                                 hovertemplate='%{y:.1%}<br>%{x|%Y-%m-%d}'))
+
+    fig.update_layout(xaxis_title="Date", yaxis_title="Drawdown", yaxis=dict(tickformat=".0%"),
+                      hovermode='x unified')
     return fig
 
+def plot_correlation_heatmap(matrix, tickers, title):
+    """Draw a correlation matrix as a heatmap"""
+    fig = go.Figure(go.Heatmap(z=matrix, x=tickers, y=tickers, zmin=-1, zmax=1, colorscale='RdBu',
+                               hovertemplate='%{x} / %{y}: %{z:.2f}<extra></extra>'))
+    fig.update_layout(title=title, yaxis=dict(autorange='reversed'))
+    return fig
+
+def display_summary(analytics):
+    """Show the return, volatility, drawdown and beta of every stock code"""
+    st.subheader(strings.COMPARISON_SUMMARY_TITLE)
+    summary = analytics["summary"].rename(columns=strings.COMPARISON_SUMMARY_COLUMNS)
+    st.dataframe(summary.style.format({"Last Close": "{:,.2f}", "Return": "{:.1%}", "Volatility (ann.)": "{:.1%}",
+                                       "Max Drawdown": "{:.1%}", "Beta vs VNINDEX": "{:.2f}"}, na_rep="-"),
+                 hide_index=True, use_container_width=True)
+
+def display_correlation(analytics):
+    """Show the correlation over the whole range and over a rolling window picked with a slider"""
+    tickers = list(analytics["normalized"].columns)
+    col_left, col_right = st.columns(2)
+
+    with col_left:
+        st.plotly_chart(plot_correlation_heatmap(analytics["correlation"].to_numpy(), tickers,
+                                                 strings.COMPARISON_CORRELATION_RANGE), use_container_width=True)
+
+    rolling_days = analytics["rolling_days"]
+    if len(rolling_days) == 0:
+        return
+    with col_right:
+        # Every window is precomputed and the analytics are cached, moving the slider only redraws the heatmap
+        options = list(rolling_days.date)
+        end_day = st.select_slider(strings.COMPARISON_ROLLING_CORRELATION.format(CORRELATION_WINDOW),
+                                   options=options, value=options[-1])
+        position = options.index(end_day)
+        st.plotly_chart(plot_correlation_heatmap(analytics["rolling_correlation"][position], tickers,
+                                                 end_day.strftime("%Y-%m-%d")), use_container_width=True)
+
 def stock_comparison_screen(start_date, end_date, tickers):
     """Stock price comparison interface"""
 
@@ -40,15 +90,25 @@ def stock_comparison_screen(start_date, end_date, tickers):
 
     if st.button("🔄 Refresh Data"):
         st.session_state.update_data_stock = True
+        clear_cache()
+        clear_comparison_cache()
         st.rerun()
 
     if st.session_state.update_data_comparison:
         try:
-            stock_data = {ticker: fetch_stock_data(ticker, start_date, end_date) for ticker in tickers}
-            stock_data = {ticker: df for ticker, df in stock_data.items() if not df.empty}
+            analytics = fetch_comparison(tickers, start_date, end_date)
+
+            if analytics is not None:
+                fig = plot_stock_comparison_chart(analytics)
+                with span("stock_comparison.render_chart", tickers=len(analytics["summary"])):
+                    st.plotly_chart(fig)
+                display_summary(analytics)
 
-            if stock_data:
-                st.plotly_chart(plot_stock_comparison_chart(stock_data))
+                tab1, tab2 = st.tabs([strings.COMPARISON_DRAWDOWN_TAB, strings.COMPARISON_CORRELATION_TAB])
+                with tab1:
+                    st.plotly_chart(plot_drawdown_chart(analytics), use_container_width=True)
+                with tab2:
+                    display_correlation(analytics)
             else:
                 st.warning("No data available for the selected stocks.")
 
@@ -1,18 +1,22 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from vnstock import Vnstock
 import constants.strings as strings
-from database.database import get_stock_prices, get_order_book
-
-
-def fetch_stock_data(stock, symbol, start_date, end_date):
-    """ Get stock data from API or database """
-    df = stock.quote.history(symbol=symbol, start=start_date.strftime('%Y-%m-%d'), 
-                             end=end_date.strftime('%Y-%m-%d'), interval="1m")
-
-    if df.empty:
-        df = get_stock_prices(symbol, start_date, end_date)
+from templates.charts import line_trace
+from database.database import get_order_book, save_order_book
+from services.ingest import VnstockSource
+from services.order_flow import get_order_flow
+from services.scheduler import SCHEDULER_ENABLED
+from services.market_data import get_history, clear_cache
+from services.features import FEATURE_MA_WINDOWS, daily_moving_average
+from services.aggregate import choose_interval
+from services.instrumentation import instrument
+
+
+@instrument()
+def fetch_stock_data(symbol, start_date, end_date, interval):
+    """ Get stock bars at the given resolution from the market data cache """
+    df = get_history(symbol, start_date, end_date, interval=interval)
 
     if df.empty:
         st.error(strings.ERROR_NO_DATA.format(symbol, start_date, end_date))
@@ -24,12 +28,13 @@ def fetch_stock_data(stock, symbol, start_date, end_date):
 
     return df
 
-def plot_stock_chart(df, show_ma, ma_period):
-    """ Draw stock price chart """
+@instrument()
+def plot_stock_chart(df, symbol, show_ma, ma_period, interval):
+    """ Draw stock price chart, the moving average is daily whatever the resolution of the bars """
     fig = go.Figure()
 
-    fig.add_trace(go.Scatter(
-        x=df.index, y=df['close'], mode='lines',
+    fig.add_trace(line_trace(
+        df.index, df['close'],
         name='Closing Price', line=dict(color='#2a4d8f', width=2),
         hovertemplate='%{y:,.3f} VND<br>%{x|%Y-%m-%d}'
     ))
@@ -38,10 +43,10 @@ def plot_stock_chart(df, show_ma, ma_period):
         if any(col.lower() == 'ma' for col in df.columns):  # Kiểm tra cả 'ma' và 'MA'
             df.drop(columns=[col for col in df.columns if col.lower() == 'ma'], inplace=True)
     
-        df['MA'] = df['close'].rolling(window=ma_period).mean()
+        df['MA'] = daily_moving_average(symbol, df.index, ma_period, interval)
         
-        fig.add_trace(go.Scatter(
-            x=df.index, y=df['MA'], mode='lines',
+        fig.add_trace(line_trace(
+            df.index, df['MA'],
             name=f'MA{ma_period}', line=dict(color='#ff6b35', width=2, dash='dash'),
             hovertemplate='%{y:,.3f} VND<br>%{x|%Y-%m-%d}'
         ))
@@ -75,21 +80,54 @@ def display_market_info(df, symbol, ma_period):
         st.markdown(strings.TREND_FORECAST)
         st.markdown(f"<h2 style='color: {trend_color};'>{trend}</h2>", unsafe_allow_html=True)
 
-def display_order_book(stock, symbol):
-    """ Display Order Book """
+@instrument()
+def display_order_book(symbol, limit=20):
+    """ Display the latest matches of the Order Book, kept up to date by the scheduler """
     st.subheader(strings.ORDER_BOOK_TITLE)
-    try:
-        order_book_df = stock.quote.intraday(symbol=symbol, show_log=False)
-        
-        if order_book_df.empty: 
-            order_book_df = get_order_book(symbol)
-
-        order_book_df.rename(columns={"time": "Time", "price": "Price", "volume": "Volume", 
-                                      "match_type": "Type", "id": "ID"}, inplace=True)
-        st.dataframe(order_book_df.sort_values(by="Time", ascending=False).head(20), height=300, use_container_width=True)
-    except:
-        order_book_df = get_order_book(symbol)
-        
+    order_book_df = get_order_book(symbol, limit=limit, descending=True)
+
+    # Without the scheduler polling in the background, new matches are fetched on display
+    if order_book_df.empty or not SCHEDULER_ENABLED:
+        try:
+            save_order_book(symbol, VnstockSource().fetch_order_book(symbol))
+            order_book_df = get_order_book(symbol, limit=limit, descending=True)
+        except Exception as e:
+            print(f"❌ Error when fetching order book of {symbol}: {e}")
+
+    if order_book_df.empty:
+        st.info(strings.NO_ORDER_DATA_WARNING)
+        return
+
+    order_book_df.rename(columns={"time": "Time", "price": "Price", "volume": "Volume", 
+                                  "match_type": "Type", "id": "ID"}, inplace=True)
+    st.dataframe(order_book_df, height=300, use_container_width=True)
+
+@instrument()
+def display_order_flow(symbol):
+    """ Display VWAP, buy/sell imbalance, volume at price and trade rate of the latest session """
+    flow = get_order_flow(symbol)
+    if flow is None:
+        return
+
+    st.subheader(strings.ORDER_FLOW_TITLE.format(flow["trade_rate"]["time"].iloc[0].strftime("%Y-%m-%d")))
+    col1, col2, col3 = st.columns(3)
+    col1.metric(strings.ORDER_FLOW_VWAP, f"{flow['vwap']:,.2f}")
+    col2.metric(strings.ORDER_FLOW_IMBALANCE, f"{flow['imbalance']:+.1%}" if flow['imbalance'] is not None else "-")
+    col3.metric(strings.ORDER_FLOW_TRADES, f"{flow['trades']:,}")
+
+    col_left, col_right = st.columns(2)
+    with col_left:
+        at_price = flow["volume_at_price"]
+        fig = go.Figure([go.Bar(y=at_price["price"], x=at_price[match_type], name=match_type, orientation='h')
+                         for match_type in at_price.columns if match_type != "price"])
+        fig.update_layout(title=strings.VOLUME_AT_PRICE_TITLE, barmode='stack', template='plotly_white', height=400)
+        st.plotly_chart(fig, use_container_width=True)
+    with col_right:
+        rate = flow["trade_rate"]
+        fig = go.Figure([line_trace(rate["time"], rate["trades"], name=strings.TRADE_RATE_TITLE)])
+        fig.update_layout(title=strings.TRADE_RATE_TITLE, template='plotly_white', height=400)
+        st.plotly_chart(fig, use_container_width=True)
+
 def display_raw_data(df):
     """ Show original data """
     st.subheader(strings.RAW_DATA_TITLE)
@@ -113,19 +151,24 @@ def stock_detail_screen(symbol, start_date, end_date):
     # 🎛️ UI: Chọn MA & Refresh
     col_left, col_right = st.columns([3, 1])
     with col_left:
-        ma_period = st.slider(strings.MOVING_AVERAGE_PERIOD, min_value=5, max_value=50, value=20)
+        ma_period = st.select_slider(strings.MOVING_AVERAGE_PERIOD, options=FEATURE_MA_WINDOWS, value=20)
         show_ma = st.checkbox(strings.MOVING_AVERAGE_TOGGLE, value=True)
 
     with col_right:
         if st.button(strings.REFRESH_DATA):
             st.session_state.update_data_stock = True
+            clear_cache()
             st.rerun()
 
-    stock = Vnstock().stock(symbol=symbol, source='VCI')
-    if st.session_state.update_data_stock:
-        df = fetch_stock_data(stock, symbol, start_date, end_date)
+    # Reload when the symbol or date range changes, the resolution depends on the range
+    data_key = (symbol, start_date, end_date)
+    if st.session_state.update_data_stock or st.session_state.get("stock_data_key") != data_key:
+        interval = choose_interval(start_date, end_date)
+        df = fetch_stock_data(symbol, start_date, end_date, interval)
         if df is not None:
             st.session_state.stock_data = df
+            st.session_state.stock_data_key = data_key
+            st.session_state.stock_interval = interval
             st.session_state.update_data_stock = False
         else:
             return
@@ -133,13 +176,16 @@ def stock_detail_screen(symbol, start_date, end_date):
     df = st.session_state.stock_data
     df.columns = df.columns.str.lower()
     
-    plot_stock_chart(df, show_ma, ma_period)
+    interval = st.session_state.get("stock_interval")
+    st.caption(strings.CHART_RESOLUTION.format(interval))
+    plot_stock_chart(df, symbol, show_ma, ma_period, interval)
     display_market_info(df, symbol, ma_period)
 
     # 🔍 Tab Order Book & Raw Data
     tab1, tab2 = st.tabs([strings.ORDER_BOOK_TAB, strings.RAW_DATA_TAB])
 
     with tab1:
-        display_order_book(stock, symbol)
+        display_order_book(symbol)
+        display_order_flow(symbol)
     with tab2:
         display_raw_data(df)
\ No newline at end of file
@@ -1,11 +1,15 @@
 import streamlit as st
+import constants.strings as strings
 from services.predict import predict_stock_price
-from vnstock import Vnstock
+from services.model_registry import get_model_metadata
+from services.estimators import model_key, model_type_for
+from services.universe import get_symbols
 
-def stock_predict_screen():
-    st.subheader("📈 Stock Price Prediction")
+def stock_predict_screen(model_label=None):
+    model_type = model_type_for(model_label)
+    st.subheader(f"📈 Stock Price Prediction ({model_label or strings.STOCK_PREDICT_MODEL[0]})")
 
-    symbols = Vnstock().stock().listing.symbols_by_group('VN30')
+    symbols = get_symbols('VN30')
     symbol = st.selectbox("Select stock symbol", symbols)
     
     target_date = st.date_input("Select prediction date")
@@ -16,8 +20,12 @@ def stock_predict_screen():
 
     if st.button("🔮 Predict"):
         if target_date and open_price and high_price and low_price and volume:
-            prediction = predict_stock_price(symbol, target_date.strftime("%Y-%m-%d"), open_price, high_price, low_price, volume)
+            prediction = predict_stock_price(symbol, target_date.strftime("%Y-%m-%d"), open_price, high_price, low_price, volume,
+                                             model_type=model_type)
             st.success(f"📊 Predicted price: {prediction}")
+            metadata = get_model_metadata(model_key(symbol, model_type))
+            if metadata:
+                st.caption(f"Model version: {metadata['version']}")
         else:
             st.warning("⚠️ Please enter all required information!")
 
@@ -0,0 +1,66 @@
+import time
+import streamlit as st
+import constants.strings as strings
+from services.screener import (MA_FILTERS, SCREENER_CHANGE_DAYS, SCREENER_SORT, build_expression, load_snapshots,
+                               rebuild_snapshots, screen_stocks)
+
+def screener_filters():
+    """Show the filter widgets and return (expression, sort column, ascending)"""
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        ma_filter = st.selectbox(strings.SCREENER_MA_FILTER, list(MA_FILTERS), index=None)
+        low, high = st.slider(strings.SCREENER_VOLATILITY_RANK, min_value=0, max_value=100, value=(0, 100))
+        volatility_rank = (low / 100 if low > 0 else None, high / 100 if high < 100 else None)
+
+    with col2:
+        min_volume_ratio = st.number_input(strings.SCREENER_VOLUME_RATIO, min_value=0.0, value=0.0, step=0.5)
+        change_days = st.selectbox(strings.SCREENER_CHANGE_DAYS, SCREENER_CHANGE_DAYS,
+                                   format_func=lambda days: f"{days} sessions", index=None)
+        # The ends of the slider leave the range open
+        change_low, change_high = st.slider(strings.SCREENER_CHANGE_RANGE, min_value=-50, max_value=50, value=(-50, 50))
+        change_range = (change_low / 100 if change_low > -50 else None, change_high / 100 if change_high < 50 else None)
+
+    with col3:
+        columns = [column for column in strings.SCREENER_COLUMNS if column not in ("symbol", "time")]
+        sort_by = st.selectbox(strings.SCREENER_SORT_BY, columns, index=columns.index(SCREENER_SORT),
+                               format_func=strings.SCREENER_COLUMNS.get)
+        ascending = st.checkbox(strings.SCREENER_ASCENDING, value=False)
+
+    custom = st.text_input(strings.SCREENER_CUSTOM, help=strings.SCREENER_CUSTOM_HELP)
+    expression = build_expression(ma_filter, volatility_rank, min_volume_ratio, change_days,
+                                  change_range if change_days else None, custom)
+    return expression, sort_by, ascending
+
+def display_results(results, total, seconds):
+    """Show the matching stock codes"""
+    st.caption(strings.SCREENER_RESULT.format(len(results), total, seconds * 1000))
+    table = results[list(strings.SCREENER_COLUMNS)].rename(columns=strings.SCREENER_COLUMNS)
+    percent = {strings.SCREENER_COLUMNS[column]: "{:.1%}" for column in
+               ("change_1d", "change_5d", "change_20d", "change_60d", "volatility", "volatility_rank")}
+    st.dataframe(table.style.format({**percent, "Close": "{:,.2f}", "MA20": "{:,.2f}", "MA50": "{:,.2f}",
+                                     "Volume": "{:,.0f}", "Volume Ratio": "{:.2f}", "Session": "{:%Y-%m-%d}"},
+                                    na_rep="-"),
+                 hide_index=True, use_container_width=True, height=600)
+
+def stock_screener_screen():
+    """Stock screener interface over the latest indicators of every stored stock code"""
+    st.subheader(strings.SCREENER_TITLE)
+
+    if st.button(strings.SCREENER_REBUILD):
+        with st.spinner(strings.SCREENER_REBUILD):
+            rebuild_snapshots()
+
+    expression, sort_by, ascending = screener_filters()
+    started = time.perf_counter()
+    snapshots = load_snapshots()
+    if snapshots.empty:
+        st.info(strings.SCREENER_EMPTY)
+        return
+
+    try:
+        results = screen_stocks(expression, sort_by, ascending, snapshots=snapshots)
+    except ValueError as e:
+        st.error(strings.ERROR_MESSAGE.format(e))
+        return
+    display_results(results, len(snapshots), time.perf_counter() - started)
@@ -1,18 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from vnstock import Vnstock
 import constants.strings as strings
-from database.database import get_vnindex_infor
+from templates.charts import line_trace
+from services.market_data import get_history, clear_cache
+from services.features import FEATURE_MA_WINDOWS, daily_moving_average
+from services.instrumentation import instrument, span
 
+@instrument()
 def get_vnindex_data(start_date, end_date):
-    """Get VNINDEX data from API"""
-    stock = Vnstock().stock(symbol=strings.VNINDEX, source='VCI')
-    df = stock.quote.history(symbol=strings.VNINDEX, start=start_date.strftime('%Y-%m-%d'), 
-                             end=end_date.strftime('%Y-%m-%d'), interval="1D")
-    
-    if df.empty:
-        df = get_vnindex_infor(start_date, end_date)
+    """Get VNINDEX data from the market data cache"""
+    df = get_history(strings.VNINDEX, start_date, end_date, interval="1D")
 
     if df.empty:
         st.error(strings.ERROR_NO_DATA.format(strings.VNINDEX, start_date, end_date))
@@ -24,17 +22,18 @@ def get_vnindex_data(start_date, end_date):
         df.set_index('date', inplace=True)
     return df
 
+@instrument()
 def plot_vnindex_chart(df, ma_period, show_ma):
     """Create VNINDEX chart"""
     fig = go.Figure()
 
-    fig.add_trace(go.Scatter(x=df.index, y=df['close'], mode='lines',
+    fig.add_trace(line_trace(df.index, df['close'],
                              name='VNINDEX', line=dict(color='#2a4d8f', width=2),
                              hovertemplate='%{y:,.0f} points<br>%{x|%Y-%m-%d}'))
 
     if show_ma:
-        df['MA'] = df['close'].rolling(window=ma_period).mean()
-        fig.add_trace(go.Scatter(x=df.index, y=df['MA'], mode='lines',
+        df['MA'] = daily_moving_average(strings.VNINDEX, df.index, ma_period)
+        fig.add_trace(line_trace(df.index, df['MA'],
                                  name=f'MA{ma_period}', line=dict(color='#ff6b35', width=2, dash='dash'),
                                  hovertemplate='%{y:,.0f} points<br>%{x|%Y-%m-%d}'))
 
@@ -71,19 +70,22 @@ def vnindex_screen(start_date, end_date):
 
     col_left, col_right = st.columns([3, 1])
     with col_left:
-        ma_period = st.slider(strings.MOVING_AVERAGE_PERIOD, min_value=5, max_value=50, value=20)
+        ma_period = st.select_slider(strings.MOVING_AVERAGE_PERIOD, options=FEATURE_MA_WINDOWS, value=20)
         show_ma = st.checkbox(strings.MOVING_AVERAGE_TOGGLE, value=True)
 
     with col_right:
         if st.button(strings.REFRESH_DATA):
             st.session_state.update_data_stock = True
+            clear_cache()
             st.rerun()
 
     if st.session_state.update_data_vnindex:
         try:
             df = get_vnindex_data(start_date, end_date)
             if not df.empty:
-                st.plotly_chart(plot_vnindex_chart(df, ma_period, show_ma))
+                fig = plot_vnindex_chart(df, ma_period, show_ma)
+                with span("vnindex_infor.render_chart"):
+                    st.plotly_chart(fig)
                 st.subheader(strings.MARKET_INFO_TITLE)
                 display_market_info(df, ma_period)
 
@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Point the app at a throwaway database before any of its modules is imported
+WORKDIR = tempfile.mkdtemp(prefix="stock-tests-")
+os.environ["STOCK_DATABASE_URL"] = "sqlite:///" + os.path.join(WORKDIR, "stock_data.db")
+os.environ["STOCK_MODEL_DIR"] = os.path.join(WORKDIR, "ml_model")
+os.environ["STOCK_ARCHIVE_DIR"] = os.path.join(WORKDIR, "archive")
+os.environ["STOCK_SCHEDULER_ENABLED"] = "0"
+os.environ["STOCK_INGEST_RATE_LIMIT"] = "1000"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create the tables of the throwaway database once per run."""
+    from database.database import Base, engine, migrate_indexes
+    Base.metadata.create_all(bind=engine)
+    migrate_indexes()
+    return engine
+
+
+@pytest.fixture
+def fresh_cache():
+    """Start and end a test with empty history caches."""
+    from services import market_data
+    market_data.clear_cache()
+    yield market_data
+    market_data.clear_cache()
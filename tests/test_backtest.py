@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from services.backtest import fold_bounds
+
+
+def _days(sessions, bars_per_session=3):
+    return np.repeat(np.arange(sessions), bars_per_session)
+
+
+def test_expanding_folds_cover_whole_sessions_after_the_minimum_training():
+    days = _days(10)
+    folds = fold_bounds(days, "expanding", test_days=3, min_train_days=4)
+    assert folds == [(0, 12, 21), (0, 21, 30)]
+    for _, test_start, test_end in folds:
+        # Test ranges start and end on session boundaries
+        assert days[test_start] != days[test_start - 1]
+        assert test_end == len(days) or days[test_end] != days[test_end - 1]
+
+
+def test_rolling_folds_train_on_the_last_sessions():
+    folds = fold_bounds(_days(12, 2), "rolling", train_days=4, test_days=3)
+    assert folds == [(0, 8, 14), (6, 14, 20), (12, 20, 24)]
+
+
+def test_folds_do_not_overlap_and_never_train_on_the_test_sessions():
+    days = np.sort(np.random.default_rng(0).integers(0, 200, 3000))
+    folds = fold_bounds(days, "expanding", test_days=20, min_train_days=60)
+    for (_, _, previous_end), (_, test_start, _) in zip(folds, folds[1:]):
+        assert previous_end == test_start
+    for train_start, test_start, test_end in folds:
+        assert train_start < test_start < test_end
+        assert days[test_start - 1] < days[test_start]
+    assert folds[-1][2] == len(days)
+
+
+def test_too_few_sessions_give_no_fold():
+    assert fold_bounds(_days(5), "rolling", train_days=5, test_days=2) == []
+
+
+def test_unknown_window_is_rejected():
+    with pytest.raises(ValueError):
+        fold_bounds(_days(10), "sliding")
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import FakeSource
+from services import comparison, ingest
+from services.comparison import _pairwise_correlation
+
+
+def test_pairwise_correlation_matches_pandas_on_missing_values():
+    rng = np.random.default_rng(3)
+    windows = rng.normal(size=(4, 5, 30))
+    windows[:, 1] += 0.8 * windows[:, 0]
+    windows[rng.random(windows.shape) < 0.2] = np.nan
+    windows[2, 3] = np.nan
+    windows[3, 4] = 1.0
+
+    result = _pairwise_correlation(windows, min_periods=10)
+    for w in range(len(windows)):
+        expected = pd.DataFrame(windows[w].T).corr(min_periods=10).to_numpy()
+        np.testing.assert_allclose(result[w], expected, rtol=1e-10, atol=1e-12)
+    # A ticker without values or with a constant close has no correlation
+    assert np.isnan(result[2, 3]).all()
+    assert np.isnan(result[3, 4]).all()
+
+
+def test_pairwise_correlation_requires_min_periods_shared_rows():
+    windows = np.array([[[1.0, 2.0, 3.0, np.nan, np.nan], [np.nan, np.nan, 1.0, 2.0, 4.0]]])
+    assert np.isnan(_pairwise_correlation(windows, min_periods=2)[0, 0, 1])
+    assert _pairwise_correlation(windows, min_periods=2)[0, 0, 0] == 1.0
+
+
+def test_aligned_prices_write_back_one_symbol_at_a_time(fresh_cache, monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    save_stock_prices = ingest.save_stock_prices
+
+    def tracked(symbol, df):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        try:
+            return save_stock_prices(symbol, df)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(ingest, "save_stock_prices", tracked)
+    comparison.clear_cache()
+    source = FakeSource("2024-04-01", "2024-04-30", "1h", seed=7)
+    tickers = ["CMPA", "CMPB", "CMPC", "CMPD", "CMPE", "CMPF"]
+    aligned = comparison.load_aligned_prices(tickers, "2024-04-01", "2024-04-30", source=source)
+
+    assert peak[0] == 1
+    assert sorted(aligned.tickers) == tickers
+    assert len(aligned.days) == len(pd.bdate_range("2024-04-01", "2024-04-30"))
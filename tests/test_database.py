@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Float, Integer, MetaData, Table
+
+from database import database
+from database.database import bulk_insert, engine
+
+table = Table("bulk_insert_test", MetaData(), Column("key", Integer, primary_key=True), Column("value", Float))
+
+
+def test_bulk_insert_counts_only_the_inserted_rows(monkeypatch):
+    table.create(bind=engine, checkfirst=True)
+    monkeypatch.setattr(database, "BULK_CHUNK_SIZE", 4)
+
+    assert bulk_insert(table, [{"key": k, "value": float(k)} for k in range(10)], ["key"]) == 10
+    # Half the keys exist already, the duplicates span several chunks and are skipped
+    records = [{"key": k, "value": -1.0} for k in range(5, 15)]
+    assert bulk_insert(table, records, ["key"]) == 5
+    assert bulk_insert(table, records, ["key"]) == 0
+    assert bulk_insert(table, [], ["key"]) == 0
+
+    with engine.connect() as conn:
+        rows = conn.execute(table.select().order_by(table.c.key)).fetchall()
+    assert len(rows) == 15
+    # Existing rows are left untouched
+    assert rows[5].value == 5.0 and rows[14].value == -1.0
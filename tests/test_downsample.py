@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.downsample import downsample, lttb_indices, minmax_indices
+
+
+def _series(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n), np.cumsum(rng.normal(size=n))
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_are_returned_unchanged(method):
+    x, y = _series(50)
+    out_x, out_y = downsample(x, y, 100, method)
+    np.testing.assert_array_equal(out_x, x)
+    np.testing.assert_array_equal(out_y, y)
+
+
+def test_lttb_keeps_n_out_ordered_points_with_both_ends():
+    x, y = _series()
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x, y = np.arange(1000), np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in lttb_indices(x, y, 20)
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    x, y = _series()
+    indices = minmax_indices(y, 100)
+    assert len(indices) <= 102
+    assert np.all(np.diff(indices) > 0)
+    for bucket in np.array_split(np.arange(len(y)), 50):
+        assert bucket[np.argmin(y[bucket])] in indices
+        assert bucket[np.argmax(y[bucket])] in indices
+
+
+def test_datetime_x_values_are_kept_as_datetimes():
+    times = pd.date_range("2024-01-02 09:00", periods=500, freq="min").values
+    _, y = _series(500)
+    out_x, out_y = downsample(times, y, 50)
+    assert out_x.dtype == times.dtype
+    assert len(out_x) == len(out_y) == 50
+    assert out_x[0] == times[0] and out_x[-1] == times[-1]
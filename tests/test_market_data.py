@@ -0,0 +1,70 @@
+import pandas as pd
+
+from benchmarks.synthetic import FakeSource
+from constants import strings
+from services.aggregate import resample_ohlcv
+
+START, END = pd.Timestamp("2024-01-02"), pd.Timestamp("2024-03-29")
+
+
+class CountingSource(FakeSource):
+    """Synthetic source recording the ranges requested from it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def fetch_vnindex(self, start_date, end_date):
+        self.calls.append((strings.VNINDEX, start_date, end_date))
+        return super().fetch_vnindex(start_date, end_date)
+
+    def fetch_stock(self, symbol, start_date, end_date):
+        self.calls.append((symbol, start_date, end_date))
+        return super().fetch_stock(symbol, start_date, end_date)
+
+
+def test_complete_vnindex_range_is_not_refetched(fresh_cache):
+    source = CountingSource(START, END, "1m", seed=4)
+    first = fresh_cache.get_history(strings.VNINDEX, START, END, interval="1D", source=source)
+    assert len(source.calls) == 1
+    assert first["time"].max() == END
+
+    # Daily bars are stored at 00:00, the stored session must not look older than its 14:44 last bar
+    fresh_cache.clear_cache()
+    second = fresh_cache.get_history(strings.VNINDEX, START, END, interval="1D", source=source)
+    assert len(source.calls) == 1
+    pd.testing.assert_frame_equal(first.reset_index(drop=True), second.reset_index(drop=True))
+
+
+def test_stock_history_is_fetched_once_then_served_from_the_database(fresh_cache):
+    source = CountingSource(START, END, "1m", seed=5)
+    start = pd.Timestamp("2024-02-01")
+    hourly = fresh_cache.get_history("HIST", start, END, interval="1h", source=source)
+    assert source.calls == [("HIST", "2024-02-01", "2024-03-29")]
+
+    minutes = source.fetch_stock("HIST", start, END)
+    expected = resample_ohlcv(minutes, "1h")
+    assert len(hourly) == len(expected)
+    assert (hourly["time"].to_numpy() == expected["time"].to_numpy()).all()
+    assert hourly["volume"].sum() == minutes["volume"].sum()
+    assert hourly["high"].max() == minutes["high"].max()
+
+    # Cached in memory, then read from SQLite without calling the source
+    source.calls.clear()
+    assert fresh_cache.get_history("HIST", start, END, interval="1h", source=source) is not None
+    fresh_cache.clear_cache()
+    daily = fresh_cache.get_history("HIST", start, END, interval="1D", source=source)
+    assert source.calls == []
+    assert len(daily) == minutes["time"].dt.normalize().nunique()
+
+
+def test_only_the_missing_head_is_fetched(fresh_cache):
+    source = CountingSource(START, END, "1m", seed=6)
+    fresh_cache.get_history("HEAD", "2024-03-01", END, interval="1D", source=source)
+    source.calls.clear()
+
+    fresh_cache.clear_cache()
+    weekly = fresh_cache.get_history("HEAD", START, END, interval="1W", source=source)
+    assert source.calls == [("HEAD", "2024-01-02", "2024-02-29")]
+    assert weekly["time"].min() == pd.Timestamp("2024-01-01")
+    assert weekly["volume"].sum() == source.fetch_stock("HEAD", START, END)["volume"].sum()
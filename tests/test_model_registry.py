@@ -0,0 +1,27 @@
+import os
+import pickle
+
+from services.model_registry import ModelRegistry, record_model_metadata
+
+
+def test_model_and_metadata_come_from_the_same_pickle(tmp_path):
+    model_dir = str(tmp_path)
+    registry = ModelRegistry(model_dir)
+    with open(registry.model_path("AAA"), "wb") as f:
+        pickle.dump({"model": ("coefficients", 1), "metadata": {"version": "v2", "feature_version": 2}}, f)
+    # The manifest lags behind, e.g. written by a save that has not finished yet
+    record_model_metadata("AAA", {"version": "v1", "feature_version": 1}, model_dir)
+
+    assert registry.get_with_metadata("AAA") == (("coefficients", 1), {"version": "v2", "feature_version": 2})
+
+
+def test_legacy_pickle_reads_metadata_from_the_manifest(tmp_path):
+    model_dir = str(tmp_path)
+    registry = ModelRegistry(model_dir)
+    with open(registry.model_path("BBB"), "wb") as f:
+        pickle.dump(("coefficients", 2), f)
+    record_model_metadata("BBB", {"version": "v1"}, model_dir)
+
+    assert registry.get_with_metadata("BBB") == (("coefficients", 2), {"version": "v1"})
+    assert registry.get_with_metadata("CCC") == (None, {})
+    assert not os.path.exists(registry.model_path("CCC"))
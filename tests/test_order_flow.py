@@ -0,0 +1,30 @@
+import pandas as pd
+
+from benchmarks.synthetic import make_order_book
+from database.database import save_order_book
+from services.order_flow import get_order_flow, update_order_flow
+
+
+def test_sessions_are_folded_against_their_own_watermark():
+    symbol = "OFLW"
+    later = make_order_book(symbol, "2024-05-03", matches=400, seed=1, first_id=10_001)
+    earlier = make_order_book(symbol, "2024-05-02", matches=300, seed=1, first_id=1)
+
+    save_order_book(symbol, later)
+    assert update_order_flow(symbol) == 400
+    # A session stored afterwards with lower ids is still folded, the later session is not read again
+    save_order_book(symbol, earlier)
+    assert update_order_flow(symbol) == 300
+    assert update_order_flow(symbol) == 0
+
+    # A new poll of a session folds only its new matches, the other session's summary stays cached
+    summary = get_order_flow(symbol, "2024-05-02")
+    polled = pd.concat([later, make_order_book(symbol, "2024-05-03", matches=50, seed=2, first_id=10_401)])
+    save_order_book(symbol, polled)
+    assert update_order_flow(symbol) == 50
+    assert get_order_flow(symbol, "2024-05-02") is summary
+
+    latest = get_order_flow(symbol)
+    assert latest["trades"] == 450
+    assert latest["volume"] == polled["volume"].sum()
+    assert get_order_flow(symbol, pd.Timestamp("2024-05-02"))["trades"] == 300
@@ -0,0 +1,31 @@
+import pytest
+
+from services.screener import validate_expression
+
+COLUMNS = ["close", "ma_20", "volume_ratio", "change_20d", "volatility_rank"]
+
+
+@pytest.mark.parametrize("expression", [
+    "close > ma_20",
+    "close > ma_20 and volume_ratio >= 2 and change_20d > 0.05 and volatility_rank < 0.5",
+    "not (close < ma_20) or -change_20d * 100 <= 5",
+    "0.2 < volatility_rank < 0.8",
+])
+def test_valid_expressions_are_returned(expression):
+    assert validate_expression(expression, COLUMNS) == expression
+
+
+@pytest.mark.parametrize("expression, reason", [
+    ("__import__('os').system('id')", "Call"),
+    ("close.__class__", "Attribute"),
+    ("close > @limit", "'@'"),
+    ("price > 10", "unknown column 'price'"),
+    ("close > 'abc'", "only numbers"),
+    ("close > True", "only numbers"),
+    ("[close for close in ma_20]", "is not allowed"),
+    ("close >", "Invalid filter expression"),
+])
+def test_unsafe_or_invalid_expressions_are_rejected(expression, reason):
+    with pytest.raises(ValueError) as error:
+        validate_expression(expression, COLUMNS)
+    assert reason in str(error.value)